@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+Compare the json and binary codecs.
+
+A :class:`upytester.PyBoard` is connected, through an in-memory loopback, to
+the pyboard's real listener (``upyt.cmd.process.listener``) running under
+CPython. For each codec, the bytes transmitted per call (both directions),
+and calls per second are reported.
+
+Usage::
+
+    python codec.py --calls 2000
+"""
+import argparse
+import asyncio
+import importlib
+import threading
+import time
+
+from upytester import PyBoard
+
+from listener import install_shims
+
+
+class Loopback(object):
+    """
+    A pair of connected in-memory streams.
+
+    ``host`` is a stand-in for :class:`serial.Serial`, and ``board`` is a
+    stand-in for :class:`pyb.USB_VCP`.
+    """
+
+    def __init__(self):
+        self.host = self.Host(self)
+        self.board = self.Board(self)
+
+        self.cond = threading.Condition()
+        self.to_board = bytearray()
+        self.to_host = bytearray()
+        self.tx_count = 0  # bytes sent by host
+        self.rx_count = 0  # bytes sent by board
+
+    class Host(object):
+        def __init__(self, loopback):
+            self.loopback = loopback
+            self.port = 'loopback'
+            self.timeout = None
+            self.closed = False
+            self._cancelled = False
+
+        @property
+        def in_waiting(self):
+            return len(self.loopback.to_host)
+
+        def read(self, size=1):
+            lb = self.loopback
+            with lb.cond:
+                if not (lb.to_host or self._cancelled):
+                    lb.cond.wait(self.timeout)
+                self._cancelled = False
+                data = bytes(lb.to_host[:size])
+                del lb.to_host[:size]
+            return data
+
+        def cancel_read(self):
+            lb = self.loopback
+            with lb.cond:
+                self._cancelled = True
+                lb.cond.notify_all()
+
+        def write(self, data):
+            lb = self.loopback
+            with lb.cond:
+                lb.to_board += data
+                lb.tx_count += len(data)
+            return len(data)
+
+        def open(self):
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+    class Board(object):
+        def __init__(self, loopback):
+            self.loopback = loopback
+
+        def any(self):
+            return len(self.loopback.to_board)
+
+        def readinto(self, buf, maxlen=None):
+            lb = self.loopback
+            with lb.cond:
+                size = min(len(buf), len(lb.to_board))
+                if not size:
+                    return None
+                buf[:size] = lb.to_board[:size]
+                del lb.to_board[:size]
+            return size
+
+        def write(self, data):
+            lb = self.loopback
+            with lb.cond:
+                lb.to_host += data
+                lb.rx_count += len(data)
+                lb.cond.notify_all()
+            return len(data)
+
+
+def start_firmware(loopback):
+    install_shims()
+    mapping = importlib.import_module('upyt.cmd.mapping')
+    process = importlib.import_module('upyt.cmd.process')
+
+    @mapping.instruction
+    def ping(value=0):
+        return {'value': value + 1}
+
+    @mapping.instruction
+    def heartbeat(enabled=True):
+        pass
+
+    mapping.set_serial_port(loopback.board)
+    thread = threading.Thread(
+        target=asyncio.run, args=(process.listener(loopback.board),),
+        daemon=True,
+    )
+    thread.start()
+
+
+def run(loopback, codec, count):
+    pyboard = PyBoard('loopback', comport=loopback.host, codec=codec)
+    try:
+        (tx, rx) = (loopback.tx_count, loopback.rx_count)
+        start = time.perf_counter()
+        for i in range(count):
+            assert pyboard.ping(value=i)()['value'] == i + 1
+        duration = time.perf_counter() - start
+        return {
+            'calls/s': count / duration,
+            'bytes/call': ((loopback.tx_count - tx) + (loopback.rx_count - rx)) / count,
+        }
+    finally:
+        pyboard.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--calls', type=int, default=2000, help="calls per run")
+    args = parser.parse_args()
+
+    loopback = Loopback()
+    start_firmware(loopback)
+
+    print("{} ping calls".format(args.calls))
+    for codec in ('json', 'bin'):
+        result = run(loopback, codec, args.calls)
+        print("    {:<5s} {:>8,.0f} calls/s {:>8.1f} bytes/call".format(
+            codec, result['calls/s'], result['bytes/call'],
+        ))
+
+
+if __name__ == '__main__':
+    main()
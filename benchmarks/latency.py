@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Latency of PyBoard's open(), close() and wait().
+
+A :class:`upytester.PyBoard` is connected, through an in-memory loopback, to
+the pyboard's real listener (``upyt.cmd.process.listener``) running under
+CPython. Each operation is timed repeatedly, and a histogram of durations
+is printed.
+
+Durations are compared with a baseline run (``--baseline``); by default
+``latency-polling.json``, recorded with the ``upytester`` that polled in
+``wait()``, and relied on thread timeouts in ``close()``. It was recorded
+with::
+
+    python latency.py --runs 30 --save latency-polling.json
+
+Usage::
+
+    python latency.py --runs 50
+"""
+import argparse
+import json
+import os
+import time
+
+from upytester import PyBoard
+
+from codec import Loopback, start_firmware
+
+# Upper bound of each histogram bucket (unit: ms)
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+OPERATIONS = ('open', 'wait', 'close')
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'latency-polling.json')  # noqa: E501
+
+
+def histogram(durations):
+    """Count of durations (unit: sec) that fall in each bucket."""
+    counts = [0] * (len(BUCKETS) + 1)
+    for duration in durations:
+        ms = duration * 1000
+        index = next((i for (i, limit) in enumerate(BUCKETS) if ms < limit), len(BUCKETS))
+        counts[index] += 1
+    return counts
+
+
+def percentile(durations, p):
+    ordered = sorted(durations)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+def report(name, durations):
+    print("{}: p50 {:.2f} ms, p90 {:.2f} ms, max {:.2f} ms".format(
+        name,
+        percentile(durations, 50) * 1000,
+        percentile(durations, 90) * 1000,
+        max(durations) * 1000,
+    ))
+    labels = ["< {} ms".format(limit) for limit in BUCKETS] + [">= {} ms".format(BUCKETS[-1])]
+    counts = histogram(durations)
+    for (label, count) in zip(labels, counts):
+        if count:
+            print("    {:>10s} {:>4d} {}".format(label, count, '#' * count))
+
+
+def measure(loopback, runs):
+    results = {'open': [], 'wait': [], 'close': []}
+    for i in range(runs):
+        start = time.perf_counter()
+        pyboard = PyBoard('loopback', comport=loopback.host)
+        results['open'].append(time.perf_counter() - start)
+
+        # wait() for a request that's only just been queued
+        pyboard.async_tx = True
+        pyboard.ping(value=i)
+        start = time.perf_counter()
+        pyboard.wait()
+        results['wait'].append(time.perf_counter() - start)
+        pyboard.async_tx = False
+
+        start = time.perf_counter()
+        pyboard.close()
+        results['close'].append(time.perf_counter() - start)
+    return results
+
+
+def compare(results, baseline):
+    print("compared to baseline (p50 / p90):")
+    for name in OPERATIONS:
+        (before, after) = (baseline[name], results[name])
+        print("    {:<6s} {:>8.2f} / {:>8.2f} ms  ->  {:>8.2f} / {:>8.2f} ms".format(
+            name,
+            percentile(before, 50) * 1000, percentile(before, 90) * 1000,
+            percentile(after, 50) * 1000, percentile(after, 90) * 1000,
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=50, help="repetitions of each operation")
+    parser.add_argument(
+        '--baseline', default=DEFAULT_BASELINE,
+        help="durations to compare with (json file written by --save)",
+    )
+    parser.add_argument('--save', default=None, help="write durations to a json file")
+    args = parser.parse_args()
+
+    loopback = Loopback()
+    start_firmware(loopback)
+
+    results = measure(loopback, args.runs)
+    for name in OPERATIONS:
+        report(name, results[name])
+
+    if args.save:
+        with open(args.save, 'w') as fh:
+            json.dump({
+                name: [round(d, 6) for d in durations]  # unit: sec
+                for (name, durations) in results.items()
+            }, fh, indent=2)
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as fh:
+            compare(results, json.load(fh))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+Benchmark the firmware's command listener under CPython.
+
+The pyboard's ``upyt.cmd.process.listener`` is run against a stand-in for
+:class:`pyb.USB_VCP` pre-loaded with ``ping`` commands:
+
+* ``bytewise``: replica of the original ``recv(1)`` per byte listener
+* ``buffered``: ``upyt.cmd.process.listener``
+
+For each, the command throughput, and the number of garbage collections per
+1000 commands is reported.
+
+.. note::
+
+    CPython's garbage collector only tracks container objects, so these
+    collection counts are an indication of allocation churn, not a direct
+    measure of what a pyboard would do.
+
+Usage::
+
+    python listener.py --commands 20000
+"""
+import argparse
+import asyncio
+import gc
+import importlib
+import os
+import sys
+import time
+import types
+
+import upytester
+
+FIRMWARE_LIB = os.path.join(
+    os.path.dirname(upytester.__file__), 'content', 'sd', 'lib',
+)
+
+
+# ---------------- MicroPython stand-ins ----------------
+def install_shims():
+    """Make firmware modules importable without a pyboard."""
+    # micropython
+    micropython = types.ModuleType('micropython')
+    micropython.native = lambda f: f
+    micropython.viper = lambda f: f
+    micropython.const = lambda x: x
+    sys.modules['micropython'] = micropython
+
+    # uasyncio
+    uasyncio = types.ModuleType('uasyncio')
+    uasyncio.sleep_ms = lambda t: asyncio.sleep(t / 1000)
+    sys.modules['uasyncio'] = uasyncio
+
+    # upyt packages (bypass __init__, it asserts it's running on a pyboard)
+    for name in ('upyt', 'upyt.cmd'):
+        pkg = types.ModuleType(name)
+        pkg.__path__ = [os.path.join(FIRMWARE_LIB, *name.split('.'))]
+        sys.modules[name] = pkg
+
+    # upyt.sched: the listener waits on uasyncio's IORead (a poll syscall);
+    # stand-in streams are polled instead (as simulator/firmware.py waits)
+    sched = importlib.import_module('upyt.sched')
+
+    async def readable(stream):
+        while not stream.any():
+            await asyncio.sleep(0.001)
+    sched.readable = readable
+
+
+class FakeVCP(object):
+    """Stand-in for :class:`pyb.USB_VCP`, pre-loaded with received data."""
+
+    def __init__(self, data):
+        self._rx = memoryview(data)
+        self._idx = 0
+        self.ok_count = 0
+
+    def any(self):
+        return len(self._rx) - self._idx
+
+    def recv(self, data, timeout=5000):
+        chunk = bytes(self._rx[self._idx:self._idx + data])
+        self._idx += len(chunk)
+        return chunk
+
+    def readinto(self, buf, maxlen=None):
+        size = min(len(buf), self.any())
+        if maxlen is not None:
+            size = min(size, maxlen)
+        if not size:
+            return None
+        buf[:size] = self._rx[self._idx:self._idx + size]
+        self._idx += size
+        return size
+
+    def write(self, data):
+        if data == b'ok\r':
+            self.ok_count += 1
+        return len(data)
+
+
+# ---------------- Listeners ----------------
+def bytewise_listener(interpret):
+    import json
+    import uasyncio
+
+    # Replica of the original listener
+    async def listener(stream):
+        line = b''
+        while True:
+            c = stream.recv(1, timeout=0)  # non-blocking
+            if c:
+                if c == b'\r':
+                    await interpret(json.loads(line))
+                    stream.write(b'ok\r')
+                    line = b''
+                else:
+                    line += c
+            else:
+                await uasyncio.sleep_ms(1)
+    return listener
+
+
+def run(listener, count):
+    stream = FakeVCP(b'{"i":"ping","k":{"value":1}}\r' * count)
+    collections = [0]
+
+    def gc_callback(phase, info):
+        if phase == 'start':
+            collections[0] += 1
+
+    async def main():
+        task = asyncio.ensure_future(listener(stream))
+        while stream.ok_count < count:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    gc.callbacks.append(gc_callback)
+    try:
+        start = time.perf_counter()
+        asyncio.run(main())
+        duration = time.perf_counter() - start
+    finally:
+        gc.callbacks.remove(gc_callback)
+
+    return {
+        'commands/s': count / duration,
+        'gc/1000 commands': collections[0] * 1000 / count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--commands', type=int, default=20000, help="commands per run")
+    args = parser.parse_args()
+
+    install_shims()
+    mapping = importlib.import_module('upyt.cmd.mapping')
+    process = importlib.import_module('upyt.cmd.process')
+
+    @mapping.instruction
+    def ping(value=0):
+        return None  # no response; measure intake only
+
+    results = {
+        'bytewise': run(bytewise_listener(process.interpret), args.commands),
+        'buffered': run(process.listener, args.commands),
+    }
+
+    print("{} commands".format(args.commands))
+    for (name, result) in results.items():
+        print("    {:<10s} {:>10,.0f} commands/s {:>8.2f} gc/1000 commands".format(
+            name, result['commands/s'], result['gc/1000 commands'],
+        ))
+
+
+if __name__ == '__main__':
+    main()
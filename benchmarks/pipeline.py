@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Benchmark pipelined requests against one-at-a-time 'ok' handshakes.
+
+A fake ``comport_class`` answers each request after a simulated USB
+round-trip latency; requests are processed in order, like the pyboard's
+listener.
+
+Usage::
+
+    python pipeline.py --requests 200 --latency 0.002 --depth 16
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+
+from upytester import PyBoard
+
+
+class LatentComport(object):
+    """
+    In-memory stand-in for :class:`serial.Serial`.
+
+    Every request is ok'd after ``latency`` seconds; responses are tagged
+    to match their request (as the pyboard's are).
+    """
+
+    def __init__(self, port=None, latency=0.002, timeout=None):
+        self.port = port
+        self.latency = latency
+        self.timeout = timeout
+        self.closed = False
+
+        self._rx = bytearray()
+        self._rx_cond = threading.Condition()
+        self._requests = queue.Queue()
+
+        self._thread = threading.Thread(target=self._respond, daemon=True)
+        self._thread.start()
+
+    @property
+    def in_waiting(self):
+        return len(self._rx)
+
+    def read(self, size=1):
+        with self._rx_cond:
+            if not self._rx:
+                self._rx_cond.wait(self.timeout)
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+        return data
+
+    def write(self, data):
+        for line in data.split(b'\r'):
+            if line:
+                self._requests.put((time.perf_counter() + self.latency, line))
+        return len(data)
+
+    def _respond(self):
+        while True:
+            (due, line) = self._requests.get()
+            time.sleep(max(due - time.perf_counter(), 0))
+            obj = json.loads(line.decode())
+            value = None
+            if obj.get('i') == 'list_instructions':
+                value = ["ping"]
+            elif obj.get('i') == 'list_remote_classes':
+                value = ["Pin"]
+            elif 'rc' in obj:
+                value = 0
+            response = b''
+            if value is not None:
+                # tagged response: r <tag> <json>
+                tag = obj.get('t', obj.get('q'))
+                response += 'r {} {}\r'.format(tag, json.dumps(value)).encode()
+            if 'q' in obj:
+                response += 'ok {}\r'.format(obj['q']).encode()
+            else:
+                response += b'ok\r'
+            with self._rx_cond:
+                self._rx += response
+                self._rx_cond.notify_all()
+
+    def open(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def run(count, latency, depth):
+    pyboard = PyBoard(
+        'fake', comport=LatentComport(port='fake', latency=latency),
+        heartbeat=False, pipeline=depth,
+        catalog_cache=False,  # don't cache the fake's catalog
+    )
+    try:
+        start = time.perf_counter()
+        for i in range(count):
+            pyboard.ping(value=i)
+        pyboard.wait()
+        return time.perf_counter() - start
+    finally:
+        pyboard.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=200, help="requests per run")
+    parser.add_argument('--latency', type=float, default=0.002, help="round trip time (unit: sec)")
+    parser.add_argument('--depth', type=int, default=16, help="pipeline depth")
+    args = parser.parse_args()
+
+    print("{} requests, {:.1f}ms round trip".format(args.requests, args.latency * 1e3))
+    for depth in (0, args.depth):
+        duration = run(args.requests, args.latency, depth)
+        print("    depth={:<4d} {:>8.3f} s {:>10,.0f} requests/s".format(
+            depth, duration, args.requests / duration,
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Overhead of PyBoard's instruction and remote class proxies.
+
+Requests are sent to a null transport (they're discarded), so only the
+time taken to look up a proxy, and build its request, is measured.
+
+Usage::
+
+    python proxy.py --calls 200000
+"""
+import argparse
+import time
+
+from upytester import PyBoard
+
+
+class NullPyBoard(PyBoard):
+    """A :class:`PyBoard` that discards every request."""
+
+    def __init__(self):
+        super(NullPyBoard, self).__init__('null', auto_open=False, heartbeat=False)
+        self._instruction_list = ['ping']
+        self._remote_class_list = ['Pin']
+
+    def send(self, obj):
+        if self._batch is not None:
+            return self._batch.add(obj)
+        return self._receive
+
+    @staticmethod
+    def _receive(timeout=None):
+        return 0  # remote instance id
+
+
+def timed(func, count):
+    start = time.perf_counter()
+    func(count)
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--calls', type=int, default=200000, help="calls per test")
+    args = parser.parse_args()
+
+    pyboard = NullPyBoard()
+    pin = pyboard.Pin('X1', 'out')
+
+    def instruction(count):
+        for i in range(count):
+            pyboard.ping(value=i)
+
+    def instruction_no_args(count):
+        for i in range(count):
+            pyboard.ping()
+
+    def constructor(count):
+        for i in range(count):
+            pyboard.Pin('X1', 'out')
+
+    def remote_method(count):
+        for i in range(count):
+            pin.value(1)
+
+    def remote_method_no_args(count):
+        for i in range(count):
+            pin.value()
+
+    tests = [
+        ('instruction', instruction),
+        ('instruction (no args)', instruction_no_args),
+        ('remote class constructor', constructor),
+        ('remote method', remote_method),
+        ('remote method (no args)', remote_method_no_args),
+    ]
+
+    if hasattr(pyboard.ping, 'bind'):
+        ping = pyboard.ping.bind(value=1)
+
+        def bound_instruction(count):
+            for i in range(count):
+                ping()
+        tests.append(('bound instruction', bound_instruction))
+
+    print("{} calls per test".format(args.calls))
+    for (name, func) in tests:
+        print("    {:<26s} {:>8.0f} ns/call".format(name, timed(func, args.calls) * 1e9))
+
+
+if __name__ == '__main__':
+    main()
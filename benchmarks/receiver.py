@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""
+Benchmark the host's serial receiver.
+
+A fake ``comport_class`` is pre-loaded with a stream of JSON lines, which are
+then read back:
+
+* ``bytewise``: replica of the original ``read(1)`` per byte loop
+* ``chunked``: :class:`upytester.pyboard.reader.LineReader`
+* ``pyboard``: end-to-end, through a :class:`upytester.PyBoard` instance's
+  receiver thread, and pulled from :meth:`PyBoard.receive`
+
+Usage::
+
+    python receiver.py --lines 20000 --size 200
+"""
+import argparse
+import json
+import threading
+import time
+
+from upytester import PyBoard
+from upytester.pyboard.reader import LineReader
+
+
+class FakeComport(object):
+    """
+    In-memory stand-in for :class:`serial.Serial`.
+
+    Responds to the requests :meth:`PyBoard.open` makes, and anything added
+    with :meth:`inject` is received by the host.
+    """
+
+    RESPONSES = {
+        'list_instructions': ["ping"],
+        'list_remote_classes': [],
+    }
+
+    def __init__(self, port=None, baudrate=None, timeout=None):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.closed = False
+
+        self._rx = bytearray()
+        self._rx_cond = threading.Condition()
+
+    @property
+    def in_waiting(self):
+        return len(self._rx)
+
+    def inject(self, data):
+        with self._rx_cond:
+            self._rx += data
+            self._rx_cond.notify_all()
+
+    def read(self, size=1):
+        with self._rx_cond:
+            if not self._rx:
+                self._rx_cond.wait(self.timeout)
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+        return data
+
+    def write(self, data):
+        obj = json.loads(data.decode())
+        response = b''
+        if obj.get('i') in self.RESPONSES:
+            # tagged response: r <tag> <json>
+            value = self.RESPONSES[obj['i']]
+            response += 'r {} {}\r'.format(obj['t'], json.dumps(value)).encode()
+        self.inject(response + b'ok\r')
+        return len(data)
+
+    def open(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class _Halt(object):
+    # never set (iterators are stopped by end_on_timeout)
+    def is_set(self):
+        return False
+
+
+def bytewise_lines(comport):
+    # Replica of the original receiver loop
+    line = b''
+    while True:
+        c = comport.read(1)
+        if c:
+            if c == b'\r':
+                yield line
+                line = b''
+            else:
+                line += c
+        else:
+            break
+
+
+def chunked_lines(comport):
+    reader = LineReader(comport)
+    return reader.iter_lines(_Halt(), end_on_timeout=True)
+
+
+def make_stream(count, size):
+    line = json.dumps({'value': 'x' * max(size - 13, 0)}).encode() + b'\r'
+    return line * count
+
+
+def measure(func, count):
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    func()
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    return {
+        'lines/s': count / wall,
+        'cpu/line (us)': (cpu / count) * 1e6,
+    }
+
+
+def bench_iterator(line_iter_func, count, size):
+    comport = FakeComport(timeout=0)
+    comport.inject(make_stream(count, size))
+
+    def run():
+        received = sum(1 for _ in line_iter_func(comport))
+        assert received == count, "received {} of {}".format(received, count)
+    return measure(run, count)
+
+
+def bench_pyboard(count, size):
+    pyboard = PyBoard(
+        'fake', comport=FakeComport(port='fake'), heartbeat=False,
+        catalog_cache=False,  # don't cache the fake's catalog
+    )
+    stream = make_stream(count, size)
+
+    def run():
+        pyboard.comport.inject(stream)
+        for i in range(count):
+            assert pyboard.receive(timeout=1) is not None
+    try:
+        assert pyboard.instruction_list == ["ping"], pyboard.instruction_list
+        return measure(run, count)
+    finally:
+        pyboard.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--lines', type=int, default=20000, help="lines per run")
+    parser.add_argument('--size', type=int, default=200, help="bytes per line")
+    args = parser.parse_args()
+
+    results = {
+        'bytewise': bench_iterator(bytewise_lines, args.lines, args.size),
+        'chunked': bench_iterator(chunked_lines, args.lines, args.size),
+        'pyboard': bench_pyboard(args.lines, args.size),
+    }
+
+    print("{} lines of {} bytes".format(args.lines, args.size))
+    for (name, result) in results.items():
+        print("    {:<10s} {:>12,.0f} lines/s {:>10.2f} us cpu/line".format(
+            name, result['lines/s'], result['cpu/line (us)'],
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -36,16 +36,18 @@ class ExceptionTest(unittest.TestCase):
         Send a series of pings synchronously, one of the requests is invalid.
         """
         # Send request, and block until response is received
-        self.pyb_a.ping(value=10)
-        self.pyb_a.ping(value=20)
-        self.pyb_a.ping(value=30)
-        self.pyb_a.ping(value='xyz')  # bad code
-        self.pyb_a.ping(value=40)
-        self.pyb_a.ping(value=50)
-        self.pyb_a.ping(value=60)
+        receivers = [
+            self.pyb_a.ping(value=10),
+            self.pyb_a.ping(value=20),
+            self.pyb_a.ping(value=30),
+            self.pyb_a.ping(value='xyz'),  # bad code
+            self.pyb_a.ping(value=40),
+            self.pyb_a.ping(value=50),
+            self.pyb_a.ping(value=60),
+        ]
 
         self.assertEqual(
-            [self.pyb_a.receive()['value'] for i in range(6)],
+            [receiver()['value'] for receiver in receivers],
             [11, 21, 31, 41, 51, 61]
         )
 
@@ -56,16 +58,18 @@ class ExceptionTest(unittest.TestCase):
         self.pyb_a.async_tx = True
 
         # Push requests to a FIFO stack, sent in sequence by a thread
-        self.pyb_a.ping(value=10)
-        self.pyb_a.ping(value=20)
-        self.pyb_a.ping(value=30)
-        self.pyb_a.ping(value='xyz')  # bad code
-        self.pyb_a.ping(value=40)
-        self.pyb_a.ping(value=50)
-        self.pyb_a.ping(value=60)
+        receivers = [
+            self.pyb_a.ping(value=10),
+            self.pyb_a.ping(value=20),
+            self.pyb_a.ping(value=30),
+            self.pyb_a.ping(value='xyz'),  # bad code
+            self.pyb_a.ping(value=40),
+            self.pyb_a.ping(value=50),
+            self.pyb_a.ping(value=60),
+        ]
 
         self.assertEqual(
-            [self.pyb_a.receive()['value'] for i in range(6)],
+            [receiver()['value'] for receiver in receivers],
             [11, 21, 31, 41, 51, 61]
         )
 
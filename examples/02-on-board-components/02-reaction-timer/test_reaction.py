@@ -15,6 +15,8 @@ class ReactionTimeTest(unittest.TestCase):
         Test your reaction time
         """
         time.sleep(2 + random.random() * 5)  # wait random time
-        t = self.pyb_a.reaction_time()(timeout=1)
+        self.pyb_a.reaction_time()
+        # reaction time is sent (not returned) once the switch is pressed
+        t = self.pyb_a.receive(timeout=1)
         self.assertIsNotNone(t)
         self.assertLess(t, 300)
@@ -15,14 +15,18 @@ __keywords__ = ['micropython', 'pyboard', 'testing', 'unittest', 'hardware']
 # ------- Imports
 __all__ = [
     'PyBoard',
+    'AsyncPyBoard',
+    'PyBoardPool',
 
     # sub-modules
     'project',
     'pyboard',
+    'simulator',
 ]
 
-from .pyboard import PyBoard
+from .pyboard import PyBoard, AsyncPyBoard, PyBoardPool
 
 # sub-modules
 from . import project
 from . import pyboard
+from . import simulator
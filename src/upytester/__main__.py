@@ -5,6 +5,8 @@ import os
 import time
 import argparse
 import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from fnmatch import fnmatch
 import inspect
 
@@ -17,6 +19,7 @@ _this_path = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentfram
 DEFAULT_SOURCE = os.path.join(_this_path, 'content')
 
 ACTION_MAP = {}  # populated by @action('foo') decorator
+MULTI_PYBOARD_ACTIONS = ('sync',)  # actions that may be given many pyboards
 
 
 # ====================== Parameter Types ======================
@@ -28,21 +31,23 @@ def t_action(value):
         )
     return value
 
-def t_serial_number(pattern):
-    serial_numbers = [
+def t_serial_numbers(pattern):
+    serial_numbers = sorted(
         s for s in upytester.PyBoard.connected_serial_numbers()
         if fnmatch(s, pattern)
-    ]
-    if len(serial_numbers) != 1:
+    )
+    if not serial_numbers:
         raise argparse.ArgumentTypeError(
             "could not find serial matching pattern: {!r}".format(pattern)
         )
-    return serial_numbers[0]
+    return serial_numbers
 
 
 # ====================== Retry Loop Utility ======================
 from contextlib import contextmanager
 from upytester.pyboard.utils.exceptions import PyBoardNotFoundError, DeviceFileNotFoundError
+from upytester.pyboard.utils import get_watcher
+from upytester.pyboard.utils.mpy import MpyCompiler
 
 RETRY_DURATION = 30  # (unit: seconds)
 RETRY_PERIOD = 1  # (unit: seconds)
@@ -53,36 +58,43 @@ def _log(text, flush=False):
         if flush:
             sys.stdout.flush()
 
-def _retry_loop(title=None):
+def _retry_loop(title=None, log=None):
+    log = log or _log
     if title:
-        _log(title + ': ')
+        log(title + ': ')
 
     @contextmanager
     def try_except(surpress=False):
         try:
             yield
-            _log('\n', flush=True)
+            log('\n', flush=True)
         except (PyBoardNotFoundError, DeviceFileNotFoundError):
             if surpress:
-                _log('.', flush=True)
+                log('.', flush=True)
             else:
-                _log('\n', flush=True)
+                log('\n', flush=True)
                 raise
 
-    i = int(RETRY_DURATION / RETRY_PERIOD)
+    # Retry as soon as a device is connected (or disconnected), or once per
+    # RETRY_PERIOD if devices can't be watched
+    watcher = get_watcher()
+    deadline = time.monotonic() + RETRY_DURATION
     while True:
-        i -= 1
-        yield try_except(i > 0)
-        time.sleep(RETRY_PERIOD)
+        since = watcher.sequence if watcher else None
+        yield try_except(time.monotonic() < deadline)
+        if watcher:
+            watcher.wait_for(since=since, timeout=RETRY_PERIOD)
+        else:
+            time.sleep(RETRY_PERIOD)
 
-def retry(title=None):
+def retry(title=None, log=None):
     """
     Function will be repeatedly called until it succeeds.
     """
     def retry_decorator(func):
         @functools.wraps(func)
         def inner(*args, **kwargs):
-            for context in _retry_loop(title):
+            for context in _retry_loop(title, log=log):
                 with context:
                     func(*args, **kwargs)
                     break
@@ -146,23 +158,26 @@ def action_comport():
     _log("{}\n".format(pyboard.comport.port))
 
 
-@action('sync')
-def action_sync():
+def _sync_pyboard(serial_number, log=None):
+    # Synchronise a single pyboard; output is written with log()
+    log = log or _log
+    medium = 'flash' if args.flash else 'sd'
+    state = {}  # populated as each stage completes
+
     # Create instance
-    @retry("Object")
+    @retry("Object", log=log)
     def create_instance():
-        global pyboard
-        pyboard = upytester.PyBoard(args.serialnum, auto_open=False)
-        _log('{!r}'.format(pyboard))
+        state['pyboard'] = upytester.PyBoard(serial_number, auto_open=False)
+        log('{!r}'.format(state['pyboard']))
     create_instance()
+    pyboard = state['pyboard']
 
     # Mount filesystem
-    medium = 'flash' if args.flash else 'sd'
-    @retry("Mounting " + medium)
+    @retry("Mounting " + medium, log=log)
     def mount_filesystem():
-        global pyboard
         getattr(pyboard, 'mount_' + medium)()
-    mount_filesystem()
+    if not args.serial:
+        mount_filesystem()
 
     # --- Sync Files
     prj_data = upytester.project.get_bench_config()
@@ -173,10 +188,15 @@ def action_sync():
     # Bench lib
     prj_lib = prj_data.get('bench', {}).get('libraries', {}).get(medium, None)
 
+    def output(line):
+        log(line + '\n')
+
+    # Compile to bytecode (shared by each sync, and cached)
+    mpy = MpyCompiler() if args.mpy else False
+
     # Main
-    @retry("Sync Main")
+    @retry("Sync Main", log=log)
     def sync_main():
-        global pyboard
         # Excluded patterns
         exclude = ['.git*', '*/__pycache__']  # always ignored stuff
         if prj_lib:
@@ -189,13 +209,16 @@ def action_sync():
             quiet=args.quiet,
             subdir=args.dest,
             exclude=exclude,
+            output=output,
+            checksum=args.checksum,
+            mpy=mpy,
+            serial=args.serial,
         )
     sync_main()
 
     # Sync Project Files
-    @retry("Sync Project")
+    @retry("Sync Project", log=log)
     def sync_prj(prj_lib):
-        global pyboard
         getattr(pyboard, 'sync_to_' + medium)(
             prj_lib,
             force=args.force,
@@ -203,35 +226,172 @@ def action_sync():
             quiet=args.quiet,
             subdir=args.dest + '/lib_bench',
             exclude=['.git*', '*/__pycache__'],  # always ignored stuff
+            output=output,
+            checksum=args.checksum,
+            mpy=mpy,
+            serial=args.serial,
         )
 
     if prj_lib:
         sync_prj(prj_lib)
 
     # --- Unmount filesystem
-    @retry("Unmounting")
+    @retry("Unmounting", log=log)
     def unmount_filesystem():
-        global pyboard
         getattr(pyboard, 'unmount_' + medium)()
-    unmount_filesystem()
+    if not args.serial:
+        unmount_filesystem()
 
     # optional reset
     if (args.softreset or args.hardreset) and (not args.dryrun):
-        global pyboard
         if args.softreset:
             pyboard.open()
         pyboard.reset(hard=args.hardreset)
         #pyboard.close()
+        _report_boot_info(serial_number, log=log)
 
     return 0
 
 
+BOOT_INFO_TIMEOUT = 10  # time to wait for pyboard to reboot (unit: seconds)
+
+def _report_boot_info(serial_number, log=None):
+    # Report boot-to-ready time, and free heap of freshly reset pyboard
+    log = log or _log
+    log("Boot: ", flush=True)
+    timeout = time.time() + BOOT_INFO_TIMEOUT
+    while True:
+        try:
+            with upytester.PyBoard(serial_number, auto_open=False, heartbeat=False) as pyboard:  # noqa: E501
+                info = pyboard.get_boot_info()()
+            break
+        except Exception as e:
+            if time.time() > timeout:
+                log("unavailable ({})\n".format(e))
+                return
+            time.sleep(RETRY_PERIOD)
+
+    line = "ready after {}ms".format(info.get('ready_ms'))
+    if 'mem_free' in info:
+        line += ", {mem_free} bytes free ({mem_alloc} bytes allocated)".format(**info)
+    log(line + '\n')
+
+
+class _PrefixedLog(object):
+    """
+    Equivalent of _log() for one of many pyboards being processed in
+    parallel; each complete line is written with a prefix.
+    """
+    _lock = threading.Lock()  # shared; lines from each pyboard aren't mixed
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._buffer = ''
+
+    def __call__(self, text, flush=False):
+        if args.quiet:
+            return
+        self._buffer += text
+        (*lines, self._buffer) = self._buffer.split('\n')
+        with self._lock:
+            for line in lines:
+                sys.stdout.write('{}{}\n'.format(self.prefix, line))
+            sys.stdout.flush()
+
+    def close(self):
+        if self._buffer:
+            self('\n')
+
+
+@action('sync')
+def action_sync():
+    serial_numbers = args.serialnums
+    if len(serial_numbers) == 1:
+        return _sync_pyboard(serial_numbers[0])
+
+    # --- Multiple pyboards: synchronise in parallel
+    width = max(len(s) for s in serial_numbers)
+    results = {}  # format: {<serial>: (<exception or None>, <duration>), ...}
+
+    def sync_job(serial_number):
+        log = _PrefixedLog('[{:<{}s}] '.format(serial_number, width))
+        start = time.time()
+        try:
+            _sync_pyboard(serial_number, log=log)
+            results[serial_number] = (None, time.time() - start)
+        except Exception as e:
+            log("failed: {!r}\n".format(e))
+            results[serial_number] = (e, time.time() - start)
+        finally:
+            log.close()
+
+    _log("Synchronising {} pyboards\n".format(len(serial_numbers)))
+    with ThreadPoolExecutor(max_workers=args.jobs or len(serial_numbers)) as executor:
+        executor.map(sync_job, serial_numbers)
+
+    # Summary
+    failed = [s for s in serial_numbers if results[s][0] is not None]
+    sys.stdout.write("Summary: {} synchronised, {} failed\n".format(
+        len(serial_numbers) - len(failed), len(failed),
+    ))
+    for serial_number in serial_numbers:
+        (error, duration) = results[serial_number]
+        sys.stdout.write("    {serial:<{width}s} {status:<6s} {duration:5.1f}s{error}\n".format(
+            serial=serial_number,
+            width=width,
+            status='FAILED' if error else 'ok',
+            duration=duration,
+            error=' {}'.format(error) if error else '',
+        ))
+
+    return 1 if failed else 0
+
+
 @action('reset')
 def action_reset():
     pyboard = upytester.PyBoard(args.serialnum, auto_open=False)
     pyboard.reset(hard=True)
 
 
+@action('bench')
+def action_bench():
+    from upytester import benchmark
+
+    pyboard = benchmark.open_target(
+        args.serialnum,
+        simulated=args.simulated,
+        codec=args.codec,
+    )
+    try:
+        _log("Benchmarking {!r} ({} iterations per test)\n".format(pyboard, args.count))
+        results = benchmark.run(pyboard, count=args.count, tests=args.tests)
+    finally:
+        pyboard.close()
+        if args.simulated:
+            pyboard.comport.shutdown()
+
+    # Summary
+    for (name, result) in sorted(results['results'].items()):
+        if 'rate' in result:
+            _log("    {:<26s} {:>10.1f} /s\n".format(name, result['rate']))
+        else:
+            _log("    {:<26s} {:>10.3f} ms (p50) {:>10.3f} ms (p99)\n".format(
+                name, result['p50'], result['p99'],
+            ))
+
+    # Save
+    output = args.output
+    if not output:
+        output = "bench-{target}-{time}.json".format(
+            target=args.simulated or args.serialnum,
+            time=time.strftime('%Y%m%d-%H%M%S'),
+        )
+    benchmark.save(results, output)
+    _log("Results written to: {}\n".format(output))
+
+    return 0
+
+
 # ====================== Mainline ======================
 def main():
     parser = argparse.ArgumentParser(
@@ -245,8 +405,19 @@ def main():
         ),
     )
     parser.add_argument(
-        'serialnum', default=None, type=t_serial_number, metavar="SERIAL", nargs="?",
-        help="PyBoard's serial number (run with --list to list all connected devices)",
+        'serialnum', default=None, type=t_serial_numbers, metavar="SERIAL", nargs="?",
+        help="PyBoard's serial number (run with --list to list all connected devices), "
+             "may be a glob pattern to sync many pyboards (eg: '3976*')",
+    )
+    parser.add_argument(
+        '--all', default=False, action='store_true',
+        help="If set with sync action, all connected pyboards are synchronised "
+             "(in parallel)",
+    )
+    parser.add_argument(
+        '--jobs', '-j', default=None, type=int,
+        help="If syncing many pyboards, the maximum number synchronised at "
+             "once (default: all of them)",
     )
     parser.add_argument(
         '--source', default=None, type=str,
@@ -269,6 +440,23 @@ def main():
         help="if the action is to SYNC, the source & destination folders are "
              "printed to stdout, but no action is taken",
     )
+    parser.add_argument(
+        '--checksum', default=False, action='store_true',
+        help="if the action is to SYNC, every file's content is compared "
+             "(slow), instead of only copying files changed since the last "
+             "sync (according to the pyboard's manifest)",
+    )
+    parser.add_argument(
+        '--serial', default=False, action='store_true',
+        help="if the action is to SYNC, files are sent over the pyboard's "
+             "serial port (requires upytester firmware to be running), "
+             "instead of mounting its drive",
+    )
+    parser.add_argument(
+        '--mpy', default=False, action='store_true',
+        help="if the action is to SYNC, .py files are cross-compiled with "
+             "mpy-cross (cached), and deployed as .mpy bytecode",
+    )
     parser.add_argument(
         '--quiet', default=False, action='store_true',
         help="if set, output to STDOUT will be minimal",
@@ -287,14 +475,54 @@ def main():
         help="If set with sync action, pyboard is hard reset after sync is performed",
     )
 
+    parser.add_argument(
+        '--simulated', default=None, choices=('memory', 'pty'),
+        help="If set with bench action, a simulated pyboard is benchmarked "
+             "(with the given transport) instead of a connected one",
+    )
+    parser.add_argument(
+        '--count', default=1000, type=int,
+        help="If set with bench action, number of iterations per test "
+             "(default 1000)",
+    )
+    parser.add_argument(
+        '--tests', default=None, type=lambda v: v.split(','),
+        help="If set with bench action, a comma separated list of tests to "
+             "run (default: all)",
+    )
+    parser.add_argument(
+        '--codec', default=None, choices=('json', 'bin'),
+        help="If set with bench action, codec to use (default json)",
+    )
+    parser.add_argument(
+        '--output', '-o', default=None, type=str,
+        help="If set with bench action, file results are written to "
+             "(default: bench-<target>-<time>.json)",
+    )
+
     # Evaluate
     global args  # this feels like cheating
     args = parser.parse_args()
 
 
+    # Serial Number(s)
+    #   SERIAL may match many pyboards, only some actions can use them all
+    args.serialnums = args.serialnum or []
+    if args.all:
+        args.serialnums = sorted(upytester.PyBoard.connected_serial_numbers())
+        if not args.serialnums:
+            raise ValueError("no connected pyboards found")
+    if (len(args.serialnums) > 1) and (args.action[0] not in MULTI_PYBOARD_ACTIONS):
+        raise ValueError("multiple pyboards match SERIAL {!r}, specify one".format(args.serialnums))  # noqa: E501
+    args.serialnum = args.serialnums[0] if args.serialnums else None
+
     # Default Serial Number
     #   If no serial is given, and only 1 pyboard is connected, default to that
-    if (args.serialnum is None) and (args.action[0] not in ('list',)):
+    no_serial_needed = any((
+        args.action[0] in ('list',),
+        (args.action[0] == 'bench') and args.simulated,
+    ))
+    if (args.serialnum is None) and not no_serial_needed:
         serial_numbers = serial_numbers = upytester.PyBoard.connected_serial_numbers()
         if len(serial_numbers) <= 0:
             raise ValueError("no connected pyboards found")
@@ -302,6 +530,7 @@ def main():
             raise ValueError("multiple pyboards found, specify one by SERIAL")
         else:
             args.serialnum = serial_numbers[0]
+            args.serialnums = [args.serialnum]
 
     # ====================== Mainline ======================
     errorcode = 0
@@ -0,0 +1,324 @@
+"""
+Measure communication performance between a host and a pyboard.
+
+Each ``measure_*`` function runs one test against an open
+:class:`PyBoard <upytester.PyBoard>`, and returns its results as a
+:class:`dict` (json serializable). :meth:`run` runs all of them, and
+:meth:`save` writes the results to a json file, so runs can be compared
+across host and firmware versions::
+
+    >>> from upytester import benchmark
+    >>> pyboard = benchmark.open_target('3976346C3436')
+    >>> results = benchmark.run(pyboard, count=500)
+    >>> pyboard.close()
+    >>> benchmark.save(results, 'bench.json')
+
+A simulated pyboard can be used in place of hardware::
+
+    >>> pyboard = benchmark.open_target(simulated='memory')
+
+Durations are in milliseconds, rates are per second.
+"""
+import sys
+import json
+import time
+import platform
+import datetime
+
+import upytester
+
+from .pyboard import PyBoard, PyBoardError
+
+# Logging
+import logging
+log = logging.getLogger(__name__)
+
+
+# Defaults
+DEFAULT_COUNT = 1000  # iterations per test
+PERCENTILES = (50, 90, 99)
+
+# Remote class used to measure instance creation
+#   (an onboard LED; creating one has no side effects)
+REMOTE_CLASS = 'LED'
+REMOTE_CLASS_ARGS = (1,)
+
+# Format version of results (increment if keys are changed)
+RESULTS_VERSION = 1
+
+
+# ==================== Statistics ====================
+def percentile(values, pct):
+    """
+    Percentile of the given values (nearest-rank method).
+
+    :param values: sorted values
+    :type values: :class:`list`
+    :param pct: percentile (``0`` to ``100``)
+    :type pct: :class:`float`
+    """
+    if not values:
+        return None
+    rank = int(round((pct / 100.0) * (len(values) - 1)))
+    return values[rank]
+
+
+def summarize(durations):
+    """
+    Summarize a list of durations.
+
+    :param durations: durations (unit: sec)
+    :type durations: :class:`list`
+    :return: ``count``, ``min``, ``max``, ``mean`` and percentiles
+             (``p50``, ``p90``, ...) (unit: ms)
+    :rtype: :class:`dict`
+    """
+    values = sorted(d * 1e3 for d in durations)
+    summary = {
+        'count': len(values),
+        'min': values[0] if values else None,
+        'max': values[-1] if values else None,
+        'mean': (sum(values) / len(values)) if values else None,
+    }
+    for pct in PERCENTILES:
+        summary['p{}'.format(pct)] = percentile(values, pct)
+    return summary
+
+
+def _rate(count, duration):
+    return {
+        'count': count,
+        'duration': duration * 1e3,
+        'rate': (count / duration) if duration else None,
+    }
+
+
+# ==================== Tests ====================
+def measure_ping_latency(pyboard, count=DEFAULT_COUNT):
+    """
+    Round-trip time of a ``ping`` instruction, and its response.
+
+    :param pyboard: open pyboard
+    :type pyboard: :class:`PyBoard <upytester.PyBoard>`
+    :param count: number of pings
+    :type count: :class:`int`
+    :return: latency summary (see :meth:`summarize`)
+    :rtype: :class:`dict`
+    """
+    durations = []
+    for i in range(count):
+        start = time.perf_counter()
+        response = pyboard.ping(value=i)()
+        durations.append(time.perf_counter() - start)
+        if response != {'value': i + 1}:
+            raise PyBoardError("unexpected ping response: {!r}".format(response))
+    return summarize(durations)
+
+
+def measure_remote_instance(pyboard, count=DEFAULT_COUNT):
+    """
+    Time taken to create a remote instance.
+
+    Instances are removed when done (see ``clean_remote_classes``); any
+    others created beforehand are also removed.
+
+    :param pyboard: open pyboard
+    :type pyboard: :class:`PyBoard <upytester.PyBoard>`
+    :param count: number of instances to create
+    :type count: :class:`int`
+    :return: creation time summary (see :meth:`summarize`)
+    :rtype: :class:`dict`
+    """
+    constructor = getattr(pyboard, REMOTE_CLASS)
+    durations = []
+    try:
+        for i in range(count):
+            start = time.perf_counter()
+            constructor(*REMOTE_CLASS_ARGS)
+            durations.append(time.perf_counter() - start)
+    finally:
+        pyboard.clean_remote_classes()
+    return summarize(durations)
+
+
+def measure_instruction_rate(pyboard, count=DEFAULT_COUNT, mode='sync'):
+    """
+    Sustained rate of ``ping`` instructions, including their responses.
+
+    ============ ==============================================================
+    Mode         Description
+    ============ ==============================================================
+    ``sync``     each request waits for its ``'ok'`` before the next is sent
+    ``async_tx`` requests are sent with :attr:`async_tx
+                 <upytester.PyBoard.async_tx>` set, so they're sent back to
+                 back; their responses are received afterwards
+    ============ ==============================================================
+
+    :param pyboard: open pyboard
+    :type pyboard: :class:`PyBoard <upytester.PyBoard>`
+    :param count: number of instructions
+    :type count: :class:`int`
+    :param mode: ``'sync'`` or ``'async_tx'``
+    :type mode: :class:`str`
+    :return: ``count``, ``duration`` (unit: ms), and ``rate`` (unit: per sec)
+    :rtype: :class:`dict`
+    """
+    if mode not in ('sync', 'async_tx'):
+        raise ValueError("unknown mode {!r}".format(mode))
+
+    async_tx = pyboard.async_tx
+    pyboard.async_tx = (mode == 'async_tx')
+    try:
+        start = time.perf_counter()
+        receivers = [pyboard.ping(value=i) for i in range(count)]
+        for (i, receiver) in enumerate(receivers):
+            response = receiver(timeout=pyboard.RESPONSE_TIMEOUT)
+            if response != {'value': i + 1}:
+                raise PyBoardError("unexpected ping response: {!r}".format(response))
+        duration = time.perf_counter() - start
+    finally:
+        pyboard.wait()
+        pyboard.async_tx = async_tx
+    return _rate(count, duration)
+
+
+def measure_stream_rate(pyboard, count=DEFAULT_COUNT):
+    """
+    Rate of objects streamed from the pyboard (unsolicited ``send()`` calls).
+
+    The pyboard sends ``count`` objects in quick succession (see the
+    ``ping_burst`` instruction); the rate they're received by the host is
+    measured.
+
+    :param pyboard: open pyboard
+    :type pyboard: :class:`PyBoard <upytester.PyBoard>`
+    :param count: number of objects sent by the pyboard
+    :type count: :class:`int`
+    :return: ``count``, ``duration`` (unit: ms), and ``rate`` (unit: per sec)
+    :rtype: :class:`dict`
+    """
+    start = time.perf_counter()
+    pyboard.ping_burst(count=count)
+    for i in range(count):
+        # sent values aren't responses; they're received as unsolicited
+        response = pyboard.receive(timeout=pyboard.RESPONSE_TIMEOUT)
+        if response != {'value': i + 1}:
+            raise PyBoardError("unexpected stream object: {!r}".format(response))
+    duration = time.perf_counter() - start
+    return _rate(count, duration)
+
+
+# ==================== Runner ====================
+def metadata(pyboard):
+    """
+    Details of the host, and the given pyboard, to identify a result set.
+
+    :param pyboard: open pyboard
+    :type pyboard: :class:`PyBoard <upytester.PyBoard>`
+    :rtype: :class:`dict`
+    """
+    return {
+        'version': RESULTS_VERSION,
+        'time': datetime.datetime.now().isoformat(),
+        'host': {
+            'upytester': upytester.__version__,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': sys.platform,
+        },
+        'target': {
+            'serial_number': pyboard.serial_number,
+            'simulated': getattr(pyboard.comport, 'transport', None),
+            'system_info': pyboard.get_system_info()(),
+            'codec': pyboard.codec,
+        },
+    }
+
+
+# Tests run by run(), in order
+TESTS = [
+    ('ping_latency', measure_ping_latency),
+    ('remote_instance', measure_remote_instance),
+    ('instruction_rate_sync', lambda p, c: measure_instruction_rate(p, c, 'sync')),
+    ('instruction_rate_async_tx', lambda p, c: measure_instruction_rate(p, c, 'async_tx')),  # noqa: E501
+    ('stream_rate', measure_stream_rate),
+]
+
+
+def run(pyboard, count=DEFAULT_COUNT, tests=None):
+    """
+    Run benchmarks against the given pyboard.
+
+    ============================= =============================================
+    Test                          Description
+    ============================= =============================================
+    ``ping_latency``              see :meth:`measure_ping_latency`
+    ``remote_instance``           see :meth:`measure_remote_instance`
+    ``instruction_rate_sync``     see :meth:`measure_instruction_rate`
+    ``instruction_rate_async_tx`` see :meth:`measure_instruction_rate`
+    ``stream_rate``               see :meth:`measure_stream_rate`
+    ============================= =============================================
+
+    :param pyboard: open pyboard
+    :type pyboard: :class:`PyBoard <upytester.PyBoard>`
+    :param count: iterations per test
+    :type count: :class:`int`
+    :param tests: names of tests to run (default: all of them)
+    :type tests: :class:`list`
+    :return: ``{'meta': {...}, 'results': {<test>: {...}, ...}}``
+    :rtype: :class:`dict`
+    """
+    test_map = TESTS
+    if tests is not None:
+        unknown = set(tests) - set(name for (name, func) in TESTS)
+        if unknown:
+            raise ValueError("unknown test(s): {!r}".format(sorted(unknown)))
+        test_map = [(name, func) for (name, func) in TESTS if name in tests]
+
+    results = {}
+    for (name, func) in test_map:
+        log.info("%r: running %s (count=%i)", pyboard, name, count)
+        results[name] = func(pyboard, count)
+
+    return {
+        'meta': metadata(pyboard),
+        'results': results,
+    }
+
+
+def save(results, filename):
+    """
+    Write results to a json file.
+
+    :param results: as returned by :meth:`run`
+    :type results: :class:`dict`
+    :param filename: file to write
+    :type filename: :class:`str`
+    """
+    with open(filename, 'w') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+
+
+def open_target(serial_number=None, simulated=None, **kwargs):
+    """
+    Open a pyboard to benchmark.
+
+    :param serial_number: serial number of a connected pyboard
+    :type serial_number: :class:`str`
+    :param simulated: if set, a :class:`SimulatedPyBoard
+                      <upytester.simulator.SimulatedPyBoard>` is used with
+                      the given transport (``'memory'`` or ``'pty'``)
+                      instead
+    :type simulated: :class:`str`
+    :param kwargs: passed to :class:`PyBoard <upytester.PyBoard>`
+    :return: open pyboard
+    :rtype: :class:`PyBoard <upytester.PyBoard>`
+    """
+    kwargs.setdefault('heartbeat', False)
+    if simulated:
+        from .simulator import SimulatedPyBoard
+        comport = SimulatedPyBoard(transport=simulated)
+        return PyBoard(serial_number or 'simulated', comport=comport, **kwargs)
+    if serial_number is None:
+        raise ValueError("a serial number, or simulated transport must be given")
+    return PyBoard(serial_number, **kwargs)
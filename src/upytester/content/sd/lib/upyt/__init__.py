@@ -2,6 +2,8 @@ __all__ = [
     'cmd',
     'utils',
     'sched',
+    'stream',
+    'capture',
 ]
 
 # Only load by pyboard
@@ -19,3 +21,5 @@ if sys.platform != 'pyboard':
 from . import cmd
 from . import utils
 from . import sched
+from . import stream
+from . import capture
@@ -0,0 +1,314 @@
+"""
+Capture ADC samples & pin edges from interrupts.
+
+Each capture is a :class:`Stream <upyt.stream.Stream>`; records are packed
+into its preallocated buffers by a timer or external interrupt callback (no
+allocation, nothing is serialised), so the capture rate is limited by the
+hardware. Records are drained to the host in bulk, either:
+
+* on request; :meth:`capture_read` returns everything buffered (up to a
+  buffer's worth), or
+* as a stream (the host's ``PyBoard.stream(<name>)``); a batch is sent as
+  soon as a buffer is full.
+
+For example, the host may capture ``X1`` at 10kHz with::
+
+    >>> pyboard.capture_adc('x1', 'X1', freq=10000)()
+    {'fmt': '<H', 'size': 4096}
+    >>> with pyboard.stream('x1') as x1:
+    ...     samples = x1.read_array(10000)
+
+or time each press of the user switch with::
+
+    >>> pyboard.capture_edges('sw', 'SW', edge='falling', pull='up')
+    >>> # ... later
+    >>> unpack_block(pyboard.capture_read('sw')())  # [(<ticks_us>, <value>), ...]
+
+or capture every CAN frame received (see the host's
+``upytester.pyboard.can``)::
+
+    >>> pyboard.can_filter(1, 0, 'mask32', 0, [0, 0])  # accept all into fifo 0
+    >>> pyboard.capture_can('rx', bus=1, fifo=0)
+    >>> # ... later
+    >>> unpack_can(pyboard.capture_read('rx')(), ids=[0x123])
+
+Captures keep running until stopped (:meth:`capture_stop`), or the host
+stops reading their stream.
+"""
+import pyb
+import time
+import struct
+
+from .stream import Stream, _streams
+from .cmd.mapping import instruction, encode_bytes
+from .cmd.can import can_bus_map
+
+BUFFER_SIZE = 4096  # bytes per buffer (2 per capture)
+CAN_BUFFER_SIZE = 9500  # 500 frames
+CAN_FMT = '<IIBBB8s'  # ticks_us, id, dlc, flags, filter match index, data
+CAN_HEADER = '<IIBBB'  # CAN_FMT, without data
+CAN_HEADER_SIZE = 11
+CAN_FLAG_RTR = 0x01
+CAN_FLAG_FIFO1 = 0x02
+TIMER = 7  # default timer used to sample (timers 3, 5 & 6 are used by pyb)
+
+EDGE_MAP = {
+    'rising': pyb.ExtInt.IRQ_RISING,
+    'falling': pyb.ExtInt.IRQ_FALLING,
+    'both': pyb.ExtInt.IRQ_RISING_FALLING,
+}
+
+PULL_MAP = {
+    None: pyb.Pin.PULL_NONE,
+    'up': pyb.Pin.PULL_UP,
+    'down': pyb.Pin.PULL_DOWN,
+}
+
+
+class Capture(Stream):
+    """
+    A :class:`Stream <upyt.stream.Stream>` of records captured by an
+    interrupt.
+
+    Records are buffered from the moment the capture is started, whether
+    or not the host is reading its stream.
+    """
+
+    def __init__(self, name, fmt, size=BUFFER_SIZE):
+        super().__init__(name, fmt=fmt, size=size)
+        self._timer = None
+        self._extint = None
+        self._can = None  # (<pyb.CAN>, <fifo>)
+        self.overflows = 0  # times frames were lost by a CAN fifo
+
+    # ------- Sources (callbacks are created here; never in an ISR)
+    def sample_adc(self, pin, freq, timer=TIMER):
+        """Sample an ADC pin at the given frequency (records: ``'<H'``)."""
+        read = pyb.ADC(pin).read
+        append = self.append
+
+        def sample(t):
+            append(read())
+        self._start_timer(timer, freq, sample)
+
+    def sample_pins(self, pins, freq, timer=TIMER):
+        """
+        Sample up to 16 pins at the given frequency (records: ``'<H'``,
+        bit ``n`` is the level of ``pins[n]``).
+        """
+        values = [pyb.Pin(p, pyb.Pin.IN).value for p in pins]
+        append = self.append
+
+        def sample(t):
+            mask = 0
+            bit = 1
+            for value in values:
+                if value():
+                    mask |= bit
+                bit <<= 1
+            append(mask)
+        self._start_timer(timer, freq, sample)
+
+    def time_edges(self, pin, edge='both', pull=None):
+        """
+        Timestamp a pin's edges (records: ``'<IB'``; ``ticks_us()``, and the
+        pin's level after the edge).
+        """
+        pin = pyb.Pin(pin, pyb.Pin.IN, PULL_MAP[pull])
+        value = pin.value
+        ticks_us = time.ticks_us
+        append2 = self.append2
+
+        def edge_cb(line):
+            append2(ticks_us(), value())
+        self._stop_source()
+        self.start(credit=0)
+        self._extint = pyb.ExtInt(pin, EDGE_MAP[edge], PULL_MAP[pull], edge_cb)
+
+    def receive_can(self, bus, fifo=0):
+        """
+        Capture CAN frames received into a fifo (records: :data:`CAN_FMT`;
+        ``ticks_us()``, id, data length, flags, filter match index, and 8
+        data bytes; only the first ``data length`` are valid).
+
+        Frames are accepted into the fifo by hardware filters (see
+        :meth:`can_filter <upyt.cmd.can.can_filter>`).
+        """
+        can = can_bus_map[bus]
+        data = memoryview(bytearray(8))
+        frame = [0, False, 0, data]  # recv() into this; id, rtr, fmi, data
+        flags = CAN_FLAG_FIFO1 if fifo else 0
+        ticks_us = time.ticks_us
+        append_frame = self._append_frame
+
+        def rx_cb(can, reason):
+            if reason == 2:  # fifo overflowed; frame(s) lost
+                self.overflows += 1
+            while can.any(fifo):
+                frame[3] = data  # recv() shortens it to the frame's length
+                can.recv(fifo, frame)
+                append_frame(ticks_us(), frame, flags)
+        self._stop_source()
+        self.start(credit=0)
+        self.overflows = 0
+        self._can = (can, fifo)
+        can.rxcallback(fifo, rx_cb)
+
+    def _append_frame(self, timestamp, frame, flags):
+        # As Stream.append (allocation free), for a frame recv()'d into a list
+        if not self.running:
+            return
+        if self._length + self.record_size > self.size:
+            self.dropped += 1
+            return
+        (id, rtr, fmi, data) = frame
+        if rtr:
+            flags |= CAN_FLAG_RTR
+        (buf, start, size) = (self._bufs[self._active], self._length + CAN_HEADER_SIZE, len(data))  # noqa: E501
+        struct.pack_into(CAN_HEADER, buf, self._length, timestamp, id, size, flags, fmi)
+        buf[start:start + size] = data  # bytes beyond size are not cleared
+        self._length += self.record_size
+        self._check_full()
+
+    def _start_timer(self, timer, freq, callback):
+        self._stop_source()
+        self.start(credit=0)
+        self._timer = pyb.Timer(timer, freq=freq)
+        self._timer.callback(callback)
+
+    def _stop_source(self):
+        if self._timer is not None:
+            self._timer.callback(None)
+            self._timer.deinit()
+            self._timer = None
+        if self._extint is not None:
+            self._extint.disable()
+            self._extint = None
+        if self._can is not None:
+            (can, fifo) = self._can
+            can.rxcallback(fifo, None)
+            self._can = None
+
+    # ------- Control
+    def start(self, credit=0):
+        """
+        Start buffering records; also sending them to the host while it has
+        credit (see :meth:`Stream.start <upyt.stream.Stream.start>`).
+        """
+        if self.running:
+            self.credit = credit  # keep what's been captured so far
+            return
+        super().start(credit)
+
+    def stop(self):
+        """Stop capturing."""
+        super().stop()
+        self._stop_source()
+
+    def info(self):
+        return {'fmt': self.fmt, 'size': self.size}
+
+
+def _capture(name, fmt, size):
+    # New capture (replacing any of the same name)
+    previous = _streams.get(name, None)
+    if previous is not None:
+        previous.stop()
+    capture = _streams[name] = Capture(name, fmt, size=size)
+    return capture
+
+
+# ------- Instructions (used by the host)
+@instruction
+def capture_adc(name, pin, freq, timer=TIMER, size=BUFFER_SIZE):
+    """
+    Start sampling an ADC pin.
+
+    :param name: capture's (and stream's) name
+    :type name: :class:`str`
+    :param pin: pin name (eg: ``'X1'``)
+    :type pin: :class:`str`
+    :param freq: sample rate (unit: Hz)
+    :type freq: :class:`int`
+    :param timer: id of timer triggering each sample
+    :type timer: :class:`int`
+    :param size: buffer size (unit: bytes)
+    :type size: :class:`int`
+    :return: ``{'fmt': <record format>, 'size': <buffer size>}``
+    """
+    capture = _capture(name, '<H', size)
+    capture.sample_adc(pin, freq, timer=timer)
+    return capture.info()
+
+
+@instruction
+def capture_pins(name, pins, freq, timer=TIMER, size=BUFFER_SIZE):
+    """
+    Start sampling the levels of (up to 16) pins.
+
+    Parameters are as for :meth:`capture_adc`, except ``pins`` is a
+    :class:`list` of pin names.
+    """
+    capture = _capture(name, '<H', size)
+    capture.sample_pins(pins, freq, timer=timer)
+    return capture.info()
+
+
+@instruction
+def capture_edges(name, pin, edge='both', pull=None, size=BUFFER_SIZE):
+    """
+    Start timestamping a pin's edges.
+
+    :param edge: ``'rising'``, ``'falling'``, or ``'both'``
+    :type edge: :class:`str`
+    :param pull: ``'up'``, ``'down'``, or ``None``
+    :type pull: :class:`str`
+
+    Other parameters are as for :meth:`capture_adc`.
+    """
+    capture = _capture(name, '<IB', size)
+    capture.time_edges(pin, edge=edge, pull=pull)
+    return capture.info()
+
+
+@instruction
+def capture_can(name, bus, fifo=0, size=CAN_BUFFER_SIZE):
+    """
+    Start capturing CAN frames received into a fifo.
+
+    :param bus: bus number (1 or 2; configured with ``config_can``)
+    :type bus: :class:`int`
+    :param fifo: receive fifo (0 or 1)
+    :type fifo: :class:`int`
+
+    Other parameters are as for :meth:`capture_adc`.
+    """
+    capture = _capture(name, CAN_FMT, size)
+    capture.receive_can(bus, fifo=fifo)
+    return capture.info()
+
+
+@instruction
+def capture_read(name):
+    """
+    Drain the named capture's buffered records.
+
+    :return: ``{'fmt': <record format>, 'data': <packed records>,
+             'dropped': <records dropped so far>, 'overflows': <times a CAN
+             fifo overflowed>}`` (``data`` is base64 encoded with the json
+             codec)
+    """
+    capture = _streams[name]
+    data = capture.drain()
+    return {
+        'fmt': capture.fmt,
+        'data': encode_bytes(data),
+        'dropped': capture.dropped,
+        'overflows': capture.overflows,
+    }
+
+
+@instruction
+def capture_stop(name):
+    """Stop the named capture (buffered records may still be read)."""
+    _streams[name].stop()
@@ -29,3 +29,5 @@ from . import can
 _gc.collect()
 from . import spi
 _gc.collect()
+from . import files
+_gc.collect()
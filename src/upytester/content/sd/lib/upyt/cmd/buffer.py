@@ -0,0 +1,237 @@
+"""
+Preallocated buffers for assembling data received from the host, and for
+peripheral transfers.
+"""
+import micropython
+import struct
+
+LINE_BUFFER_SIZE = 2048  # maximum length of a single line (unit: bytes)
+TRANSFER_BUFFER_SIZE = 256  # initial size of a transfer buffer (unit: bytes)
+LINE_TERMINATOR = 0x0d  # '\r'
+
+FRAME_MARKER = 0xFE
+FRAME_HEADER_FORMAT = '<BH'  # marker, payload length
+FRAME_HEADER_SIZE = 3
+MAX_FRAME_SIZE = 0xFFFF  # largest payload a frame can carry (unit: bytes)
+
+# Largest peripheral transfer; its data, returned in a response, must fit
+# in a single frame (with the response's header) (unit: bytes)
+MAX_TRANSFER_SIZE = 0xFF00
+
+
+class FramingError(ValueError):
+    """Raised when a frame does not start with a marker."""
+
+
+class OversizeError(ValueError):
+    """
+    Raised when a line (or frame) is too long for the buffer.
+
+    The line is discarded (including the rest of it, as it's received), so
+    the next line can still be read.
+    """
+
+
+class LineBuffer:
+    r"""
+    Assemble ``\r`` terminated lines from a stream.
+
+    Received bytes are read directly into a preallocated :class:`bytearray`
+    (via :class:`memoryview`), so no objects are created per received byte.
+
+    Usage::
+
+        buf = LineBuffer()
+        while True:
+            if buf.fill(stream):
+                line = buf.readline()
+                while line is not None:
+                    process(line)
+                    line = buf.readline()
+
+    :param size: capacity of buffer (longest line that can be received)
+    :type size: :class:`int`
+    :param data: bytes already received (optional)
+    :type data: :class:`bytes`
+    """
+
+    def __init__(self, size=LINE_BUFFER_SIZE, data=b''):
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.start = 0  # index of first unconsumed byte
+        self.scan = 0  # index of first byte not yet checked for a terminator
+        self.end = len(data)  # index after the last received byte
+        self.skip = False  # discarding the remainder of an oversized line
+        if data:
+            self.buf[0:self.end] = data
+
+    def pending(self):
+        """
+        Received bytes that have not been consumed.
+
+        :rtype: :class:`bytes`
+        """
+        return bytes(self.view[self.start:self.end])
+
+    def _compact(self):
+        # Move unconsumed data to the start of the buffer
+        length = self.end - self.start
+        if length:
+            self.buf[0:length] = self.view[self.start:self.end]
+        self.scan -= self.start
+        self.start = 0
+        self.end = length
+
+    def fill(self, stream):
+        """
+        Read all bytes pending on the given stream into the buffer.
+
+        :param stream: stream to read from (eg: :class:`pyb.USB_VCP`)
+        :return: number of bytes read
+        :rtype: :class:`int`
+        """
+        if not stream.any():
+            return 0
+
+        if self.start == self.end:
+            self.start = self.scan = self.end = 0  # empty; reset for free
+        elif self.end == len(self.buf):
+            if self.start == 0:
+                self.start = self.scan = self.end = 0  # discard
+                self.skip = True  # ... up to the next terminator
+                raise OversizeError("received line exceeds {} bytes".format(len(self.buf)))
+            self._compact()
+
+        count = stream.readinto(self.view[self.end:])
+        if count:
+            self.end += count
+            return count
+        return 0
+
+    @micropython.native
+    def _find_terminator(self):
+        buf = self.buf
+        i = self.scan
+        end = self.end
+        while i < end:
+            if buf[i] == LINE_TERMINATOR:
+                return i
+            i += 1
+        self.scan = end  # nothing found; don't check these bytes again
+        return -1
+
+    def readline(self):
+        """
+        Pop the next complete line from the buffer.
+
+        :return: line (not including terminator), or ``None`` if no
+                 complete line has been received.
+        :rtype: :class:`bytes`
+        """
+        i = self._find_terminator()
+        if self.skip:
+            # remainder of an oversized line
+            if i < 0:
+                self.start = self.end  # discard
+                return None
+            self.skip = False
+            self.start = self.scan = i + 1
+            i = self._find_terminator()
+        if i < 0:
+            return None
+        line = bytes(self.view[self.start:i])
+        self.start = self.scan = i + 1
+        return line
+
+
+class FrameBuffer(LineBuffer):
+    """
+    Assemble length-prefixed frames from a stream.
+
+    Each frame is a marker byte (``0xFE``), followed by the payload length
+    (2 bytes, little endian), then the payload.
+
+    Used just like a :class:`LineBuffer`, but :meth:`readline` returns each
+    frame's payload.
+    """
+
+    def readline(self):
+        """
+        Pop the next complete frame's payload from the buffer.
+
+        :return: payload, or ``None`` if no complete frame has been received.
+        :rtype: :class:`bytes`
+        :raises: :class:`FramingError` if the data doesn't start with a
+                 frame marker.
+        :raises: :class:`OversizeError` if the frame is larger than the
+                 buffer (it's discarded as it's received).
+        """
+        if self.skip:
+            # remainder of an oversized frame
+            count = min(self.skip, self.end - self.start)
+            self.start = self.scan = self.start + count
+            self.skip -= count
+            if self.skip:
+                return None
+        available = self.end - self.start
+        if available < 1:
+            return None
+        if self.buf[self.start] != FRAME_MARKER:
+            raise FramingError("frame marker expected")
+        if available < FRAME_HEADER_SIZE:
+            return None
+
+        (_, size) = struct.unpack_from(FRAME_HEADER_FORMAT, self.buf, self.start)
+        if FRAME_HEADER_SIZE + size > len(self.buf):
+            self.skip = FRAME_HEADER_SIZE + size  # bytes to discard
+            raise OversizeError("received frame exceeds {} bytes".format(len(self.buf)))
+        if available < FRAME_HEADER_SIZE + size:
+            return None
+
+        start = self.start + FRAME_HEADER_SIZE
+        self.start = self.scan = start + size
+        return bytes(self.view[start:self.start])
+
+
+class TransferBuffer:
+    """
+    Reusable storage for data received by a peripheral (eg: SPI).
+
+    Data is received directly into the buffer (eg: ``spi.recv(view)``,
+    ``spi.send_recv(data, view)``), instead of a new object being created
+    by each transfer::
+
+        rx = TransferBuffer()
+        view = rx.get(64)
+        spi.recv(view)
+
+    The buffer is only reallocated if a larger transfer is requested.
+
+    :param size: initial capacity
+    :type size: :class:`int`
+    :raises ValueError: if a size exceeds :data:`MAX_TRANSFER_SIZE`
+    """
+
+    def __init__(self, size=TRANSFER_BUFFER_SIZE):
+        self._check(size)
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+
+    def get(self, size):
+        """
+        Storage for a transfer of ``size`` bytes; valid until the next call.
+
+        :rtype: :class:`memoryview`
+        """
+        if size > len(self.buf):
+            self._check(size)
+            self.view = None  # release before allocating
+            self.buf = None
+            self.buf = bytearray(size)
+            self.view = memoryview(self.buf)
+        return self.view[:size]
+
+    @staticmethod
+    def _check(size):
+        if size > MAX_TRANSFER_SIZE:
+            raise ValueError("transfer of {} bytes exceeds {}".format(size, MAX_TRANSFER_SIZE))
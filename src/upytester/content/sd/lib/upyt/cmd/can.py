@@ -1,20 +1,23 @@
 import pyb
+import time
+import machine
 import micropython
-import uasyncio as asyncio
 
-from .mapping import instruction, send
+try:
+    import uheapq as heapq
+except ImportError:  # simulated (CPython)
+    import heapq
 
-import upyt.sched
+from .mapping import instruction, decode_bytes
 
 # ------- Maps
 can_bus_map = {}
-can_tx_msg = {}  # format: {can: {id: (data, period), ... }, ...}
 
 
 # ------- Configure
 
 @instruction
-def config_can(send, bus, mode='normal', extframe=False, prescaler=100, sjw=1, bs1=6, bs2=8, auto_restart=False):
+def config_can(bus, mode='normal', extframe=False, prescaler=100, sjw=1, bs1=6, bs2=8, auto_restart=False):
     """
     Configure CAN bus
 
@@ -39,7 +42,7 @@ def config_can(send, bus, mode='normal', extframe=False, prescaler=100, sjw=1, b
 
 
 @instruction
-def can_state(send, bus):
+def can_state(bus):
     """
     Get the state of a previously configured CAN bus.
 
@@ -49,11 +52,10 @@ def can_state(send, bus):
     Response::
 
         {
-            'r': 'can_state',  # in response to can_state request
             'state': x,  # CAN bus state, as string (or None if not configured)
         }
     """
-    response = {'r': 'can_state', 'state': None}
+    response = {'state': None}
     can = can_bus_map.get(bus, None)
     if can is not None:
         response['state'] = {
@@ -64,32 +66,298 @@ def can_state(send, bus):
             pyb.CAN.BUS_OFF: 'bus_off',
         }.get(can.state(), '???')
 
-    send(response)
+    return response
+
+
+FILTER_MODE_MAP = {
+    'list16': pyb.CAN.LIST16,
+    'mask16': pyb.CAN.MASK16,
+    'list32': pyb.CAN.LIST32,
+    'mask32': pyb.CAN.MASK32,
+}
+
+
+@instruction
+def can_filter(bus, bank, mode, fifo, params):
+    """
+    Configure a hardware filter bank; frames it accepts are received into
+    the given fifo (see :meth:`upyt.capture.capture_can`).
+
+    :param bus: bus number (1 or 2)
+    :type bus: :class:`int`
+    :param bank: filter bank (0 to 27)
+    :type bank: :class:`int`
+    :param mode: ``'list16'``, ``'mask16'``, ``'list32'``, or ``'mask32'``
+    :type mode: :class:`str`
+    :param fifo: receive fifo (0 or 1)
+    :type fifo: :class:`int`
+    :param params: ids (list modes), or ``id, mask`` pairs (mask modes), as
+                   per ``pyb.CAN.setfilter``
+    :type params: :class:`list`
+
+    For example, to receive every frame into fifo 0::
+
+        can_filter(1, 0, 'mask32', 0, [0, 0])
+    """
+    can_bus_map[bus].setfilter(bank, FILTER_MODE_MAP[mode], fifo, params)
+
+
+@instruction
+def can_clear_filter(bus, bank):
+    """Clear (disable) a hardware filter bank."""
+    can_bus_map[bus].clearfilter(bank)
 
 
 # ------- Transmit / Receive : Basic
 @instruction
-def can_tx(send, bus, id, data, rtr=False):
+def can_tx(bus, id, data, rtr=False):
     can = can_bus_map[bus]
-    can.send(bytes(data), id, rtr=rtr)
-
-def _can_tx_p_callback(bus, id):
-    # Continually transmit until mapped reference is gone
-    #   or an error occurs
-    if id in can_tx_msg[bus]:
-        (d, p) = can_tx_msg[bus][id]
-        can = can_bus_map[bus]
+    can.send(decode_bytes(data), id, rtr=rtr)
+
+
+# ------- Transmit : Periodic
+TIMER = 14  # timer driving periodic transmission (see upyt.capture for others)
+TICK_HZ = 1000  # dispatcher's resolution; periods are a whole number of ticks
+NEVER = 0x3fffffff  # deadline of an empty queue (largest small int)
+REBASE = 0x10000000  # tick count reset before it nears NEVER (~3 days)
+
+
+class PeriodicFrame:
+    """
+    A frame transmitted periodically, with its timing statistics.
+
+    Jitter is the time from a frame's deadline (the tick it was due) to
+    its transmission.
+    """
+
+    def __init__(self, can, bus, id, data, period):
+        self.can = can
+        self.bus = bus
+        self.id = id
+        self.data = data
+        self.period = period  # unit: ticks
+        self.entry = None  # [<due>, <seq>, <self>] queued by PeriodicTx
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.sent = 0
+        self.errors = 0  # transmissions failed
+        self.missed = 0  # deadlines skipped; dispatched a whole period late
+        self.jitter_max = 0  # unit: us
+        self.jitter_sum = 0  # unit: us
+
+    def stats(self):
+        return {
+            'bus': self.bus,
+            'id': self.id,
+            'period': self.period,
+            'sent': self.sent,
+            'errors': self.errors,
+            'missed': self.missed,
+            'jitter_max_us': self.jitter_max,
+            'jitter_mean_us': (self.jitter_sum // self.sent) if self.sent else 0,
+        }
+
+
+class PeriodicTx:
+    """
+    Transmits every periodic frame from a single dispatcher, driven by a
+    hardware timer.
+
+    Frames are queued by deadline (a heap of ``[<due>, <seq>, <frame>]``,
+    in timer ticks). The timer's callback only counts ticks, and schedules
+    :meth:`dispatch` (with :func:`micropython.schedule`) once the earliest
+    deadline is reached; so transmission isn't delayed by tasks on the
+    event loop, and the cost of a tick doesn't grow with the number of
+    frames.
+
+    :param timer: id of timer
+    :type timer: :class:`int`
+    :param freq: tick frequency (unit: Hz)
+    :type freq: :class:`int`
+    """
+
+    def __init__(self, timer=TIMER, freq=TICK_HZ):
+        self.timer_id = timer
+        self.freq = freq
+        self._us_per_tick = 1000000 // freq
+        self._timer = None
+
+        self.now = 0  # ticks counted
+        self._tick_us = 0  # ticks_us() of latest tick
+        self._next_due = NEVER
+
+        self._frames = {}  # format: {(<bus>, <id>): <PeriodicFrame>, ...}
+        self._queue = []  # heap, earliest deadline first
+        self._seq = 0  # orders frames due on the same tick
+        self._updating = False  # queue is being changed; defer dispatch
+
+        # Bound once; an ISR can't allocate memory
+        self._dispatch_pending = False
+        self._tick_ref = self._tick
+        self._dispatch_ref = self._scheduled_dispatch
+
+    # ------- Timer (ISR)
+    def _tick(self, timer):
+        self.now += 1
+        self._tick_us = time.ticks_us()
+        if (self.now >= self._next_due) and not self._dispatch_pending:
+            self._dispatch_pending = True
+            try:
+                micropython.schedule(self._dispatch_ref, None)
+            except RuntimeError:  # schedule queue is full; retry next tick
+                self._dispatch_pending = False
+
+    def _scheduled_dispatch(self, arg):
+        self._dispatch_pending = False
+        if not self._updating:  # otherwise, retried next tick
+            self.dispatch()
+
+    # ------- Dispatch
+    def dispatch(self):
+        """Transmit each frame that's due."""
+        queue = self._queue
+        while queue and (queue[0][0] <= self.now):
+            entry = heapq.heappop(queue)
+            frame = entry[2]
+            if frame.entry is not entry:
+                continue  # stopped, or re-queued
+
+            (due, now) = (entry[0], self.now)
+            try:
+                frame.can.send(frame.data, frame.id, timeout=0)
+            except OSError:
+                # Common reason(s):
+                #   - Transmitted frame ACK bit not set
+                #       (occurs if all other ECUs are off or passive)
+                #   - All transmit mailboxes are full
+                frame.errors += 1  # retry next period
+            else:
+                jitter = ((now - due) * self._us_per_tick) + time.ticks_diff(time.ticks_us(), self._tick_us)  # noqa: E501
+                frame.sent += 1
+                frame.jitter_sum += jitter
+                if jitter > frame.jitter_max:
+                    frame.jitter_max = jitter
+
+            # Next deadline; deadlines already passed are skipped (not sent
+            # in a burst)
+            due += frame.period
+            if due <= now:
+                missed = ((now - due) // frame.period) + 1
+                frame.missed += missed
+                due += missed * frame.period
+            entry[0] = due
+            heapq.heappush(queue, entry)
+
+        if self.now >= REBASE:
+            self._rebase()
+        self._next_due = queue[0][0] if queue else NEVER
+
+    def _rebase(self):
+        # Keep tick counts small (an ISR can't allocate a large int)
+        state = machine.disable_irq()
+        offset = self.now
+        self.now = 0
+        machine.enable_irq(state)
+        for entry in self._queue:
+            entry[0] -= offset
+
+    def _queue_frame(self, frame, due):
+        # (called while self._updating)
+        self._seq += 1
+        frame.entry = [due, self._seq, frame]
+        heapq.heappush(self._queue, frame.entry)
+
+    # ------- Control
+    def set(self, frames):
+        """
+        Add, or update periodic frames.
+
+        A new frame is sent on the next tick. An updated frame's data is
+        sent from its next deadline; if its period has changed, the next
+        deadline is moved to one (new) period after its last transmission.
+
+        :param frames: list of ``(<bus>, <id>, <data>, <period>)``
+        :type frames: :class:`list`
+        """
+        self._updating = True
+        try:
+            for (bus, id, data, period) in frames:
+                period = max(int(period), 1)
+                frame = self._frames.get((bus, id), None)
+                if frame is None:
+                    frame = PeriodicFrame(can_bus_map[bus], bus, id, data, period)
+                    self._frames[(bus, id)] = frame
+                    self._queue_frame(frame, self.now + 1)
+                else:
+                    frame.data = data
+                    if period != frame.period:
+                        due = frame.entry[0] - frame.period + period
+                        frame.period = period
+                        self._queue_frame(frame, max(due, self.now + 1))
+        finally:  # frames set before any error are still sent
+            self._updating = False
+            self._next_due = self._queue[0][0] if self._queue else NEVER
+            if self._frames:
+                self.start()
+
+    def stop(self, keys=None):
+        """
+        Stop periodic frames.
+
+        :param keys: list of ``(<bus>, <id>)`` (default: stop all)
+        :type keys: :class:`list`
+        """
+        self._updating = True
         try:
-            can.send(d, id)
-        except OSError:  # raised if error during transmission
-            # Common reason(s):
-            #   - Transmitted frame ACK bit not set
-            #       (occurs if all other ECUs are off or passive)
-            pass  # do nothing; retry next period
-        sched.loop.call_later_ms(p, _can_tx_p_callback, bus, id)
+            if keys is None:
+                keys = list(self._frames.keys())
+            for (bus, id) in keys:
+                frame = self._frames.pop((bus, id), None)
+                if frame is not None:
+                    frame.entry = None  # removed from queue when it's next due
+        finally:
+            self._updating = False
+        if not self._frames:
+            self._stop_timer()
+
+    def start(self):
+        """Start the timer (if not already)."""
+        if self._timer is None:
+            self._timer = pyb.Timer(self.timer_id, freq=self.freq)
+            self._timer.callback(self._tick_ref)
+
+    def _stop_timer(self):
+        """Stop the timer; nothing is sent until frames are set."""
+        if self._timer is not None:
+            self._timer.callback(None)
+            self._timer.deinit()
+            self._timer = None
+        self._queue = []
+        self._next_due = NEVER
+        self.now = 0
+
+    def stats(self, bus=None, reset=False):
+        """
+        Timing statistics of each periodic frame (sorted by bus, then id).
+
+        :rtype: :class:`list` of :class:`dict` (see :meth:`PeriodicFrame.stats`)
+        """
+        stats = []
+        for key in sorted(self._frames.keys()):
+            frame = self._frames[key]
+            if bus in (None, frame.bus):
+                stats.append(frame.stats())
+                if reset:
+                    frame.reset_stats()
+        return stats
+
+
+periodic_tx = PeriodicTx()
+
 
 @instruction
-def can_tx_p(send, bus, id, data, period):
+def can_tx_p(bus, id, data, period):
     """
     Send a CAN message periodically
 
@@ -102,26 +370,70 @@ def can_tx_p(send, bus, id, data, period):
     :param period: time between transmissions (ms)
     :type period: :class:`int`
     """
-    can = can_bus_map[bus]
-    if bus not in can_tx_msg:
-        can_tx_msg[bus] = {}
+    periodic_tx.set([(bus, id, decode_bytes(data), period)])
+
+
+@instruction
+def can_tx_p_set(frames):
+    """
+    Send (or update) many periodic CAN messages at once.
+
+    :param frames: list of ``[bus, id, data, period]`` (as for
+                   :meth:`can_tx_p`)
+    :type frames: :class:`list`
+    """
+    periodic_tx.set([
+        (bus, id, decode_bytes(data), period)
+        for (bus, id, data, period) in frames
+    ])
+
+
+@instruction
+def can_tx_p_stop(bus, id):
+    periodic_tx.stop([(bus, id)])
+
+
+@instruction
+def can_tx_p_stop_set(frames):
+    """
+    Stop many periodic CAN messages at once.
 
-    start_async = True
-    if id in can_tx_msg[bus]:
-        start_async = False  # should already be running,
-                             # just change data & period
-    can_tx_msg[bus][id] = (bytes(data), period)
+    :param frames: list of ``[bus, id]``
+    :type frames: :class:`list`
+    """
+    periodic_tx.stop([(bus, id) for (bus, id) in frames])
 
-    if start_async:
-        sched.loop.call_later_ms(0, _can_tx_p_callback, bus, id)
 
 @instruction
-def can_tx_p_stop(send, bus, id):
-    if bus in can_tx_msg:
-        if id in can_tx_msg[bus]:
-            del can_tx_msg[bus][id]
-            # removal of this key will stop recursion of async function
+def can_tx_p_stopall(bus=None):
+    if bus is None:
+        periodic_tx.stop()
+    else:
+        periodic_tx.stop([key for key in periodic_tx._frames if key[0] == bus])
+
 
 @instruction
-def can_tx_p_stopall(send, bus):
-    can_tx_msg[bus] = {}
+def can_tx_p_stats(bus=None, reset=False):
+    """
+    Timing statistics of each periodic CAN message.
+
+    :param bus: bus number (default: all buses)
+    :type bus: :class:`int`
+    :param reset: if ``True``, statistics are reset once they're returned
+    :type reset: :class:`bool`
+
+    Response::
+
+        [
+            {
+                'bus': 1, 'id': 0x123, 'period': 10,  # period unit: ms
+                'sent': 1000,  # frames sent
+                'errors': 0,  # transmissions that failed
+                'missed': 0,  # deadlines skipped (dispatched a period late)
+                'jitter_max_us': 130,  # time from deadline to transmission
+                'jitter_mean_us': 21,
+            },
+            ...
+        ]
+    """
+    return periodic_tx.stats(bus=bus, reset=reset)
@@ -0,0 +1,230 @@
+"""
+Serialisation of objects sent between pyboard and host.
+
+The host's equivalent (with a full description of each format) is
+``upytester.pyboard.codec``.
+"""
+import json
+import struct
+
+from .buffer import LineBuffer, FrameBuffer
+from .buffer import FRAME_MARKER, FRAME_HEADER_FORMAT, MAX_FRAME_SIZE
+
+
+# -------------- JSON --------------
+class JSONCodec:
+    """Human readable (default) codec; ``\\r`` terminated json."""
+
+    name = 'json'
+    buffer = LineBuffer
+    OK = b'ok\r'
+
+    @staticmethod
+    def encode(obj):
+        return json.dumps(obj).encode()
+
+    @staticmethod
+    def decode(payload):
+        return json.loads(payload)
+
+    @staticmethod
+    def frame(payload):
+        return payload + b'\r'
+
+
+# -------------- Binary --------------
+def _pack(obj, out):
+    if obj is None:
+        out.append(0xC0)
+    elif obj is True:
+        out.append(0xC3)
+    elif obj is False:
+        out.append(0xC2)
+    elif isinstance(obj, int):
+        if obj >= 0:
+            if obj <= 0xFF:
+                out.append(0xCC)
+                out.append(obj)
+            elif obj <= 0xFFFF:
+                out.append(0xCD)
+                out.extend(struct.pack('<H', obj))
+            elif obj <= 0xFFFFFFFF:
+                out.append(0xCE)
+                out.extend(struct.pack('<I', obj))
+            else:
+                out.append(0xD3)
+                out.extend(struct.pack('<q', obj))
+        elif obj >= -32:
+            out.append(obj & 0xFF)  # negative fixint
+        elif obj >= -0x8000:
+            out.append(0xD1)
+            out.extend(struct.pack('<h', obj))
+        elif obj >= -0x80000000:
+            out.append(0xD2)
+            out.extend(struct.pack('<i', obj))
+        else:
+            out.append(0xD3)
+            out.extend(struct.pack('<q', obj))
+    elif isinstance(obj, float):
+        out.append(0xCA)
+        out.extend(struct.pack('<f', obj))
+    elif isinstance(obj, str):
+        data = obj.encode()
+        size = len(data)
+        if size <= 31:
+            out.append(0xA0 | size)
+        elif size <= 0xFF:
+            out.append(0xD9)
+            out.append(size)
+        elif size <= 0xFFFF:
+            out.append(0xDA)
+            out.extend(struct.pack('<H', size))
+        else:
+            raise ValueError("cannot pack str of {} bytes".format(size))
+        out.extend(data)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        size = len(obj)
+        if size <= 0xFF:
+            out.append(0xC4)
+            out.append(size)
+        elif size <= 0xFFFF:
+            out.append(0xC5)
+            out.extend(struct.pack('<H', size))
+        else:
+            raise ValueError("cannot pack {} bytes".format(size))
+        out.extend(obj)
+    elif isinstance(obj, (list, tuple)):
+        size = len(obj)
+        if size <= 15:
+            out.append(0x90 | size)
+        elif size <= 0xFFFF:
+            out.append(0xDC)
+            out.extend(struct.pack('<H', size))
+        else:
+            raise ValueError("cannot pack list of {} items".format(size))
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        size = len(obj)
+        if size <= 15:
+            out.append(0x80 | size)
+        elif size <= 0xFFFF:
+            out.append(0xDE)
+            out.extend(struct.pack('<H', size))
+        else:
+            raise ValueError("cannot pack dict of {} items".format(size))
+        for (key, value) in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError("cannot pack {!r}".format(obj))
+
+
+def pack(obj):
+    """Encode the given object in the binary tagged value format."""
+    out = bytearray()
+    _pack(obj, out)
+    return out
+
+
+# tag: (struct format, size)
+_FIXED_FORMATS = {
+    0xCA: ('<f', 4),
+    0xCB: ('<d', 8),
+    0xCC: ('<B', 1),
+    0xCD: ('<H', 2),
+    0xCE: ('<I', 4),
+    0xD0: ('<b', 1),
+    0xD1: ('<h', 2),
+    0xD2: ('<i', 4),
+    0xD3: ('<q', 8),
+}
+
+
+def _unpack(data, i):
+    # returns: (<obj>, <index after obj>)
+    tag = data[i]
+    i += 1
+    if tag >= 0xE0:
+        return (tag - 0x100, i)
+    elif tag < 0x80:
+        raise ValueError("invalid tag")
+    elif tag < 0x90:
+        (count, is_map) = (tag & 0x0F, True)
+    elif tag < 0xA0:
+        (count, is_map) = (tag & 0x0F, False)
+    elif tag < 0xC0:
+        size = tag & 0x1F
+        return (str(data[i:i + size], 'utf-8'), i + size)
+    elif tag in _FIXED_FORMATS:
+        (fmt, size) = _FIXED_FORMATS[tag]
+        return (struct.unpack_from(fmt, data, i)[0], i + size)
+    elif tag == 0xC0:
+        return (None, i)
+    elif tag == 0xC2:
+        return (False, i)
+    elif tag == 0xC3:
+        return (True, i)
+    elif tag in (0xC4, 0xD9):
+        size = data[i]
+        value = data[i + 1:i + 1 + size]
+        return (str(value, 'utf-8') if tag == 0xD9 else value, i + 1 + size)
+    elif tag in (0xC5, 0xDA):
+        size = struct.unpack_from('<H', data, i)[0]
+        value = data[i + 2:i + 2 + size]
+        return (str(value, 'utf-8') if tag == 0xDA else value, i + 2 + size)
+    elif tag in (0xDC, 0xDE):
+        count = struct.unpack_from('<H', data, i)[0]
+        is_map = (tag == 0xDE)
+        i += 2
+    else:
+        raise ValueError("invalid tag")
+
+    # Containers
+    if is_map:
+        obj = {}
+        for _ in range(count):
+            (key, i) = _unpack(data, i)
+            (obj[key], i) = _unpack(data, i)
+    else:
+        obj = []
+        for _ in range(count):
+            (item, i) = _unpack(data, i)
+            obj.append(item)
+    return (obj, i)
+
+
+def unpack(data):
+    """Decode a value from the binary tagged value format."""
+    (obj, i) = _unpack(data, 0)
+    if i != len(data):
+        raise ValueError("unexpected bytes after value")
+    return obj
+
+
+class BinaryCodec:
+    """Compact, length-prefixed codec."""
+
+    name = 'bin'
+    buffer = FrameBuffer
+    OK = struct.pack(FRAME_HEADER_FORMAT, FRAME_MARKER, 2) + b'ok'
+
+    @staticmethod
+    def encode(obj):
+        return pack(obj)
+
+    @staticmethod
+    def decode(payload):
+        return unpack(payload)
+
+    @staticmethod
+    def frame(payload):
+        if len(payload) > MAX_FRAME_SIZE:
+            raise ValueError("cannot frame {} bytes".format(len(payload)))
+        return struct.pack(FRAME_HEADER_FORMAT, FRAME_MARKER, len(payload)) + payload
+
+
+CODEC_MAP = {
+    JSONCodec.name: JSONCodec,
+    BinaryCodec.name: BinaryCodec,
+}
@@ -0,0 +1,197 @@
+"""
+File transfer over the serial port (no mass-storage mount required).
+
+Used by the host's ``upytester.pyboard.transfer`` module to deploy files;
+the host compares each file's hash (see :meth:`file_index`), and only
+uploads those that have changed, in chunks (see :meth:`file_write`).
+"""
+import os
+
+try:
+    import uhashlib as hashlib
+    import ubinascii as binascii
+except ImportError:  # simulated (CPython)
+    import hashlib
+    import binascii
+
+from .mapping import instruction
+
+HASH_BLOCK_SIZE = 512
+PART_SUFFIX = '.part'  # files being uploaded (renamed once verified)
+S_IFDIR = 0x4000
+
+
+def _join(*parts):
+    return '/'.join(p.rstrip('/') for p in parts if p)
+
+
+def _is_dir(path):
+    try:
+        return bool(os.stat(path)[0] & S_IFDIR)
+    except OSError:
+        return False
+
+
+def _makedirs(path):
+    # Create folder (and its parents)
+    parts = path.split('/')
+    for i in range(1, len(parts) + 1):
+        partial = '/'.join(parts[:i])
+        if partial and not _is_dir(partial):
+            os.mkdir(partial)
+
+
+def _hash_file(filename):
+    h = hashlib.sha256()
+    buf = bytearray(HASH_BLOCK_SIZE)
+    size = 0
+    with open(filename, 'rb') as fh:
+        while True:
+            count = fh.readinto(buf)
+            if not count:
+                break
+            h.update(buf[:count] if count < HASH_BLOCK_SIZE else buf)
+            size += count
+    return (size, binascii.hexlify(h.digest()).decode())
+
+
+def _walk(root, prefix=''):
+    # Yield relative path of each file in tree
+    for name in sorted(os.listdir(_join(root, prefix) if prefix else root)):
+        path = _join(prefix, name)
+        if _is_dir(_join(root, path)):
+            for subpath in _walk(root, path):
+                yield subpath
+        else:
+            yield path
+
+
+# ------- index
+@instruction
+def file_index(root):
+    """
+    Size & sha256 of every file in a folder.
+
+    :param root: folder (eg: ``'/sd'``)
+    :type root: :class:`str`
+    :return: ``{<relative path>: [<size>, <sha256 hex>], ...}`` (empty if
+             ``root`` does not exist)
+    :rtype: :class:`dict`
+    """
+    if not _is_dir(root):
+        return {}
+    return {path: list(_hash_file(_join(root, path))) for path in _walk(root)}
+
+
+@instruction
+def file_size(path):
+    """
+    Size of a file (unit: bytes), or ``None`` if it doesn't exist.
+    """
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return None
+
+
+# ------- upload
+_upload = {}  # file being uploaded; keys: path, fh, hash, size
+
+
+def _close_upload():
+    if _upload:
+        _upload['fh'].close()
+        _upload.clear()
+
+
+@instruction
+def file_write(path, data, offset=0):
+    """
+    Write a chunk of a file being uploaded.
+
+    Data is written to ``<path>.part``; it replaces ``path`` once
+    :meth:`file_commit` verifies its hash. Chunks must be written in order.
+
+    :param path: destination filename
+    :type path: :class:`str`
+    :param data: chunk content (a base64 encoded :class:`str` with the json
+                 codec)
+    :type data: :class:`bytes`
+    :param offset: chunk's position in the file; ``0`` starts a new upload
+    :type offset: :class:`int`
+    """
+    if isinstance(data, str):
+        data = binascii.a2b_base64(data)
+
+    if offset == 0:
+        _close_upload()
+        folder = path.rsplit('/', 1)[0] if '/' in path else ''
+        if folder:
+            _makedirs(folder)
+        _upload['path'] = path
+        _upload['fh'] = open(path + PART_SUFFIX, 'wb')
+        _upload['hash'] = hashlib.sha256()
+        _upload['size'] = 0
+    elif (_upload.get('path') != path) or (_upload['size'] != offset):
+        raise ValueError("chunk out of sequence: {!r} @ {}".format(path, offset))
+
+    _upload['fh'].write(data)
+    _upload['hash'].update(data)
+    _upload['size'] += len(data)
+
+
+@instruction
+def file_commit(path, sha256):
+    """
+    Complete an upload started by :meth:`file_write`.
+
+    :param path: destination filename
+    :type path: :class:`str`
+    :param sha256: expected hash of content (hex)
+    :type sha256: :class:`str`
+    :raises ValueError: if the content does not match the given hash (the
+                        partial file is removed, ``path`` is unchanged)
+    """
+    if _upload.get('path') != path:
+        raise ValueError("no upload in progress for {!r}".format(path))
+    digest = binascii.hexlify(_upload['hash'].digest()).decode()
+    _close_upload()
+
+    if digest != sha256:
+        os.remove(path + PART_SUFFIX)
+        raise ValueError("hash mismatch for {!r}".format(path))
+    try:
+        os.remove(path)  # FAT can't rename over an existing file
+    except OSError:
+        pass
+    os.rename(path + PART_SUFFIX, path)
+
+
+# ------- remove
+@instruction
+def file_remove(paths, root=None):
+    """
+    Remove files, then folders left empty (up to, but excluding ``root``).
+
+    :param paths: filenames to remove
+    :type paths: :class:`list`
+    :param root: top of tree files were removed from
+    :type root: :class:`str`
+    """
+    folders = set()
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # already removed
+        while root and ('/' in path):
+            path = path.rsplit('/', 1)[0]
+            if len(path) <= len(root.rstrip('/')):
+                break
+            folders.add(path)
+
+    for folder in sorted(folders, key=len, reverse=True):  # deepest first
+        try:
+            os.rmdir(folder)  # fails if not empty
+        except OSError:
+            pass
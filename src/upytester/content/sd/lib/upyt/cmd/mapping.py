@@ -1,8 +1,15 @@
 """Decorators and inherant upyt instructions for querying."""
-import json
 import gc
 
+try:
+    import uhashlib as hashlib
+    import ubinascii as binascii
+except ImportError:
+    import hashlib
+    import binascii
+
 from .types import type_gen_func, type_func
+from .codec import JSONCodec, CODEC_MAP
 
 # -------------- Instructions --------------
 _instruction_map = {}
@@ -131,18 +138,41 @@ def list_remote_classes():
 @instruction
 def clean_remote_classes():
     """Remove all instances from map and re-claim memory."""
-    while _remote_instance_map:
-        for (i, obj) in _remote_instance_map.items():
-            del_func = getattr(obj, '__del__', None)
-            if del_func:
-                del_func()
-            del _remote_instance_map[i]
-        gc.collect()
+    for i in list(_remote_instance_map.keys()):
+        obj = _remote_instance_map.pop(i)
+        del_func = getattr(obj, '__del__', None)
+        if del_func:
+            del_func()
+    gc.collect()
     # note: _remote_instance_index is NOT reset to mitigate the risk of
     #       re-using a cleaned object on the host, and inadvertently
     #       invoking another that's been created since.
 
 
+# -------------- Catalog --------------
+_catalog_hash = (None, None)  # format: (<map sizes>, <hash>)
+
+
+@instruction
+def get_catalog_hash():
+    """
+    Hash of instruction, and remote class names.
+
+    Changes if anything is added to either list (see ``list_instructions``
+    and ``list_remote_classes``), so the host can cache them.
+    """
+    global _catalog_hash
+    # mappings can't be removed or replaced, so their sizes identify them
+    sizes = (len(_instruction_map), len(_remote_class_map))
+    if _catalog_hash[0] != sizes:
+        h = hashlib.sha256()
+        h.update('\n'.join(list_instructions()).encode())
+        h.update(b'\x00')
+        h.update('\n'.join(list_remote_classes()).encode())
+        _catalog_hash = (sizes, binascii.hexlify(h.digest()).decode())
+    return _catalog_hash[1]
+
+
 _GET_OBJ_REF_FORMAT_MSG = "object reference must be of the format: " \
                           "{'cls': <class name>, 'idx': <remote index int>}"
 
@@ -177,6 +207,101 @@ def get_obj(ref: dict, *args):
         raise  # no default specified, be strict.
 
 
+# -------------- Codec --------------
+_codec = JSONCodec  # codec used to send & receive
+_pending_codec = None  # applied by the listener once 'ok' is sent
+_instruction_ids = []  # instruction names, indexed by (binary codec) id
+_remote_class_ids = []  # remote class names, indexed by (binary codec) id
+
+
+@instruction
+def set_codec(name):
+    """
+    Change the codec used to communicate with the host.
+
+    The new codec is used for everything after this instruction's ``'ok'``.
+
+    :param name: ``'json'`` (default), or ``'bin'``
+    :type name: :class:`str`
+    """
+    global _pending_codec, _instruction_ids, _remote_class_ids
+    _pending_codec = CODEC_MAP[name]
+
+    # Snapshot id lists (same order as the host's copies)
+    _instruction_ids = list_instructions()
+    _remote_class_ids = list_remote_classes()
+
+
+def get_codec():
+    """Codec currently used to communicate with the host."""
+    return _codec
+
+
+def apply_pending_codec():
+    """
+    Apply the codec requested by :meth:`set_codec` (if any).
+
+    :return: codec to use, or ``None`` if no change was requested
+    """
+    global _codec, _pending_codec
+    codec = _pending_codec
+    if codec is not None:
+        _codec = codec
+        _pending_codec = None
+        _set_interrupt_char()
+    return codec
+
+
+def reset_codec():
+    """Revert to the default codec (eg: if the host has lost track)."""
+    global _codec, _pending_codec
+    _codec = JSONCodec
+    _pending_codec = None
+    _set_interrupt_char()
+
+
+def encode_bytes(data):
+    """
+    Binary data as it should be sent to the host with the current codec;
+    base64 encoded (a :class:`str`) with the json codec, otherwise
+    unchanged.
+
+    A :class:`memoryview` is copied (unless it's base64 encoded); it may be
+    of a reused buffer, and a response isn't always sent straight away (eg:
+    responses to a batch are sent together).
+
+    :param data: data to send
+    :type data: :class:`bytes`, :class:`bytearray`, or :class:`memoryview`
+    """
+    if _codec is JSONCodec:
+        return binascii.b2a_base64(data)[:-1].decode()  # without '\n'
+    if isinstance(data, memoryview):
+        return bytes(data)
+    return data
+
+
+def decode_bytes(data):
+    """
+    Binary data given by the host; inverse of :meth:`encode_bytes`.
+
+    A base64 encoded :class:`str` is decoded, a :class:`list` of ints is
+    converted, anything else (eg: :class:`bytes`) is returned unchanged.
+    """
+    if isinstance(data, str):
+        return binascii.a2b_base64(data)
+    if isinstance(data, list):
+        return bytes(data)
+    return data
+
+
+def _set_interrupt_char():
+    # Ctrl+C (0x03) interrupts the pyboard, but it may be part of a binary
+    # frame; so it's disabled while anything other than json is in use.
+    setinterrupt = getattr(_serial_port, 'setinterrupt', None)
+    if setinterrupt is not None:
+        setinterrupt(3 if _codec is JSONCodec else -1)
+
+
 # -------------- Interpreter --------------
 _serial_port = None
 
@@ -207,11 +332,42 @@ def send(obj):
         >>> com_port = pyb.USB_VCP()
         >>> set_serial_port(com_port)
 
-        # Sender transmits json encoding of given obj over VCP
+        # Sender transmits given obj over VCP (encoded with the current codec)
         >>> send('abc')
         >>> send(123)
         >>> send([1, 2, 3])
         >>> send({'a': 1, 'b': 2})
     """
     global _serial_port
-    _serial_port.write(json.dumps(obj).encode() + b'\r')
+    _serial_port.write(_codec.frame(_codec.encode(obj)))
+
+
+def send_tagged(tag, obj):
+    """
+    Send a response to the host, tagged with the id of the request it
+    answers::
+
+        r <tag> <obj>
+
+    So the host can route it to that request, whatever else is received in
+    the meantime.
+
+    :param tag: request's tag (see :meth:`interpret <upyt.cmd.process.interpret>`)
+    :type tag: :class:`int`
+    :param obj: response (encoded with the current codec)
+    """
+    _serial_port.write(_codec.frame('r {} '.format(tag).encode() + _codec.encode(obj)))
+
+
+def send_raw(payload):
+    """
+    Send a control message (not an object) to the host, framed by the
+    current codec.
+
+    The payload must start with an ASCII character, and with the json codec,
+    it must not contain a ``\\r``.
+
+    :param payload: message
+    :type payload: :class:`bytes`
+    """
+    _serial_port.write(_codec.frame(payload))
@@ -2,9 +2,15 @@ import uasyncio as asyncio
 import json
 import gc
 
+import upyt.sched
 from . import mapping
+from .buffer import FramingError, OversizeError
 from .types import type_coro, type_bound_coro
 
+MAX_TASKS = 8  # pipelined requests processed concurrently
+
+_task_count = 0  # pipelined requests being processed
+
 
 async def interpret_instruction(obj: dict):
     """
@@ -26,11 +32,16 @@ async def interpret_instruction(obj: dict):
 
         func_name(10, 'abc', x=1, y=2)
 
-    Then transmit the returned value to the host (if not ``None``).
+    With the binary codec, the instruction name may be given as its index in
+    :meth:`list_instructions <upyt.cmd.mapping.list_instructions>`.
+
+    :return: the instruction's returned value
     """
     instruction_name = obj.get('i')
+    if isinstance(instruction_name, int):
+        instruction_name = mapping._instruction_ids[instruction_name]
     if instruction_name not in mapping._instruction_map:
-        return
+        return None
 
     # Execute (async / non-async)
     func = mapping._instruction_map[instruction_name]
@@ -38,9 +49,7 @@ async def interpret_instruction(obj: dict):
     if isinstance(response, type_coro):  # assumed async
         response = await response
 
-    # Send response (if any given)
-    if response is not None:
-        mapping.send(response)
+    return response
 
 
 def interpret_new_remote_instance(obj: dict):
@@ -63,17 +72,23 @@ def interpret_new_remote_instance(obj: dict):
 
         MyRemote(10, 'abc', x=1, y=2)
 
-    Each instance will get a unique ID, and that ID will be send back to
-    the host.
+    Each instance will get a unique ID, and that ID is returned (to be sent
+    back to the host).
 
     Once an instance has been created, call upon it using
     :meth:`interpret_remote_instruction`.
+
+    With the binary codec, the class name may be given as its index in
+    :meth:`list_remote_classes <upyt.cmd.mapping.list_remote_classes>`.
     """
     global _remote_instance_index
     gc.collect()
 
     # Create Instance (assign unique id)
-    cls = mapping._remote_class_map[obj.get('rc')]
+    cls_name = obj.get('rc')
+    if isinstance(cls_name, int):
+        cls_name = mapping._remote_class_ids[cls_name]
+    cls = mapping._remote_class_map[cls_name]
     instance = cls(*obj.get('a', []), **obj.get('k', {}))
 
     # Save to instance map
@@ -82,7 +97,7 @@ def interpret_new_remote_instance(obj: dict):
     mapping._remote_instance_map[instance._upyt_id] = instance
 
     # Respond with instance ID
-    mapping.send(instance._upyt_id)
+    return instance._upyt_id
 
 
 async def interpret_remote_instruction(obj: dict):
@@ -106,7 +121,7 @@ async def interpret_remote_instruction(obj: dict):
 
         internal_obj.get_thing(10, 'abc', x=1, y=2)
 
-    Then transmit the returned value to the host (if not ``None``).
+    :return: the method's returned value
     """
     # Fetch remote instance from ID
     instance = mapping._remote_instance_map[obj.get('rid')]
@@ -121,62 +136,236 @@ async def interpret_remote_instruction(obj: dict):
     if isinstance(response, type_bound_coro):
         response = await response
 
-    # Send response (if any given)
-    if response is not None:
-        mapping.send(response)
+    return response
 
 
-async def interpret(obj):
+async def evaluate(obj):
     """
-    Perform the action defined in the given object.
-
-    :param obj: deserialized JSON object received from host
-    :type obj: :class:`dict`
+    Perform the action defined in the given object, and return the result.
 
     Given ``obj`` must be accepted by either
     :meth:`interpret_instruction`,
     :meth:`interpret_new_remote_instance`, or
     :meth:`interpret_remote_instruction`.
+
+    :return: response to send to the host (or ``None``)
     """
-    # Find referenced function
     if not isinstance(obj, dict):
-        return
+        return None
 
     if 'rid' in obj:
-        await interpret_remote_instruction(obj)
+        return await interpret_remote_instruction(obj)
     elif 'rc' in obj:
-        interpret_new_remote_instance(obj)
+        return interpret_new_remote_instance(obj)
     elif 'i' in obj:
-        await interpret_instruction(obj)
+        return await interpret_instruction(obj)
+    return None  # ignore instruction
+
+
+async def interpret_batch(obj_list, tag=None):
+    """
+    Perform each action in the given list, in order.
+
+    For example::
+
+        [
+            {'rc': 'Pin', 'a': ['X1', 'out']},
+            {'rc': 'Pin', 'a': ['X2', 'in']},
+            {'i': 'ping', 'k': {'value': 10}},
+        ]
+
+    A single response is sent to the host; a list with an element for each
+    action (``None`` for those that return nothing)::
+
+        [0, 1, {'value': 11}]
+
+    If ``tag`` is set, the response is tagged (see :meth:`interpret`).
+    """
+    responses = []
+    for obj in obj_list:
+        responses.append(await evaluate(obj))
+    respond(responses, tag)
+
+
+def respond(response, tag=None):
+    """
+    Send a response to the host; tagged with its request's ``tag``, if set.
+    """
+    if tag is None:
+        mapping.send(response)
     else:
-        pass  # ignore instruction
+        mapping.send_tagged(tag, response)
+
+
+async def interpret(obj):
+    """
+    Perform the action defined in the given object.
+
+    :param obj: deserialized JSON object received from host
+    :type obj: :class:`dict` or :class:`list`
+
+    Given ``obj`` must be accepted by :meth:`evaluate`, in which case the
+    response (if not ``None``) is sent to the host.
+
+    Alternatively, a :class:`list` of objects (or a :class:`dict` with
+    that list as ``'b'``) is passed to :meth:`interpret_batch`.
+
+    A request tagged with ``'t'`` (or its sequence id ``'q'``) is responded
+    to with :meth:`send_tagged() <upyt.cmd.mapping.send_tagged>`, so the
+    host can route the response to the request::
+
+        {'i': 'ping', 'k': {'value': 1}, 't': 5}  -->  r 5 {"value": 2}
+    """
+    if isinstance(obj, list):
+        await interpret_batch(obj)
+        return
+
+    tag = obj.get('t', obj.get('q', None)) if isinstance(obj, dict) else None
+    if isinstance(obj, dict) and ('b' in obj):
+        await interpret_batch(obj['b'], tag)
+    else:
+        response = await evaluate(obj)
+        if response is not None:
+            respond(response, tag)
+
+
+async def interpret_sequenced(obj, stream):
+    """
+    Interpret a pipelined request, tagged with a sequence id.
+
+    ``obj`` is anything accepted by :meth:`interpret`, with an additional
+    ``'q'`` key; the request's sequence id. For example::
+
+        {'i': 'ping', 'k': {'value': 1}, 'q': 17}
+
+    Once complete, the host is sent ``ok <seq>``, so it can track multiple
+    requests in flight::
+
+        ok 17
+
+    Unlike other requests, an exception raised while interpreting does not
+    halt the pyboard. Instead the error is reported as ``err <seq> <msg>``
+    (where ``msg`` is a json encoded string), and the next request is
+    processed::
+
+        err 17 "TypeError: unsupported types for __add__: 'str', 'int'"
+    """
+    seq = obj['q']
+    codec = mapping.get_codec()
+    try:
+        await interpret(obj)
+    except Exception as e:
+        msg = json.dumps("{}: {}".format(type(e).__name__, e))
+        stream.write(codec.frame('err {} {}'.format(seq, msg).encode()))
+    else:
+        stream.write(codec.frame('ok {}'.format(seq).encode()))
+
+
+async def _sequenced_task(obj, stream):
+    global _task_count
+    try:
+        await interpret_sequenced(obj, stream)
+    finally:
+        _task_count -= 1
+
+
+async def dispatch_sequenced(obj, stream):
+    """
+    Process a pipelined request (see :meth:`interpret_sequenced`) as its own
+    task, so the listener can move on to the next request while it runs.
+
+    Requests are started in the order they're received, so instructions
+    that don't ``await`` anything still complete in order, while those that
+    do (eg: waiting for a pin to change) proceed in parallel. If
+    :data:`MAX_TASKS` are already running, this waits until one completes
+    (which also stops the listener reading more requests).
+    """
+    global _task_count
+    while _task_count >= MAX_TASKS:
+        await asyncio.sleep_ms(1)
+    _task_count += 1
+    upyt.sched.loop.create_task(_sequenced_task(obj, stream))
+
+
+def reject(error, stream):
+    """
+    Tell the host a request could not be received (eg: it's too long for
+    the receive buffer), so it was discarded::
+
+        err - "OversizeError: received line exceeds 2048 bytes"
+
+    Unlike a pipelined request's ``err``, the request can't be identified,
+    so ``-`` is sent in place of its sequence id.
+    """
+    codec = mapping.get_codec()
+    msg = json.dumps("{}: {}".format(type(error).__name__, error))
+    stream.write(codec.frame('err - {}'.format(msg).encode()))
 
 
 async def listener(stream):
-    """Read and process lines from Virtual Comm Port (VCP)."""
-    # TODO: create a global buffer, and populate via memoryview
-    line = b''
+    """
+    Read and process lines from Virtual Comm Port (VCP).
+
+    The listener sleeps until data is received (see
+    :meth:`upyt.sched.readable`), so it costs nothing while idle.
+
+    A line too long to be received is discarded, and rejected (see
+    :meth:`reject`); the listener carries on with the next.
+    """
+    codec = mapping.get_codec()
+    line_buffer = codec.buffer()
 
     while True:
-        c = stream.recv(1, timeout=0)  # non-blocking
-        if c:
-            if c == b'\r':
-                # Interpret command, then respond with 'ok'
-                #   Order is imporant:
-                #       The host's transmit() method will block until it receives an 'ok'.
-                #       With the interpret/response in this order, any exception raised
-                #       while interpreting the object will cause the transmit() method
-                #       to fail, causing the test itself to fail.
-                #   Trade-off:
-                #       This makes communication slightly slower, because the command has
-                #       to complete before the host can begin to process the next command.
-                #       However, it does enable tests to... you know... fail when they
-                #       should. So the choice seems like a no-brainer.
-                await interpret(json.loads(line))
-                stream.write(b'ok\r')
-                # Clear line
-                line = b''
+        await upyt.sched.readable(stream)
+
+        # Change codec (if requested by a pipelined set_codec, processed
+        # as a task; the host sends nothing more until it's acknowledged)
+        if mapping.apply_pending_codec():
+            codec = mapping.get_codec()
+            line_buffer = codec.buffer(data=line_buffer.pending())
+
+        try:
+            line_buffer.fill(stream)  # non-blocking
+        except OversizeError as e:
+            reject(e, stream)
+            continue
+        while True:
+            try:
+                line = line_buffer.readline()
+            except OversizeError as e:
+                reject(e, stream)
+                continue
+            except FramingError:
+                # Host has reverted to the default codec (eg: reconnected
+                # after a crash); re-interpret everything received as such.
+                mapping.reset_codec()
+                codec = mapping.get_codec()
+                line_buffer = codec.buffer(data=line_buffer.pending())
+                continue
+            if line is None:
+                break
+
+            # Interpret command, then respond with 'ok'
+            #   Order is imporant:
+            #       The host's transmit() method will block until it receives an 'ok'.
+            #       With the interpret/response in this order, any exception raised
+            #       while interpreting the object will cause the transmit() method
+            #       to fail, causing the test itself to fail.
+            #   Trade-off:
+            #       This makes communication slightly slower, because the command has
+            #       to complete before the host can begin to process the next command.
+            #       However, it does enable tests to... you know... fail when they
+            #       should. So the choice seems like a no-brainer.
+            #   Pipelined requests are acknowledged by their sequence id, so
+            #   they needn't complete in order; each is run as a task.
+            obj = codec.decode(line)
+            if isinstance(obj, dict) and ('q' in obj):
+                await dispatch_sequenced(obj, stream)
             else:
-                line += c
-        else:
-            await asyncio.sleep_ms(1)
+                await interpret(obj)
+                stream.write(codec.OK)
+
+            # Change codec (if requested)
+            if mapping.apply_pending_codec():
+                codec = mapping.get_codec()
+                line_buffer = codec.buffer(data=line_buffer.pending())
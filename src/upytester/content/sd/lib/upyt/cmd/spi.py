@@ -1,9 +1,9 @@
 import pyb
-import struct
 
 from asyn import Lock
 
-from .mapping import remote
+from .mapping import remote, encode_bytes, decode_bytes
+from .buffer import TransferBuffer, TRANSFER_BUFFER_SIZE
 
 
 @remote
@@ -12,11 +12,31 @@ class SPI(pyb.SPI):
     Remote of pyb.SPI.
 
     Offers some advantages over standard SPI object, including JSON
-    serializable send/receive functions (prefixed with ``r_`` for _remote_).
+    serializable send/receive functions (prefixed with ``r_`` for _remote_),
+    and binary transfers (suffixed with ``_bytes``).
+
+    Binary transfers send & receive data as :class:`bytes` with a binary
+    codec, or base64 encoded with the json codec (see the host's
+    ``upytester.pyboard.codec.encode_bytes`` & ``decode_bytes``)::
+
+        >>> spi = pyboard.SPI(1)
+        >>> read_cmd = encode_bytes(b'\\x03\\x00\\x00\\x00' + bytes(256), pyboard.codec)
+        >>> decode_bytes(spi.send_recv_bytes(read_cmd)())[4:]  # 256 bytes from flash
+
+    Received data is stored in a reused buffer, so large, or repeated
+    transfers (eg: reading a flash chip) don't allocate memory each time.
+    Data sent is limited by the size of a request (see
+    :data:`LINE_BUFFER_SIZE <upyt.cmd.buffer.LINE_BUFFER_SIZE>`), so to read
+    a large block, send its command with :meth:`send_bytes`, then read it
+    with :meth:`recv_bytes`. A single transfer can receive at most
+    :data:`MAX_TRANSFER_SIZE <upyt.cmd.buffer.MAX_TRANSFER_SIZE>` bytes
+    (a :class:`ValueError` is raised before anything is transferred).
     """
-    def __init__(self, bus, **kwargs):
+    def __init__(self, bus, buffer_size=TRANSFER_BUFFER_SIZE, **kwargs):
         """
         :param bus: integer index of :class:`pyb.SPI` to use.
+        :param buffer_size: initial size of the receive buffer (grown to fit
+                            the largest transfer).
         :param mode: string, either ``'master'`` (default) or ``'slave'``.
 
         Also accepts :meth:`pyb.SPI.init` parameters
@@ -31,6 +51,7 @@ class SPI(pyb.SPI):
 
         self.bus = bus
         self.lock = Lock()
+        self.rx = TransferBuffer(buffer_size)
 
     def __del__(self):
         self.deinit()
@@ -46,9 +67,9 @@ class SPI(pyb.SPI):
         elif isinstance(data, str):
             return data.encode()
         elif isinstance(data, int):
-            return struct.pack('B', data)
+            return bytes((data,))
         elif isinstance(data, list):
-            return struct.pack('B' * len(data), *data)
+            return bytes(data)
         raise ValueError("cannot convert {!r} to bytes".format(data))
 
     # ----- Remote functions
@@ -62,8 +83,34 @@ class SPI(pyb.SPI):
 
     def r_recv(self, count: int, timeout: int=5000):
         """Receive data, compatible with json encoding."""
-        return list(self.recv(count, timeout=timeout))
+        return list(self.recv(self.rx.get(count), timeout=timeout))
 
     def r_send_recv(self, data, timeout: int=5000):
         """Transmit and receive data, compatible with json encoding."""
-        return list(self.send_recv(self.encode(data), timeout=timeout))
+        data = self.encode(data)
+        return list(self.send_recv(data, self.rx.get(len(data)), timeout=timeout))
+
+    # ----- Remote functions : Binary
+    def send_bytes(self, data, timeout: int=5000):
+        """Transmit binary data (base64 encoded with the json codec)."""
+        self.send(decode_bytes(data), timeout=timeout)
+
+    def recv_bytes(self, count: int, timeout: int=5000):
+        """
+        Receive ``count`` bytes into the receive buffer; returned as binary
+        data (base64 encoded with the json codec).
+        """
+        view = self.rx.get(count)
+        self.recv(view, timeout=timeout)
+        return encode_bytes(view)
+
+    def send_recv_bytes(self, data, timeout: int=5000):
+        """
+        Transmit binary data, while receiving the same number of bytes into
+        the receive buffer; returned as binary data (base64 encoded with the
+        json codec).
+        """
+        data = decode_bytes(data)
+        view = self.rx.get(len(data))
+        self.send_recv(data, view, timeout=timeout)
+        return encode_bytes(view)
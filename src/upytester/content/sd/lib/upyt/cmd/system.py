@@ -1,3 +1,4 @@
+import gc
 import sys
 import pyb
 import machine
@@ -70,13 +71,44 @@ def heartbeat(enabled=True):
 # ------- system info
 @instruction
 def get_system_info():
+    try:
+        imp = list(sys.implementation)  # MicroPython: a tuple
+    except TypeError:  # simulated (CPython); not iterable
+        imp = [sys.implementation.name, sys.implementation.version]
     return {
-        'imp': list(sys.implementation),
+        'imp': imp,
         'ver': sys.version,
         'platform': sys.platform,
     }
 
 
+# ------- boot info
+_boot_info = {}
+
+
+def mark_ready():
+    """
+    Record the time & heap state once the firmware has been imported (called
+    by ``main.py``, before the command listener is started).
+    """
+    gc.collect()
+    _boot_info['ready_ms'] = time.ticks_ms()
+    if hasattr(gc, 'mem_free'):  # not available when simulated
+        _boot_info['mem_free'] = gc.mem_free()
+        _boot_info['mem_alloc'] = gc.mem_alloc()
+
+
+@instruction
+def get_boot_info():
+    """
+    Get boot-to-ready time (``ready_ms``), and heap free (``mem_free``) and
+    allocated (``mem_alloc``) after everything was imported (unit: bytes).
+
+    Useful to compare firmware deployed as source, or as bytecode.
+    """
+    return _boot_info
+
+
 @instruction
 def get_ticks_ms():
     """Get ticks since boot (unit: ms)."""
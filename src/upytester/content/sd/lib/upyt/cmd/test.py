@@ -1,5 +1,8 @@
 import pyb
+import uasyncio as asyncio
 
+import upyt.sched
+import upyt.stream
 from .mapping import instruction, send
 
 
@@ -9,6 +12,52 @@ def ping(value=0):
     return {'value': value + 1}
 
 
+@instruction
+async def ping_delayed(value=0, delay_ms=100):
+    """
+    Return given value + 1, after ``delay_ms``.
+
+    Used to test requests being processed concurrently (pipelined requests
+    are run as separate tasks).
+    """
+    await asyncio.sleep_ms(delay_ms)
+    return {'value': value + 1}
+
+
+@instruction
+def ping_burst(count=1, value=0):
+    """
+    Send ``count`` responses in quick succession.
+
+    Responses are the same as ``ping``, incrementing from ``value + 1``;
+    used to measure the rate objects can be streamed to the host. They're
+    sent (not returned), so the host reads them with ``PyBoard.receive()``.
+    """
+    for i in range(value, value + count):
+        send({'value': i + 1})
+
+
+@instruction
+def stream_ramp(count=1000, per_ms=1, name='ramp'):
+    """
+    Stream an incrementing count (as ``'H'`` records) to the host.
+
+    ``per_ms`` values are appended each millisecond, from a background task;
+    used to test, and measure streams (see :mod:`upyt.stream`).
+    """
+    stream = upyt.stream.open(name, fmt='H')
+
+    async def ramp():
+        while not stream.running:
+            await asyncio.sleep_ms(1)  # until host starts reading
+        for i in range(count):
+            stream.append(i & 0xFFFF)
+            if (i % per_ms) == (per_ms - 1):
+                await asyncio.sleep_ms(1)
+
+    upyt.sched.loop.create_task(ramp())
+
+
 @instruction
 def get_switch():
     """Onboard switch value."""
@@ -1,9 +1,26 @@
 import uasyncio as asyncio
 
+RUNQ_LEN = 32  # tasks & callbacks ready to run
+WAITQ_LEN = 32  # tasks & callbacks waiting for their time
+
 loop = None
 
 def init_loop():
     global loop
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_event_loop(RUNQ_LEN, WAITQ_LEN)
 
 keepalive = True  # watched by mainloop, set to False to break cycle
+
+
+def readable(stream):
+    """
+    Wait until the given stream (eg: :class:`pyb.USB_VCP`) has data to
+    read::
+
+        await upyt.sched.readable(vcp)
+
+    The waiting task is resumed by the event loop (a ``PollEventLoop``) when
+    data arrives; it's not woken to poll the stream, so while nothing is
+    received, the pyboard may sleep until the next task is due.
+    """
+    yield asyncio.IORead(stream)
@@ -0,0 +1,254 @@
+"""
+Streams of data sent to the host at high rates (eg: ADC samples).
+
+Records are packed into a pre-allocated buffer, then sent to the host in
+batches (binary; base64 encoded with the json codec). Unlike
+:meth:`send() <upyt.cmd.mapping.send>`, batches are not mixed with
+instruction responses; the host reads each stream separately (see the
+host's ``PyBoard.stream()``)::
+
+    import pyb
+    import upyt.stream
+
+    adc = pyb.ADC('X1')
+    adc_stream = upyt.stream.open('adc', fmt='H')
+
+    def sample(timer):
+        adc_stream.append(adc.read())  # allocation free; safe in an ISR
+
+    pyb.Timer(4, freq=1000, callback=sample)
+
+Nothing is buffered until the host starts reading a stream.
+
+The host grants a number of batches it's ready to receive (its credit);
+while the host has no credit, records are buffered, once the buffer is full,
+records are dropped (and counted; the count is sent with the next batch).
+A batch is sent every ``period_ms``, or as soon as a buffer is full.
+"""
+import struct
+import machine
+import micropython
+import uasyncio as asyncio
+
+try:
+    import ubinascii as binascii
+except ImportError:  # simulated (CPython)
+    import binascii
+
+import upyt.sched
+from .cmd import mapping
+from .cmd.mapping import instruction
+
+BUFFER_SIZE = 1024  # bytes per buffer (2 per stream)
+PERIOD_MS = 10  # time between batches (unit: ms)
+CREDIT = 8  # batches the host is ready to receive, if not specified
+
+_streams = {}  # format: {<name>: <Stream>, ...}
+
+
+class Stream:
+    """
+    A stream of fixed size records sent to the host.
+
+    :param name: stream's name (no spaces)
+    :type name: :class:`str`
+    :param fmt: :mod:`struct` format of each record
+    :type fmt: :class:`str`
+    :param size: buffer size (rounded down to a whole number of records)
+    :type size: :class:`int`
+    :param period_ms: time between batches (unit: ms)
+    :type period_ms: :class:`int`
+    """
+
+    def __init__(self, name, fmt='h', size=BUFFER_SIZE, period_ms=PERIOD_MS):
+        self.name = name
+        self.fmt = fmt
+        self.record_size = struct.calcsize(fmt)
+        self.size = size - (size % self.record_size)
+        self.period_ms = period_ms
+
+        # Double buffered; records are appended to one while the other is sent
+        self._bufs = (bytearray(self.size), bytearray(self.size))
+        self._active = 0  # index of buffer being appended to
+        self._length = 0  # bytes appended to active buffer
+
+        self.running = False
+        self.credit = 0
+        self.seq = 0  # batches sent
+        self.dropped = 0  # records dropped (buffer was full)
+        self._generation = 0  # identifies the current flush task
+
+        # Flush scheduled when the buffer fills (bound once; an ISR can't
+        # allocate memory)
+        self._flush_pending = False
+        self._flush_ref = self._scheduled_flush
+
+    # ------- Write (ISR safe)
+    def append(self, value):
+        """
+        Append a single value record (allocation free).
+        """
+        if not self.running:
+            return
+        if self._length + self.record_size > self.size:
+            self.dropped += 1
+            return
+        struct.pack_into(self.fmt, self._bufs[self._active], self._length, value)
+        self._length += self.record_size
+        self._check_full()
+
+    def append2(self, value1, value2):
+        """
+        Append a two value record (allocation free).
+        """
+        if not self.running:
+            return
+        if self._length + self.record_size > self.size:
+            self.dropped += 1
+            return
+        struct.pack_into(self.fmt, self._bufs[self._active], self._length, value1, value2)
+        self._length += self.record_size
+        self._check_full()
+
+    def write(self, data):
+        """
+        Append packed records (allocation free).
+
+        :param data: a whole number of records
+        :type data: :class:`bytes`
+        """
+        if not self.running:
+            return
+        size = len(data)
+        if self._length + size > self.size:
+            self.dropped += size // self.record_size
+            return
+        self._bufs[self._active][self._length:self._length + size] = data
+        self._length += size
+        self._check_full()
+
+    def pack(self, *values):
+        """
+        Append a record of several values (not ISR safe).
+        """
+        self.write(struct.pack(self.fmt, *values))
+
+    def _check_full(self):
+        # Send the buffer as soon as it's full (if the host has credit)
+        if (self._length + self.record_size > self.size) and (self.credit > 0) and not self._flush_pending:  # noqa: E501
+            self._flush_pending = True
+            try:
+                micropython.schedule(self._flush_ref, None)
+            except RuntimeError:  # schedule queue is full
+                self._flush_pending = False  # sent by the flush task instead
+
+    def _scheduled_flush(self, arg):
+        self._flush_pending = False
+        self.flush()
+
+    # ------- Read
+    def _swap(self):
+        # Swap buffers, return records appended to the (now inactive) buffer
+        state = machine.disable_irq()
+        data = memoryview(self._bufs[self._active])[:self._length]
+        self._active ^= 1
+        self._length = 0
+        machine.enable_irq(state)
+        return data
+
+    def drain(self):
+        """
+        Remove, and return buffered records (eg: to be sent on request,
+        instead of as batches).
+
+        :return: packed records
+        :rtype: :class:`bytes`
+        """
+        return bytes(self._swap())
+
+    # ------- Send
+    def flush(self):
+        """
+        Send buffered records to the host (if it has credit).
+
+        :return: ``True`` if a batch was sent
+        """
+        if (not self._length) or (self.credit <= 0):
+            return False
+        data = self._swap()
+
+        # Send batch: s <name> <seq> <dropped> <data>
+        header = 's {} {} {} '.format(self.name, self.seq, self.dropped).encode()
+        if mapping.get_codec().name == 'json':
+            data = binascii.b2a_base64(data)[:-1]  # without '\n'
+        mapping.send_raw(header + bytes(data))
+        self.seq += 1
+        self.credit -= 1
+        return True
+
+    async def _flush_task(self, generation):
+        while self.running and (generation == self._generation):
+            await asyncio.sleep_ms(self.period_ms)
+            self.flush()
+
+    # ------- Control
+    def start(self, credit=CREDIT):
+        """Start buffering & sending records (called by the host)."""
+        self.stop()
+        self._length = 0
+        self.seq = 0
+        self.dropped = 0
+        self.credit = credit
+        self.running = True
+        upyt.sched.loop.create_task(self._flush_task(self._generation))
+
+    def stop(self):
+        """Stop buffering & sending records."""
+        self.running = False
+        self._generation += 1
+
+
+def open(name, fmt='h', size=BUFFER_SIZE, period_ms=PERIOD_MS):
+    """
+    Get the named stream (created if it doesn't exist).
+
+    See :class:`Stream` for parameter details.
+
+    :rtype: :class:`Stream`
+    """
+    if name not in _streams:
+        _streams[name] = Stream(name, fmt=fmt, size=size, period_ms=period_ms)
+    return _streams[name]
+
+
+# ------- Instructions (used by the host)
+@instruction
+def list_streams():
+    """Names of opened streams."""
+    return sorted(_streams.keys())
+
+
+@instruction
+def stream_start(name, credit=CREDIT):
+    """
+    Start sending the named stream.
+
+    :param credit: number of batches the host is ready to receive
+    :type credit: :class:`int`
+    :return: ``{'fmt': <record format>, 'size': <buffer size>}``
+    """
+    stream = _streams[name]
+    stream.start(credit)
+    return {'fmt': stream.fmt, 'size': stream.size}
+
+
+@instruction
+def stream_credit(name, count):
+    """Grant the host's credit for another ``count`` batches."""
+    _streams[name].credit += count
+
+
+@instruction
+def stream_stop(name):
+    """Stop sending the named stream."""
+    _streams[name].stop()
@@ -12,6 +12,7 @@ from upyt.cmd import listener
 from upyt.cmd.mapping import set_serial_port
 from upyt.utils import startup_sequence
 import upyt.sched
+import upyt.cmd.system
 
 
 # Allocate memory for callback debugging
@@ -37,6 +38,9 @@ except ImportError as e:
         raise
     pass  # else: fail quietly
 
+# Record boot-to-ready time & free heap (see get_boot_info)
+upyt.cmd.system.mark_ready()
+
 
 try:
     # Start Tasks (including mainloop)
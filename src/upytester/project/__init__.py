@@ -2,8 +2,10 @@ __all__ = [
     'get_bench_config',
     'get_config',
     'get_device',
+    'get_pool',
 ]
 
 from .config import get_bench_config
 from .config import get_config
 from .config import get_device
+from .config import get_pool
@@ -59,3 +59,17 @@ def get_device(name, config=None, **kwargs):
         name=name,
         **kwargs,
     )
+
+
+def get_pool(names=None, config=None, **kwargs):
+    """
+    Get a pool of PyBoard devices configured in the project.
+
+    Devices are opened concurrently when the pool is opened (see
+    :class:`PyBoardPool <upytester.PyBoardPool>`).
+
+    :param names: PyBoards named in configuration file (default: all)
+    :type names: :class:`list`
+    """
+    from ..pyboard import PyBoardPool
+    return PyBoardPool.from_config(names=names, config=config, **kwargs)
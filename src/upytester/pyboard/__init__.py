@@ -1,7 +1,12 @@
 __all__ = [
     'PyBoard',
+    'AsyncPyBoard',
+    'PyBoardPool',
     'PyBoardError',
+    'PoolError',
 ]
 
 from .pyboard import PyBoard
-from .exceptions import PyBoardError
+from .async_pyboard import AsyncPyBoard
+from .pool import PyBoardPool
+from .exceptions import PyBoardError, PoolError
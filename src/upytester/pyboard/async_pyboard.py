@@ -0,0 +1,631 @@
+import asyncio
+import io
+import json
+from contextlib import asynccontextmanager
+
+# Local libs
+from .pyboard import PyBoard
+from .batch import Batch
+from .response import parse_response
+from .stream import AsyncStream, DEFAULT_WINDOW
+from .codec import CODEC_MAP, JSONCodec, DecodeError
+from .exceptions import ResponseTimeoutException, PyBoardError
+
+# Logging
+import logging
+log = logging.getLogger(__name__)
+
+
+class AsyncPyBoard(PyBoard):
+    """
+    A :class:`PyBoard` driven by an :mod:`asyncio` event loop.
+
+    No threads are created; the serial port is registered with the event
+    loop's selector, and received data is processed as it arrives. So a
+    single process can drive many pyboards::
+
+        >>> async def main():
+        ...     async with AsyncPyBoard('3976346C3436') as pyboard:
+        ...         receive = await pyboard.ping(value=1)
+        ...         print(await receive())
+        >>> asyncio.run(main())
+        {'value': 2}
+
+    Instructions, remote classes, and remote instance methods are accessed
+    just like they are with a :class:`PyBoard`, but each call must be
+    awaited. Like :meth:`PyBoard.send`, each call returns a receiver
+    (:meth:`receive`) which must also be awaited.
+
+    Every request is tagged with a sequence id (see
+    :attr:`PyBoard.pipeline`), so requests made concurrently (from
+    multiple tasks) are in flight simultaneously. Each call completes
+    when the pyboard acknowledges its request, raising a
+    :class:`PyBoardError` if the request failed. The pyboard tags each
+    response with the same id, so each call's receiver returns the
+    response to that call, regardless of the order requests complete in.
+
+    Streams are received with :meth:`stream` (an :class:`AsyncStream
+    <upytester.pyboard.stream.AsyncStream>`, read just like a
+    :meth:`PyBoard.stream`, but awaited).
+
+    Not thread-safe; all calls must be made from the event loop the
+    pyboard was opened with.
+    """
+
+    POLL_PERIOD = 0.001  # for streams that can't be registered with a selector (unit: sec)
+
+    DEFAULT_PIPELINE = 8
+
+    def __init__(self, *args, **kwargs):
+        """
+        Parameters are the same as :class:`PyBoard`, except:
+
+        :param auto_open: ignored; :meth:`open` must be awaited (or use
+                          ``async with``)
+        :param pipeline: maximum number of requests in flight
+                         (default: :attr:`DEFAULT_PIPELINE`)
+        :type pipeline: :class:`int`
+        """
+        kwargs['auto_open'] = False
+        kwargs.setdefault('pipeline', self.DEFAULT_PIPELINE)
+        super(AsyncPyBoard, self).__init__(*args, **kwargs)
+
+        # Requests awaiting an 'ok'
+        #   format: {<seq>: (<request obj>, <asyncio.Future>), ...}
+        self._pending = {}
+        self._received = {}  # format: {<seq>: <response>, ...}
+
+        # Created by open() (bound to the running event loop)
+        self._loop = None
+        self._idle = None  # set while nothing is pending
+        self._send_gate = None  # cleared while codec is being negotiated
+        self._codec_lock = None
+        self._poll_task = None
+        self._is_registered = False
+
+        # Exception stack trace received from the pyboard (see _on_crash())
+        self._crash_lines = None
+        self._crash_handle = None
+
+    # ==================== Properties ====================
+    @property
+    def async_tx(self):
+        """Always ``False``; requests are always sequenced (read-only)."""
+        return False
+
+    @async_tx.setter
+    def async_tx(self, value):
+        raise AttributeError("{} async_tx is read-only; requests are always sequenced (see pipeline)".format(type(self).__name__))  # noqa: E501
+
+    @property
+    def pipeline(self):
+        """Maximum number of requests in flight (set before opening)."""
+        return self._pipeline_depth
+
+    @pipeline.setter
+    def pipeline(self, value):
+        value = int(value or 0)
+        if value < 1:
+            raise ValueError("{} pipeline must be at least 1".format(type(self).__name__))  # noqa: E501
+        if self.is_open:
+            raise RuntimeError("cannot change pipeline while {!r} is open".format(self))
+        self._pipeline_depth = value
+
+    @property
+    def codec(self):
+        """Name of the codec in use (change with :meth:`set_codec`)."""
+        return self._codec.name
+
+    @codec.setter
+    def codec(self, name):
+        raise AttributeError("use 'await {!r}.set_codec({!r})'".format(self, name))
+
+    @property
+    def instruction_list(self):
+        """List of names of instruction methods (populated by :meth:`open`)."""
+        return self._instruction_list
+
+    @property
+    def remote_class_list(self):
+        """List of names of remotely accessible classes (populated by :meth:`open`)."""  # noqa: E501
+        return self._remote_class_list
+
+    # ==================== Serial Communication ====================
+    async def open(self):
+        if self.is_open:
+            return  # already open
+
+        self._loop = asyncio.get_running_loop()
+
+        # Open comport (non-blocking)
+        comport = self.comport
+        if comport.closed:
+            comport.open()
+        comport.timeout = 0
+        while comport.read(max(comport.in_waiting, 1)):
+            pass  # flush
+
+        # Reset state
+        self._halt_transmit.clear()
+        self._receive_queue = asyncio.Queue()
+        self._pending.clear()
+        self._received.clear()
+        self._pipeline_slots = asyncio.Semaphore(self._pipeline_depth)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._send_gate = asyncio.Event()
+        self._send_gate.set()
+        self._codec_lock = asyncio.Lock()
+        self._crash_lines = None
+
+        # Start receiving
+        self._reader = self._codec.reader(comport)
+        self._start_reading()
+
+        # --- Communication is open
+        # populate lists
+        await self._load_catalog()
+
+        # show heartbeat (indicates link is active)
+        if self._heartbeat:
+            await self.heartbeat(True)
+
+        # set flag
+        self._open_flag = True
+
+        # negotiate codec
+        if self._codec_on_open:
+            await self.set_codec(self._codec_on_open)
+
+    async def _load_catalog(self):
+        # Populate instruction & remote class lists, from cache if the
+        # pyboard's catalog hash is unchanged.
+        cache = self._catalog_cache
+        catalog_hash = None
+        if cache is not None:
+            catalog_hash = await self._fetch({'i': 'get_catalog_hash'})
+            cached = cache.load(self.serial_number, catalog_hash)
+            if cached is not None:
+                (self._instruction_list, self._remote_class_list) = cached
+                return
+
+        self._instruction_list = await self._fetch({'i': 'list_instructions'})
+        self._remote_class_list = await self._fetch({'i': 'list_remote_classes'})
+        if cache is not None:
+            cache.save(self.serial_number, catalog_hash, self._instruction_list, self._remote_class_list)  # noqa: E501
+
+    async def close(self):
+        """
+        Stop receiving, and close comport.
+
+        Requests still in flight are allowed to complete first.
+        """
+        if self.is_closed:
+            return  # already closed
+
+        if self._remote_exception.is_set():
+            self._codec = JSONCodec(self)  # pyboard will have been reset
+        else:
+            # stop heartbeat
+            if self._heartbeat:
+                await self.heartbeat(False)
+            # restore default codec (for the next connection)
+            await self.set_codec(JSONCodec.name)
+            # let requests (from other tasks) complete
+            await self.wait()
+
+        self.halt()
+        self._stop_reading()
+
+        # close comport
+        if not self.comport.closed:
+            self.comport.close()
+
+        # clear instruction list (and stubs generated from it)
+        self._instruction_list = None
+        self._clear_stubs()
+        self._open_flag = False
+
+    async def reset(self, hard=False, reconnect=False):
+        """
+        Reset the pyboard; parameters are the same as :meth:`PyBoard.reset`.
+
+        The reset (and waiting for the serial port to be reconnected) is run
+        in the event loop's default executor, so the loop isn't blocked.
+        """
+        reopen = reconnect and self.is_open
+        if reopen:
+            await self.close()
+
+        reset = super(AsyncPyBoard, self).reset
+        await asyncio.get_running_loop().run_in_executor(None, reset, hard)
+
+        if reopen:
+            await self.open()
+
+    def halt(self, force=False):
+        """
+        Refuse any further requests.
+
+        :param force: if ``True``, reading also stops; requests in flight
+                      will never complete.
+        :type force: :class:`bool`
+        """
+        self._halt_transmit.set()
+        if force:
+            self._stop_reading()
+
+    async def set_codec(self, name):
+        """
+        Negotiate the codec used to communicate with the pyboard.
+
+        Awaitable equivalent of setting :attr:`PyBoard.codec`; requests made
+        (by other tasks) during negotiation are held until it's complete.
+
+        :param name: name of codec (eg: ``'bin'``)
+        :type name: :class:`str`
+        """
+        if name not in CODEC_MAP:
+            raise ValueError("unknown codec {!r}, options: {!r}".format(name, sorted(CODEC_MAP)))
+        if self.is_closed:
+            raise RuntimeError("cannot change codec while {!r} is closed".format(self))
+
+        async with self._codec_lock:
+            if name == self._codec.name:
+                return  # do nothing
+
+            # Hold new requests, and wait for those in flight:
+            #   the codec changes on both ends at set_codec's 'ok'
+            self._send_gate.clear()
+            try:
+                await self.wait()
+                self._codec_pending = CODEC_MAP[name](self)
+                await self._request({'i': 'set_codec', 'a': [name]})
+            finally:
+                self._codec_pending = None
+                self._send_gate.set()
+
+    async def send(self, obj):
+        """
+        Transmit given object, and wait for the pyboard to process it.
+
+        :param obj: object to encode and transmit
+        :type obj: anthing serializable
+        :return: receiver for the request's response (a coroutine function,
+                 like :meth:`receive`); within a :meth:`batch`, its response
+                 is available once the batch has been sent
+        :raises PyBoardError: if the pyboard failed to process the request
+        """
+        if self._halt_transmit.is_set():
+            raise RuntimeError("Cannot send more commands while {!r} is being closed".format(self))  # noqa: E501
+
+        if self._batch is not None:
+            batch_response = self._batch.add(obj)
+
+            async def batch_receiver(timeout=None):
+                return batch_response(timeout)
+            return batch_receiver
+
+        # Block while the maximum number of requests are in flight
+        async with self._pipeline_slots:
+            while not self._send_gate.is_set():
+                await self._send_gate.wait()
+            response = await self._request(obj)
+
+        async def receiver(timeout=None):
+            return response  # already received
+        return receiver
+
+    async def _request(self, obj):
+        # Transmit request, wait for it to be acknowledged, then return its
+        # response (if any)
+        seq = next(self._sequence)
+        obj = dict(obj, q=seq)
+        frame = self._encode(obj)
+
+        future = self._loop.create_future()
+        self._pending[seq] = (obj, future)
+        self._idle.clear()
+
+        log.debug("%r <-- %r", self, frame)
+        self.comport.write(frame)
+
+        try:
+            return await asyncio.wait_for(future, self.RESPONSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ResponseTimeoutException("{!r} request {!r}".format(self, obj))
+        finally:
+            self._forget(seq)
+
+    async def _fetch(self, obj):
+        receive = await self.send(obj)
+        return await receive(timeout=self.RESPONSE_TIMEOUT)
+
+    def _forget(self, seq):
+        self._pending.pop(seq, None)
+        self._received.pop(seq, None)
+        if not self._pending:
+            self._idle.set()
+
+    @asynccontextmanager
+    async def batch(self):
+        """
+        Collect requests, and send them to the pyboard in a single frame.
+
+        Asynchronous equivalent of :meth:`PyBoard.batch`::
+
+            >>> async with pyboard.batch():
+            ...     pins = [await pyboard.Pin(p, 'out') for p in ('X1', 'X2')]
+            ...     receiver = await pyboard.ping(value=1)
+            >>> await receiver()
+            {'value': 2}
+
+        Requests made by *any* task while the batch is being collected are
+        added to it.
+        """
+        if self._batch is not None:
+            raise RuntimeError("{!r} is already collecting a batch".format(self))
+
+        batch = self._batch = Batch(self)
+        try:
+            yield batch
+        finally:
+            self._batch = None
+
+        responses = []
+        for frame in batch.frames(sequenced=True):
+            receive = await self.send(frame)
+            responses.append(await receive(timeout=self.RESPONSE_TIMEOUT))
+        batch.complete(*responses)
+
+    async def receive(self, timeout=1):
+        """
+        Receive an unsolicited object from remote (responses are returned by
+        each request's receiver; see :meth:`send`).
+
+        :param timeout: Time to wait for a response (if ``None``, will wait forever).
+                        If timeout is reached, ``None`` is returned.
+        :type timeout: :class:`float`
+        :return: decoded object
+        :rtype: :class:`dict`, or ``None``
+        """
+        try:
+            obj = await asyncio.wait_for(self._receive_queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if isinstance(obj, Exception):
+            raise obj
+        return obj
+
+    async def receive_iter(self, timeout=None):
+        """
+        Asynchronous generator for each received object.
+
+        :param timeout: Maximum time per iteration, if not set, only received
+                        objects will be returned.
+        :type timeout: :class:`float`
+        """
+        while True:
+            yield await self.receive(timeout=timeout)
+
+    def stream(self, name, window=DEFAULT_WINDOW, timeout=None):
+        """
+        A stream sent by the pyboard; started when it's opened::
+
+            >>> async with pyboard.stream('adc') as adc:
+            ...     samples = await adc.read_array(1000)
+
+        Parameters are the same as :meth:`PyBoard.stream`.
+
+        :return: stream (not yet opened)
+        :rtype: :class:`AsyncStream <upytester.pyboard.stream.AsyncStream>`
+        """
+        return AsyncStream(self, name, window=window, timeout=timeout)
+
+    async def wait(self, timeout=None):
+        """
+        Wait for all requests in flight to be acknowledged by the remote.
+
+        :param timeout: maximum time to wait (if ``None``, will wait forever)
+        :type timeout: :class:`float`
+        :return: ``True`` if clear, ``False`` if ``timeout`` was reached
+        :rtype: :class:`bool`
+        """
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    # ----- Receiver
+    def _start_reading(self):
+        try:
+            fileno = self.comport.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            fileno = None
+
+        if isinstance(fileno, int):
+            self._loop.add_reader(fileno, self._on_readable)
+            self._is_registered = True
+        else:
+            # stream can't be selected; poll it instead (eg: a test stand-in)
+            self._poll_task = self._loop.create_task(self._poll())
+
+    def _stop_reading(self):
+        if self._is_registered:
+            self._loop.remove_reader(self.comport.fileno())
+            self._is_registered = False
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    def _on_readable(self):
+        # Called by the event loop when the comport has data waiting
+        self._on_data(self._reader.read_block())
+
+    async def _poll(self):
+        while True:
+            data = self._reader.read_block()
+            if data:
+                self._on_data(data)
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(self.POLL_PERIOD)
+
+    def _on_data(self, data):
+        if not data:
+            return
+
+        self._reader.feed(data)
+        while True:
+            reader = self._reader
+            for line in reader.ready_lines():
+                self._process_line(line)
+            if not reader.is_detached:
+                break
+            # else: reader replaced (codec changed), continue with new reader
+
+        if self._crash_lines is not None:
+            # exception text is complete once nothing is received for a while
+            if self._crash_handle is not None:
+                self._crash_handle.cancel()
+            self._crash_handle = self._loop.call_later(self.READ_TIMEOUT, self._on_crash)
+
+    def _process_line(self, line):
+        if self._crash_lines is not None:
+            self._crash_lines.append(line)
+            return
+
+        log.debug("%r --> %r", self, line)
+        if line.startswith(b'ok '):
+            # request ok: b'ok <seq>'
+            self._ack(int(line[3:]))
+        elif line.startswith(b'err - '):
+            # request discarded by the pyboard: b'err - <json str>'
+            self._reject(json.loads(line[6:].decode()))
+        elif line.startswith(b'err '):
+            # request failed: b'err <seq> <json str>'
+            (_, seq, error) = line.split(b' ', 2)
+            self._ack(int(seq), json.loads(error.decode()))
+        elif line.startswith(b'r '):
+            # tagged response: b'r <seq> <payload>'
+            self._receive_response(line)
+        elif line.startswith(b's '):
+            # stream batch; not requested (see stream())
+            self._receive_stream(line)
+        elif line == b'ok':
+            pass  # not sequenced; not sent by us
+        else:
+            try:
+                obj = self._codec.decode(line)
+            except DecodeError:
+                # pyboard has probably hit an exception, and returned to a
+                # REPL; collect the stack trace.
+                self._crash_lines = [line]
+                return
+            if obj is None:  # ie: json.loads('null')
+                obj = ValueError(
+                    ("Received '%s' from remote which decodes to 'None', " % line) +
+                    "this is a reserved value and should not be transmitted by a remote"
+                )
+            self._receive_queue.put_nowait(obj)  # unsolicited
+
+    def _ack(self, seq, error=None):
+        # Request with the given sequence id has completed (or failed)
+        (request, future) = self._pending.pop(seq, (None, None))
+        if request is None:
+            return  # not ours (or timed out); ignore
+
+        if error is not None:
+            exception = PyBoardError("{!r} request {!r} failed:\n  {}".format(
+                self, request, error,
+            ))
+            self._remote_exception_queue.put(exception)
+            if not future.done():
+                future.set_exception(exception)
+        else:
+            # codec change takes effect after set_codec's 'ok'
+            if (self._codec_pending is not None) and (request.get('i') == 'set_codec'):
+                self._apply_codec()
+            if not future.done():
+                future.set_result(self._received.pop(seq, None))
+
+        if not self._pending:
+            self._idle.set()
+
+    def _reject(self, error):
+        # A request couldn't be received by the pyboard (eg: too long), so
+        # it was discarded; it's not known which, so all those in flight fail
+        exception = PyBoardError("{!r} request rejected:\n  {}".format(self, error))
+        self._remote_exception_queue.put(exception)
+        for (_, future) in self._pending.values():
+            if not future.done():
+                future.set_exception(exception)
+        self._pending.clear()
+        self._received.clear()
+        self._idle.set()
+
+    def _receive_response(self, line):
+        # Response to the request with the given sequence id (sent before
+        # its 'ok')
+        (seq, payload) = parse_response(line)
+        if seq not in self._pending:
+            log.debug("%r: discarded response to unknown request %r", self, seq)
+            return
+        self._received[seq] = self._codec.decode(payload)
+
+    def _on_crash(self):
+        # Exception stack trace has been received
+        self._crash_handle = None
+        msg_lines = ["{!r}".format(self)]
+        for l in self._crash_lines:
+            msg_lines.append(
+                '  ' + l.decode(errors='replace').lstrip('\r\n').rstrip('\r\n')
+            )
+        exception = PyBoardError('\n'.join(msg_lines))
+        self._remote_exception.set()
+
+        # Push received exception to
+        #   - dedicated queue (for self.check_health() method)
+        self._remote_exception_queue.put(exception)
+        #   - requests in flight (or receive queue if there are none)
+        pending = [future for (_, future) in self._pending.values() if not future.done()]
+        for future in pending:
+            future.set_exception(exception)
+        if not pending:
+            self._receive_queue.put_nowait(exception)
+        self._pending.clear()
+        self._received.clear()
+        self._idle.set()
+
+        self.halt(force=True)
+
+    # ==================== Context Management ====================
+    def __enter__(self):
+        raise TypeError("use 'async with' for {}".format(type(self).__name__))
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    # ==================== Housekeeping ====================
+    def _remote_constructor(self, key):
+        # Create a coroutine function that will create an instance of object
+        # on pyboard.
+        remote_class = self._remote_class(key)
+
+        async def constructor(*args, **kwargs):
+            payload = self._payload({'rc': key}, *args, **kwargs)
+            instance = remote_class(self, None)
+            if self._batch is not None:
+                # remote id is assigned when the batch is executed
+                self._batch.add_instance(payload, instance)
+            else:
+                receive = await self.send(payload)
+                instance._idx = await receive()
+            return instance
+        constructor.__name__ = key
+        return constructor
@@ -0,0 +1,146 @@
+from .exceptions import ResponseTimeoutException
+
+# Allowance for a batch's encoded size, in addition to its requests; the
+# list of requests is wrapped in a dict, with a tag (unit: bytes)
+BATCH_OVERHEAD = 32
+
+
+class Batch(object):
+    """
+    Requests collected to be sent to a pyboard in a single frame.
+
+    Created by :meth:`PyBoard.batch() <upytester.PyBoard.batch>`, see that
+    method for usage.
+    """
+
+    def __init__(self, pyboard):
+        self.pyboard = pyboard
+        self.requests = []
+        self.responses = None  # set once executed
+        self._instances = []  # format: [(<request index>, <RemoteClass>), ...]
+
+    def __len__(self):
+        return len(self.requests)
+
+    @property
+    def is_complete(self):
+        """``True`` once the batch has been executed by the pyboard."""
+        return self.responses is not None
+
+    def add(self, obj):
+        """
+        Add a request to the batch.
+
+        :param obj: request (as would be given to :meth:`PyBoard.send`)
+        :type obj: :class:`dict`
+        :return: receiver for this request's response
+        :rtype: :class:`BatchResponse`
+        """
+        if self.is_complete:
+            raise RuntimeError("cannot add to {!r}, it's already been sent".format(self))
+        self.requests.append(obj)
+        return BatchResponse(self, len(self.requests) - 1)
+
+    def add_instance(self, obj, instance):
+        """
+        Add a remote class constructor request to the batch.
+
+        The given ``instance`` is assigned its remote id once the batch has
+        been executed.
+        """
+        response = self.add(obj)
+        self._instances.append((response.index, instance))
+        return response
+
+    def frames(self, sequenced=False):
+        """
+        Objects to send to the pyboard to execute this batch.
+
+        Requests are split between as few frames as possible, each short
+        enough for the pyboard to receive (see :attr:`PyBoard.MAX_REQUEST_SIZE
+        <upytester.PyBoard.MAX_REQUEST_SIZE>`). They're executed in order.
+
+        :param sequenced: if ``True``, each list of requests is wrapped in a
+                          :class:`dict` (so it can be tagged, or given a
+                          sequence id)
+        :type sequenced: :class:`bool`
+        :return: frame objects
+        :rtype: :class:`list`
+        :raises ValueError: if a request is too long to be sent in a batch
+        """
+        limit = self.pyboard.MAX_REQUEST_SIZE - BATCH_OVERHEAD
+        groups = []
+        size = 0
+        for obj in self.requests:
+            # each request's encoded size, terminated (or framed), exceeds
+            # its size within a list (with a separator)
+            obj_size = len(self.pyboard._encode(obj))
+            if obj_size > limit:
+                raise ValueError("{!r} request is too long to batch: {!r}".format(self.pyboard, obj))  # noqa: E501
+            if (not groups) or (size + obj_size > limit):
+                groups.append([])
+                size = 0
+            groups[-1].append(obj)
+            size += obj_size
+
+        if sequenced:
+            return [{'b': requests} for requests in groups]
+        return groups
+
+    def complete(self, *responses):
+        """
+        Record the pyboard's responses, and assign remote instance ids.
+
+        :param responses: list received from the pyboard for each frame
+        :type responses: :class:`list`
+        """
+        if not all(isinstance(r, list) for r in responses):
+            raise ResponseTimeoutException("{!r} batch response: {!r}".format(self.pyboard, responses))
+        responses = [response for frame_responses in responses for response in frame_responses]
+        if len(responses) != len(self.requests):
+            raise ResponseTimeoutException("{!r} batch response: {!r}".format(self.pyboard, responses))
+        self.responses = responses
+
+        for (index, instance) in self._instances:
+            instance._idx = responses[index]
+
+        return self.responses
+
+    def execute(self):
+        """
+        Send all requests to the pyboard, and collect their responses.
+
+        :return: response for each request (``None`` for those that return
+                 nothing)
+        :rtype: :class:`list`
+        """
+        pyboard = self.pyboard
+        receivers = [pyboard.send(frame) for frame in self.frames(sequenced=True)]
+        return self.complete(*(
+            receiver(timeout=pyboard.RESPONSE_TIMEOUT) for receiver in receivers
+        ))
+
+    def __repr__(self):
+        return "<{cls}: {count} requests for {pyboard!r}>".format(
+            cls=type(self).__name__,
+            count=len(self.requests),
+            pyboard=self.pyboard,
+        )
+
+
+class BatchResponse(object):
+    """
+    Receiver for a single request's response within a :class:`Batch`.
+
+    Called just like :meth:`PyBoard.receive`, but only once the batch has
+    been executed.
+    """
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    def __call__(self, timeout=None):
+        if not self.batch.is_complete:
+            raise RuntimeError("response not available until {!r} is sent".format(self.batch))
+        return self.batch.responses[self.index]
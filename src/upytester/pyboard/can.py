@@ -0,0 +1,102 @@
+"""
+Decode CAN frames captured by the pyboard (see the firmware's
+``capture_can``).
+
+Frames are received by the pyboard from its CAN fifo interrupts, and
+buffered as packed records (see :data:`CAN_FMT`); they're drained in bulk
+with ``capture_read`` (or streamed)::
+
+    >>> pyboard.config_can(1, mode='normal')
+    >>> pyboard.can_filter(1, 0, 'mask32', 0, [0, 0])  # accept all into fifo 0
+    >>> pyboard.capture_can('rx', bus=1)
+    >>> # ... later
+    >>> block = pyboard.capture_read('rx')()
+    >>> for frame in unpack_can(block, ids=[0x123, 0x124]):
+    ...     print(frame.id, frame.data)
+
+or, to analyse bus load (requires ``numpy``)::
+
+    >>> frames = unpack_can(block, array=True)
+    >>> numpy.diff(frames['timestamp'])  # time between frames (unit: us)
+"""
+import struct
+import collections
+
+from .codec import decode_bytes
+from .stream import _struct_to_dtype
+
+
+CAN_FMT = '<IIBBB8s'  # ticks_us, id, dlc, flags, filter match index, data
+CAN_FLAG_RTR = 0x01
+CAN_FLAG_FIFO1 = 0x02
+
+CANFrame = collections.namedtuple('CANFrame', (
+    'timestamp',  # pyboard's ticks_us() when received (wraps at 2**30)
+    'id',  # arbitration id
+    'data',  # bytes
+    'rtr',  # remote transmission request
+    'fifo',  # receive fifo (0 or 1)
+    'fmi',  # filter match index
+))
+
+
+def can_dtype():
+    """
+    numpy dtype of a captured frame (requires ``numpy``).
+
+    Fields are: ``timestamp``, ``id``, ``dlc``, ``flags``, ``fmi``, and
+    ``data`` (8 bytes; only the first ``dlc`` are valid).
+
+    :rtype: :class:`numpy.dtype`
+    """
+    import numpy  # optional dependency
+    names = ('timestamp', 'id', 'dlc', 'flags', 'fmi', 'data')
+    return numpy.dtype([
+        (name, code) for (name, (_, code)) in zip(names, _struct_to_dtype(CAN_FMT))
+    ])
+
+
+def can_frames(records, ids=None):
+    """
+    Frames from unpacked records (eg: from a streamed capture's
+    :meth:`Stream.records() <upytester.pyboard.stream.Stream.records>`).
+
+    :param records: iterable of record tuples (see :data:`CAN_FMT`)
+    :param ids: if set, only frames with these ids are yielded
+    :type ids: iterable of :class:`int`
+    :return: generator of :class:`CANFrame`
+    """
+    ids = None if ids is None else set(ids)
+    for (timestamp, id, dlc, flags, fmi, data) in records:
+        if (ids is None) or (id in ids):
+            yield CANFrame(
+                timestamp, id, data[:dlc],
+                bool(flags & CAN_FLAG_RTR), 1 if (flags & CAN_FLAG_FIFO1) else 0, fmi,
+            )
+
+
+def unpack_can(block, ids=None, array=False):
+    """
+    Unpack a block of frames returned by ``capture_read``.
+
+    :param block: ``{'fmt': <record format>, 'data': <packed records>, ...}``
+                  (``data`` may be base64 encoded)
+    :type block: :class:`dict`
+    :param ids: if set, only frames with these ids are returned
+    :type ids: iterable of :class:`int`
+    :param array: if ``True``, a numpy structured array is returned (see
+                  :meth:`can_dtype`)
+    :type array: :class:`bool`
+    :return: frames
+    :rtype: generator of :class:`CANFrame`, or :class:`numpy.ndarray`
+    """
+    if block['fmt'] != CAN_FMT:
+        raise ValueError("not a block of CAN frames (format {!r})".format(block['fmt']))  # noqa: E501
+    data = decode_bytes(block['data'])
+    if array:
+        import numpy  # optional dependency
+        frames = numpy.frombuffer(data, dtype=can_dtype())
+        if ids is not None:
+            frames = frames[numpy.isin(frames['id'], list(ids))]
+        return frames
+    return can_frames(struct.iter_unpack(CAN_FMT, data), ids=ids)
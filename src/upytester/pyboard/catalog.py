@@ -0,0 +1,143 @@
+import os
+import json
+
+# Logging
+import logging
+log = logging.getLogger(__name__)
+
+
+def default_cache_dir(name='catalog'):
+    """
+    Default directory for cached data (catalogs by default).
+
+    ``$XDG_CACHE_HOME/upytester/<name>`` (``~/.cache`` if not set).
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')  # noqa: E501
+    return os.path.join(cache_home, 'upytester', name)
+
+
+class CatalogCache(object):
+    """
+    On-disk cache of each pyboard's catalog; its lists of instructions, and
+    remote classes.
+
+    The pyboard identifies its catalog with a hash (the ``get_catalog_hash``
+    instruction). While that's unchanged, cached lists are used, so they
+    needn't be fetched each time a :class:`PyBoard <upytester.PyBoard>` is
+    opened.
+
+    One json file is kept per serial number.
+
+    :param directory: where catalogs are cached (default:
+                      :meth:`default_cache_dir`)
+    :type directory: :class:`str`
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_cache_dir()
+
+    @classmethod
+    def from_option(cls, value):
+        """
+        Cache for a :class:`PyBoard <upytester.PyBoard>`'s ``catalog_cache``
+        parameter.
+
+        :param value: ``True`` for the default cache, ``False`` (or
+                      ``None``) for no cache, a directory, or a
+                      :class:`CatalogCache` instance
+        :return: cache, or ``None``
+        :rtype: :class:`CatalogCache`
+        """
+        if isinstance(value, cls):
+            return value
+        elif value is True:
+            return cls()
+        elif value:
+            return cls(directory=value)
+        return None
+
+    def filename(self, serial_number):
+        return os.path.join(
+            self.directory,
+            '{}.json'.format(serial_number.replace(os.sep, '_')),
+        )
+
+    def load(self, serial_number, catalog_hash):
+        """
+        Load cached catalog.
+
+        :param serial_number: pyboard's serial number
+        :type serial_number: :class:`str`
+        :param catalog_hash: pyboard's current catalog hash
+        :type catalog_hash: :class:`str`
+        :return: ``(<instruction list>, <remote class list>)``, or ``None``
+                 if nothing is cached for the given hash
+        :rtype: :class:`tuple`
+        """
+        if not catalog_hash:
+            return None
+        try:
+            with open(self.filename(serial_number), 'r') as fh:
+                data = json.load(fh)
+            if data['hash'] != catalog_hash:
+                return None
+            return (data['instructions'], data['remote_classes'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None  # not cached, or unreadable
+
+    def save(self, serial_number, catalog_hash, instructions, remote_classes):
+        """
+        Cache a pyboard's catalog.
+
+        Failure to write the cache is logged, but not raised.
+
+        :param serial_number: pyboard's serial number
+        :type serial_number: :class:`str`
+        :param catalog_hash: hash of the given catalog (given by the pyboard)
+        :type catalog_hash: :class:`str`
+        :param instructions: names of instructions
+        :type instructions: :class:`list`
+        :param remote_classes: names of remote classes
+        :type remote_classes: :class:`list`
+        """
+        if not catalog_hash:
+            return
+        filename = self.filename(serial_number)
+        temp_filename = '{}.{}.tmp'.format(filename, os.getpid())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_filename, 'w') as fh:
+                json.dump({
+                    'hash': catalog_hash,
+                    'instructions': instructions,
+                    'remote_classes': remote_classes,
+                }, fh)
+            os.replace(temp_filename, filename)  # atomic
+        except OSError as e:
+            log.warning("could not cache catalog for %s: %s", serial_number, e)
+
+    def clear(self, serial_number=None):
+        """
+        Remove cached catalog(s).
+
+        :param serial_number: pyboard's serial number (default: all)
+        :type serial_number: :class:`str`
+        """
+        if serial_number is not None:
+            filenames = [self.filename(serial_number)]
+        elif os.path.isdir(self.directory):
+            filenames = [
+                os.path.join(self.directory, f)
+                for f in os.listdir(self.directory) if f.endswith('.json')
+            ]
+        else:
+            filenames = []
+
+        for filename in filenames:
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+
+    def __repr__(self):
+        return "<{cls}: {dir!r}>".format(cls=type(self).__name__, dir=self.directory)
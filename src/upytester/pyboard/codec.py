@@ -0,0 +1,372 @@
+r"""
+Serialisation of objects sent between host and pyboard.
+
+Two codecs are supported, the pyboard's equivalent is ``upyt.cmd.codec``.
+
+**JSON** (default)
+
+Each object is json encoded, and terminated with a ``\r``.
+
+**Binary**
+
+Each frame is a marker byte (``0xFE``), the payload length (2 bytes, little
+endian), then the payload::
+
+    FE 05 00 81 A1 69 CC 07
+
+The payload is a tagged value, with a format similar to
+`msgpack <https://msgpack.org/>`_ (subset shown below). All tags are
+``>= 0x80``, so a payload starting with an ASCII character is a text
+control message (eg: ``ok``).
+
+==============  ==============================================
+Tag             Value
+==============  ==============================================
+``0x80-0x8F``   map, with up to 15 key/value pairs
+``0x90-0x9F``   list, with up to 15 items
+``0xA0-0xBF``   string, with up to 31 bytes
+``0xC0``        ``None``
+``0xC2``        ``False``
+``0xC3``        ``True``
+``0xC4``        bytes, u8 length
+``0xC5``        bytes, u16 length
+``0xCA``        float, 32 bit
+``0xCB``        float, 64 bit
+``0xCC-0xCE``   unsigned int, 8, 16, 32 bit
+``0xD0-0xD3``   signed int, 8, 16, 32, 64 bit
+``0xD9``        string, u8 length
+``0xDA``        string, u16 length
+``0xDC``        list, u16 length
+``0xDE``        map, u16 length
+``0xE0-0xFF``   negative int (-32 to -1)
+==============  ==============================================
+
+Instruction names (``'i'``) and remote class names (``'rc'``) in requests
+are replaced with their index in the pyboard's (sorted) lists of each.
+"""
+import json
+import base64
+import struct
+
+from .reader import LineReader, FrameReader
+
+
+class DecodeError(ValueError):
+    """Raised when received data cannot be decoded."""
+
+
+# ==================== JSON ====================
+class JSONCodec(object):
+    """Human readable (default) codec."""
+
+    name = 'json'
+
+    def __init__(self, pyboard=None):
+        self.pyboard = pyboard
+
+    def encode(self, obj, default=None):
+        """
+        Encode the given object as a single frame.
+
+        :param obj: object to encode
+        :param default: function called for objects that can't otherwise be
+                        encoded (like :func:`json.dumps`)
+        :rtype: :class:`bytes`
+        """
+        return json.dumps(obj, separators=(',', ':'), default=default).encode() + b'\r'
+
+    def decode(self, payload):
+        """
+        Decode a single frame's payload.
+
+        :rtype: decoded object
+        :raises: :class:`DecodeError`
+        """
+        try:
+            return json.loads(payload.decode())
+        except (ValueError, UnicodeDecodeError) as e:
+            raise DecodeError(str(e))
+
+    def reader(self, stream, data=b''):
+        """Create a reader to split the given stream into frames."""
+        return LineReader(stream, data=data)
+
+
+# ==================== Binary ====================
+_pack_uint8 = struct.Struct('<B').pack
+_pack_uint16 = struct.Struct('<H').pack
+_pack_uint32 = struct.Struct('<I').pack
+_pack_int8 = struct.Struct('<b').pack
+_pack_int16 = struct.Struct('<h').pack
+_pack_int32 = struct.Struct('<i').pack
+_pack_int64 = struct.Struct('<q').pack
+_pack_float64 = struct.Struct('<d').pack
+
+
+def _pack(obj, out, default):
+    if obj is None:
+        out.append(0xC0)
+    elif obj is True:
+        out.append(0xC3)
+    elif obj is False:
+        out.append(0xC2)
+    elif isinstance(obj, int):
+        if 0 <= obj:
+            if obj <= 0xFF:
+                out.append(0xCC)
+                out += _pack_uint8(obj)
+            elif obj <= 0xFFFF:
+                out.append(0xCD)
+                out += _pack_uint16(obj)
+            elif obj <= 0xFFFFFFFF:
+                out.append(0xCE)
+                out += _pack_uint32(obj)
+            else:
+                out.append(0xD3)
+                out += _pack_int64(obj)
+        elif -32 <= obj:
+            out += _pack_int8(obj)  # negative fixint
+        elif -0x80 <= obj:
+            out.append(0xD0)
+            out += _pack_int8(obj)
+        elif -0x8000 <= obj:
+            out.append(0xD1)
+            out += _pack_int16(obj)
+        elif -0x80000000 <= obj:
+            out.append(0xD2)
+            out += _pack_int32(obj)
+        else:
+            out.append(0xD3)
+            out += _pack_int64(obj)
+    elif isinstance(obj, float):
+        out.append(0xCB)
+        out += _pack_float64(obj)
+    elif isinstance(obj, str):
+        data = obj.encode()
+        size = len(data)
+        if size <= 31:
+            out.append(0xA0 | size)
+        elif size <= 0xFF:
+            out.append(0xD9)
+            out.append(size)
+        elif size <= 0xFFFF:
+            out.append(0xDA)
+            out += _pack_uint16(size)
+        else:
+            raise ValueError("cannot pack str of {} bytes".format(size))
+        out += data
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        size = len(obj)
+        if size <= 0xFF:
+            out.append(0xC4)
+            out.append(size)
+        elif size <= 0xFFFF:
+            out.append(0xC5)
+            out += _pack_uint16(size)
+        else:
+            raise ValueError("cannot pack {} bytes".format(size))
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        size = len(obj)
+        if size <= 15:
+            out.append(0x90 | size)
+        elif size <= 0xFFFF:
+            out.append(0xDC)
+            out += _pack_uint16(size)
+        else:
+            raise ValueError("cannot pack list of {} items".format(size))
+        for item in obj:
+            _pack(item, out, default)
+    elif isinstance(obj, dict):
+        size = len(obj)
+        if size <= 15:
+            out.append(0x80 | size)
+        elif size <= 0xFFFF:
+            out.append(0xDE)
+            out += _pack_uint16(size)
+        else:
+            raise ValueError("cannot pack dict of {} items".format(size))
+        for (key, value) in obj.items():
+            _pack(key, out, default)
+            _pack(value, out, default)
+    elif default is not None:
+        _pack(default(obj), out, default)
+    else:
+        raise TypeError("Object of type '{}' cannot be packed".format(type(obj).__name__))
+
+
+def pack(obj, default=None):
+    """
+    Encode the given object in the binary tagged value format.
+
+    :param default: function called for objects that can't otherwise be
+                    encoded; must return an object that can be.
+    :rtype: :class:`bytes`
+    """
+    out = bytearray()
+    _pack(obj, out, default)
+    return bytes(out)
+
+
+# tag: (struct format, size)
+_FIXED_FORMATS = {
+    0xCA: struct.Struct('<f'),
+    0xCB: struct.Struct('<d'),
+    0xCC: struct.Struct('<B'),
+    0xCD: struct.Struct('<H'),
+    0xCE: struct.Struct('<I'),
+    0xD0: struct.Struct('<b'),
+    0xD1: struct.Struct('<h'),
+    0xD2: struct.Struct('<i'),
+    0xD3: struct.Struct('<q'),
+}
+_unpack_uint16 = struct.Struct('<H').unpack_from
+
+
+def _unpack(data, i):
+    # returns: (<obj>, <index after obj>)
+    tag = data[i]
+    i += 1
+    if tag >= 0xE0:
+        return (tag - 0x100, i)
+    elif tag < 0x80:
+        raise DecodeError("invalid tag 0x{:02X}".format(tag))
+    elif tag < 0x90:
+        (count, container) = (tag & 0x0F, dict)
+    elif tag < 0xA0:
+        (count, container) = (tag & 0x0F, list)
+    elif tag < 0xC0:
+        size = tag & 0x1F
+        return (bytes(data[i:i + size]).decode(), i + size)
+    elif tag in _FIXED_FORMATS:
+        fmt = _FIXED_FORMATS[tag]
+        return (fmt.unpack_from(data, i)[0], i + fmt.size)
+    elif tag == 0xC0:
+        return (None, i)
+    elif tag == 0xC2:
+        return (False, i)
+    elif tag == 0xC3:
+        return (True, i)
+    elif tag in (0xC4, 0xD9):
+        size = data[i]
+        value = bytes(data[i + 1:i + 1 + size])
+        return (value.decode() if tag == 0xD9 else value, i + 1 + size)
+    elif tag in (0xC5, 0xDA):
+        size = _unpack_uint16(data, i)[0]
+        value = bytes(data[i + 2:i + 2 + size])
+        return (value.decode() if tag == 0xDA else value, i + 2 + size)
+    elif tag in (0xDC, 0xDE):
+        count = _unpack_uint16(data, i)[0]
+        container = list if tag == 0xDC else dict
+        i += 2
+    else:
+        raise DecodeError("invalid tag 0x{:02X}".format(tag))
+
+    # Containers
+    if container is list:
+        obj = []
+        for _ in range(count):
+            (item, i) = _unpack(data, i)
+            obj.append(item)
+    else:
+        obj = {}
+        for _ in range(count):
+            (key, i) = _unpack(data, i)
+            (obj[key], i) = _unpack(data, i)
+    return (obj, i)
+
+
+def unpack(data):
+    """
+    Decode a value from the binary tagged value format.
+
+    :param data: encoded value
+    :type data: :class:`bytes`
+    :raises: :class:`DecodeError` if ``data`` is not exactly 1 encoded value
+    """
+    try:
+        (obj, i) = _unpack(data, 0)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise DecodeError("truncated or invalid value: {}".format(e))
+    if i != len(data):
+        raise DecodeError("{} unexpected byte(s) after value".format(len(data) - i))
+    return obj
+
+
+class BinaryCodec(object):
+    """Compact, length-prefixed codec."""
+
+    name = 'bin'
+
+    MARKER = FrameReader.MARKER
+
+    def __init__(self, pyboard):
+        self.pyboard = pyboard
+
+    def _compact(self, obj):
+        # Replace instruction & remote class names with their index
+        if isinstance(obj, list):
+            return [self._compact(o) for o in obj]
+        elif not isinstance(obj, dict):
+            return obj
+
+        if 'b' in obj:
+            return dict(obj, b=self._compact(obj['b']))
+        elif 'rc' in obj:
+            return dict(obj, rc=self.pyboard.remote_class_list.index(obj['rc']))
+        elif ('i' in obj) and ('rid' not in obj):
+            return dict(obj, i=self.pyboard.instruction_list.index(obj['i']))
+        return obj
+
+    def encode(self, obj, default=None):
+        """Encode the given request as a single frame (see :meth:`JSONCodec.encode`)."""
+        payload = pack(self._compact(obj), default=default)
+        if len(payload) > 0xFFFF:
+            raise ValueError("cannot frame {} bytes".format(len(payload)))
+        return bytes((self.MARKER,)) + _pack_uint16(len(payload)) + payload
+
+    def decode(self, payload):
+        """Decode a single frame's payload (see :meth:`JSONCodec.decode`)."""
+        if not payload or payload[0] < 0x80:
+            raise DecodeError("not a binary payload: {!r}".format(payload))
+        return unpack(payload)
+
+    def reader(self, stream, data=b''):
+        """Create a reader to split the given stream into frames."""
+        return FrameReader(stream, data=data)
+
+
+CODEC_MAP = {
+    JSONCodec.name: JSONCodec,
+    BinaryCodec.name: BinaryCodec,
+}
+
+
+def encode_bytes(data, codec_name):
+    """
+    Binary data as it should be sent to the pyboard with the named codec;
+    base64 encoded (a :class:`str`) with the json codec, otherwise
+    unchanged (the pyboard's ``upyt.cmd.mapping.decode_bytes`` accepts
+    either).
+
+    :param data: data to send
+    :type data: :class:`bytes`
+    :param codec_name: codec in use (see :attr:`PyBoard.codec
+                       <upytester.PyBoard.codec>`)
+    :type codec_name: :class:`str`
+    """
+    if codec_name == JSONCodec.name:
+        return base64.b64encode(bytes(data)).decode()
+    return bytes(data)
+
+
+def decode_bytes(data):
+    """
+    Binary data sent by the pyboard (see ``upyt.cmd.mapping.encode_bytes``);
+    a base64 encoded :class:`str` is decoded.
+
+    :rtype: :class:`bytes`
+    """
+    if isinstance(data, str):
+        return base64.b64decode(data)
+    return bytes(data)
@@ -8,3 +8,19 @@ class PyBoardError(Exception):
     See the example ":ref:`examples.basic.remote-exception`" for more
     details.
     """
+
+
+class PoolError(PyBoardError):
+    """
+    Raised when one or more pyboards in a
+    :class:`PyBoardPool <upytester.pyboard.pool.PyBoardPool>` fail.
+
+    :attr:`errors` is a :class:`dict` of each exception raised, indexed by
+    pyboard name.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super(PoolError, self).__init__('\n'.join(
+            "{}: {!r}".format(name, errors[name]) for name in sorted(errors)
+        ))
@@ -0,0 +1,245 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from .exceptions import PoolError
+
+# Logging
+import logging
+log = logging.getLogger(__name__)
+
+
+class PoolResult(dict):
+    """
+    Results of a call made on every pyboard in a :class:`PyBoardPool`.
+
+    Values returned by each pyboard are indexed by name; exceptions raised
+    are collected in :attr:`errors` (also indexed by name)::
+
+        >>> result = pool.map('ping', value=1)
+        >>> result
+        {'pyb_a': {'value': 2}, 'pyb_b': {'value': 2}}
+        >>> result.errors
+        {}
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(PoolResult, self).__init__(*args, **kwargs)
+        self.errors = {}  # format: {<name>: <Exception>, ...}
+
+    @property
+    def ok(self):
+        """``True`` if no errors were raised."""
+        return not self.errors
+
+    def raise_errors(self):
+        """
+        Raise errors (if there are any).
+
+        :raises PoolError: if any pyboard raised an exception
+        :return: self (for chaining)
+        """
+        if self.errors:
+            raise PoolError(self.errors)
+        return self
+
+
+class PyBoardPool(object):
+    """
+    A collection of pyboards, operated on concurrently.
+
+    Each pyboard is opened (or closed, or called) in a separate worker
+    thread, so the time taken is that of the slowest, not the sum of all of
+    them::
+
+        >>> from upytester import PyBoardPool
+        >>> with PyBoardPool.from_config() as pool:
+        ...     pool.map('ping', value=1)
+        {'pyb_a': {'value': 2}, 'pyb_b': {'value': 2}}
+
+    Results from each pyboard are returned in a :class:`PoolResult`.
+
+    :param pyboards: pyboards indexed by name, or a list of pyboards (named
+                     by :attr:`PyBoard.name`, or their serial number)
+    :type pyboards: :class:`dict`
+    :param max_workers: maximum number of worker threads (default: one per
+                        pyboard)
+    :type max_workers: :class:`int`
+    """
+
+    def __init__(self, pyboards, max_workers=None):
+        if not isinstance(pyboards, dict):
+            pyboards = {(p.name or p.serial_number): p for p in pyboards}
+        self.pyboards = pyboards
+        self.max_workers = max_workers
+        self._executor = None
+
+    @classmethod
+    def from_config(cls, names=None, config=None, max_workers=None, **kwargs):
+        """
+        Create a pool of devices configured in the project.
+
+        Pyboards are not opened until :meth:`open` is called (or the pool
+        is used as a context manager).
+
+        :param names: device names (default: all devices in config)
+        :type names: :class:`list`
+        :param config: project config (default: from
+                       :meth:`get_config <upytester.project.get_config>`)
+        :type config: :class:`dict`
+        :param max_workers: see :class:`PyBoardPool`
+        :param kwargs: passed to each :class:`PyBoard`
+        """
+        from .. import project
+        if config is None:
+            config = project.get_config()
+        if names is None:
+            names = sorted(config['devices'].keys())
+
+        kwargs['auto_open'] = False
+        return cls(
+            {
+                name: project.get_device(name, config=config, **kwargs)
+                for name in names
+            },
+            max_workers=max_workers,
+        )
+
+    # ==================== Collection ====================
+    @property
+    def names(self):
+        return sorted(self.pyboards.keys())
+
+    def __getitem__(self, name):
+        return self.pyboards[name]
+
+    def __iter__(self):
+        return iter(self.pyboards.values())
+
+    def __len__(self):
+        return len(self.pyboards)
+
+    def __repr__(self):
+        return "<{cls}: {names!r}>".format(
+            cls=type(self).__name__,
+            names=self.names,
+        )
+
+    # ==================== Concurrency ====================
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers or max(len(self.pyboards), 1),
+                thread_name_prefix='{!r}'.format(self),
+            )
+        return self._executor
+
+    def apply(self, func, *args, **kwargs):
+        """
+        Call ``func(pyboard, *args, **kwargs)`` for every pyboard,
+        concurrently.
+
+        :param func: function called with each pyboard
+        :type func: callable
+        :return: each call's returned value (or raised exception)
+        :rtype: :class:`PoolResult`
+        """
+        return self._gather({
+            name: self.executor.submit(func, pyboard, *args, **kwargs)
+            for (name, pyboard) in self.pyboards.items()
+        })
+
+    def map(self, instruction, *args, receive=True, **kwargs):
+        """
+        Broadcast an instruction to every pyboard, and gather responses.
+
+        Instructions are sent concurrently::
+
+            >>> pool.map('ping', value=10)
+            {'pyb_a': {'value': 11}, 'pyb_b': {'value': 11}}
+
+        :param instruction: name of instruction
+        :type instruction: :class:`str`
+        :param receive: if set, each pyboard's response is received (set
+                        to ``False`` for instructions that don't respond)
+        :type receive: :class:`bool`
+        :return: responses
+        :rtype: :class:`PoolResult`
+        """
+        def call(pyboard):
+            receiver = getattr(pyboard, instruction)(*args, **kwargs)
+            if receive:
+                return receiver(timeout=pyboard.RESPONSE_TIMEOUT)
+        return self.apply(call)
+
+    def scatter(self, instruction, arguments, receive=True):
+        """
+        Send an instruction to some pyboards, each with different arguments,
+        and gather responses.
+
+        ``arguments`` is a :class:`dict` of keyword arguments per pyboard::
+
+            >>> pool.scatter('ping', {'pyb_a': {'value': 1}, 'pyb_b': {'value': 5}})
+            {'pyb_a': {'value': 2}, 'pyb_b': {'value': 6}}
+
+        :param instruction: name of instruction
+        :type instruction: :class:`str`
+        :param arguments: keyword arguments, indexed by pyboard name
+        :type arguments: :class:`dict`
+        :param receive: see :meth:`map`
+        :return: responses
+        :rtype: :class:`PoolResult`
+        """
+        def call(pyboard, kwargs):
+            receiver = getattr(pyboard, instruction)(**kwargs)
+            if receive:
+                return receiver(timeout=pyboard.RESPONSE_TIMEOUT)
+        return self._gather({
+            name: self.executor.submit(call, self.pyboards[name], kwargs)
+            for (name, kwargs) in arguments.items()
+        })
+
+    @staticmethod
+    def _gather(futures):
+        result = PoolResult()
+        for (name, future) in futures.items():
+            try:
+                result[name] = future.result()
+            except Exception as e:
+                log.debug("%s raised %r", name, e)
+                result.errors[name] = e
+        return result
+
+    # ==================== Open / Close ====================
+    def open(self):
+        """
+        Open every pyboard, concurrently.
+
+        :raises PoolError: if any pyboards failed to open (once all have
+                           been attempted)
+        """
+        return self.apply(lambda pyboard: pyboard.open()).raise_errors()
+
+    def close(self):
+        """
+        Close every pyboard, concurrently.
+
+        :raises PoolError: if any pyboards failed to close (once all have
+                           been attempted)
+        """
+        try:
+            return self.apply(lambda pyboard: pyboard.close()).raise_errors()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __enter__(self):
+        try:
+            self.open()
+        except PoolError:
+            self.close()  # those that did open
+            raise
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -2,6 +2,8 @@ import serial
 import json
 import time
 import os
+import itertools
+from contextlib import contextmanager
 
 # Threads
 import threading
@@ -9,6 +11,13 @@ import queue
 
 # Local libs
 from . import utils
+from . import transfer
+from .batch import Batch
+from .response import Response, parse_response
+from .catalog import CatalogCache
+from .stream import Stream, DEFAULT_WINDOW, parse_batch
+from .utils.mpy import MpyCompiler
+from .codec import CODEC_MAP, JSONCodec, DecodeError
 from .exceptions import ResponseTimeoutException, PyBoardError
 
 # Logging
@@ -30,6 +39,12 @@ class PyBoard(object):
     READ_TIMEOUT = 0.1  # maximum time per read (unit: sec)
     WRITE_TIMEOUT = 0.1  # maximum time to wait while reading transmit queue
     RESPONSE_TIMEOUT = 1  # (unit: sec)
+    RECONNECT_TIMEOUT = 10  # maximum time for USB to re-connect to OS (unit: sec)
+    RECONNECT_DELAY = 2.5  # assumed time for USB to re-connect, if not watched (unit: sec)  # noqa: E501
+
+    # Longest request the pyboard can receive, once encoded (the size of
+    # the firmware's receive buffer) (unit: bytes)
+    MAX_REQUEST_SIZE = 2048
 
     # Defaults
     DEFAULT_BAUDRATE = 115200
@@ -41,6 +56,9 @@ class PyBoard(object):
             comport_class=serial.Serial,
             auto_open=True,
             heartbeat=True,
+            pipeline=0,
+            codec=None,
+            catalog_cache=None,
         ):
         """
         :param serial_number: Serial number of PyBoard instance
@@ -51,6 +69,23 @@ class PyBoard(object):
         :param comport: serial stream (optional)
         :param comport_class: optional class to customize stream behaviour,
                               defaults to :class:`serial.Serial`
+        :param pipeline: maximum number of requests in flight (see
+                         :attr:`pipeline`), ``0`` to disable (default)
+        :type pipeline: :class:`int`
+        :param codec: codec to negotiate when opened (see :attr:`codec`),
+                      json is used by default
+        :type codec: :class:`str`
+        :param catalog_cache: where lists of instructions & remote classes
+                              are cached between connections; ``True`` for
+                              the default location, ``False`` to fetch them
+                              every time (see :class:`CatalogCache
+                              <upytester.pyboard.catalog.CatalogCache>`).
+                              By default they're cached, unless ``comport``
+                              is given (eg: a :class:`SimulatedPyBoard
+                              <upytester.simulator.SimulatedPyBoard>`); the
+                              cache is keyed by serial number, which is then
+                              only a label.
+        :type catalog_cache: :class:`bool`, or :class:`str`
 
         To get a list of valid `serial_number` values call
         :meth:`<upytester.PyBoard.connected_serial_numbers> connected_serial_numbers`::
@@ -71,15 +106,51 @@ class PyBoard(object):
 
         self._open_flag = False
 
+        # Requests queued, or awaiting an 'ok' (see self.wait())
+        self._activity = threading.Condition()
+        self._in_flight = 0
+
         # Queues
         self._receive_queue = queue.Queue()
         self._receive_ok_queue = queue.Queue()
         self._transmit_queue = queue.Queue()
         self._remote_exception_queue = queue.Queue()
 
+        # Pipelined requests
+        self._pipeline_depth = 0
+        self._pipeline_slots = None  # semaphore, limits requests in flight
+        self._pipeline_lock = threading.Lock()
+        self._pipeline_pending = {}  # format: {<seq>: <request obj>, ...}
+        self._pipeline_errors = queue.Queue()
+        self._sequence = itertools.count(1)
+        self.pipeline = pipeline
+
+        # Responses awaited (see self.send())
+        self._responses_lock = threading.Lock()
+        self._responses = {}  # format: {<tag>: <Response>, ...}
+
+        # Batched requests (see self.batch())
+        self._batch = None
+
+        # Streams being received (see self.stream())
+        self._streams = {}  # format: {<name>: <Stream>, ...}
+
+        # Codec (see self.codec)
+        self._codec = JSONCodec(self)
+        self._codec_pending = None  # applied by receiver on next 'ok'
+        self._codec_on_open = codec
+        self._reader = None
+
         # Instruction & Remote Class Lists
         self._instruction_list = None
         self._remote_class_list = None
+        if catalog_cache is None:
+            catalog_cache = (comport is None)
+        self._catalog_cache = CatalogCache.from_option(catalog_cache)
+
+        # Generated proxies (see self.__getattr__())
+        self._stub_names = set()  # instruction stubs cached as attributes
+        self._remote_classes = {}  # format: {<name>: <RemoteClass subclass>, ...}
 
         self.comport_class = comport_class
         self._comport = comport
@@ -136,10 +207,19 @@ class PyBoard(object):
         :param quiet: If `True` process will not print anything to stdout
         :type quiet: :class:`bool`
         :param unmount: if ``False``, will not unmount drive after sync
+        :param mpy: if set, ``.py`` files are cross-compiled, and deployed as
+                    ``.mpy`` files (``True``, or a
+                    :class:`MpyCompiler <upytester.pyboard.utils.mpy.MpyCompiler>`)
+        :param serial: if set, files are sent over the serial port instead
+                       of a mounted drive (see :mod:`upytester.pyboard.transfer`)
         """
         unmount = kwargs.pop('unmount', True)
+        mpy = kwargs.pop('mpy', False)
+        if kwargs.pop('serial', False):
+            return self._sync_serial(source, '/sd', mpy, kwargs)
         self.mount_sd()
-        return utils.sync_files_to_sd(source, self, **kwargs)
+        with self._compiled_source(source, mpy, kwargs) as source:
+            return utils.sync_files_to_sd(source, self, **kwargs)
         if unmount:
             self.unmount_sd()
 
@@ -172,11 +252,44 @@ class PyBoard(object):
         (instead of the SD card).
         """
         unmount = kwargs.pop('unmount', True)
+        mpy = kwargs.pop('mpy', False)
+        if kwargs.pop('serial', False):
+            return self._sync_serial(source, '/flash', mpy, kwargs)
         self.mount_flash()
-        return utils.sync_files_to_flash(source, self, **kwargs)
+        with self._compiled_source(source, mpy, kwargs) as source:
+            return utils.sync_files_to_flash(source, self, **kwargs)
         if unmount:
             self.unmount_flash()
 
+    def _sync_serial(self, source, root, mpy, kwargs):
+        # Sync over the serial port (opened for the duration, if closed)
+        kwargs.pop('checksum', None)  # always compared by hash
+        opened = self.is_closed
+        if opened:
+            self.open()
+        try:
+            with self._compiled_source(source, mpy, kwargs) as source:
+                return transfer.sync_tree_serial(self, source, root=root, **kwargs)
+        finally:
+            if opened:
+                self.close()
+
+    @staticmethod
+    @contextmanager
+    def _compiled_source(source, mpy, kwargs):
+        # Source to sync; a compiled copy if mpy is set
+        if not mpy:
+            yield source
+            return
+        compiler = mpy if isinstance(mpy, MpyCompiler) else MpyCompiler()
+        with compiler.compiled(
+            source,
+            exclude=kwargs.get('exclude', []),
+            prefix=kwargs.get('subdir', '.').strip('./'),
+        ) as staging:
+            log.info("compiled %i file(s), %i cached", compiler.compiled_count, compiler.cached_count)  # noqa: E501
+            yield staging
+
     # ==================== Serial Communication ====================
     @property
     def comport(self):
@@ -218,6 +331,230 @@ class PyBoard(object):
         else:
             self._async_transmit.clear()
 
+    @property
+    def pipeline(self):
+        """
+        Maximum number of requests in flight, or ``0`` if disabled.
+
+        When enabled, each request is tagged with a sequence ID, and
+        :meth:`send` returns as soon as the request is queued; it only blocks
+        while the maximum number of requests are awaiting an ``'ok'``.
+
+        The pyboard acknowledges each request by its ID, so if one fails, the
+        :class:`PyBoardError` identifies the exact request. That error is
+        raised by the next call to :meth:`send`, or :meth:`wait`.
+
+        ::
+
+            >>> pyboard.pipeline = 16
+            >>> pins = [pyboard.Pin(p, 'out') for p in pin_names]
+            >>> pyboard.wait()  # block until all requests are ok'd
+        """
+        return self._pipeline_depth
+
+    @pipeline.setter
+    def pipeline(self, value):
+        value = max(int(value or 0), 0)
+        if value == self._pipeline_depth:
+            return  # do nothing
+
+        # Wait for a break in transmission:
+        #   requests in flight were sent with the current behaviour
+        if self.is_open:
+            self._not_transmitting.wait()
+
+        self._pipeline_slots = threading.BoundedSemaphore(value) if value else None
+        self._pipeline_depth = value
+
+    @property
+    def codec(self):
+        """
+        Name of the codec used to communicate with the pyboard.
+
+        ========== ================================================
+        Name       Description
+        ========== ================================================
+        ``'json'`` ``\\r`` terminated json (default)
+        ``'bin'``  compact binary, length-prefixed frames
+        ========== ================================================
+
+        Setting this negotiates the change with the pyboard::
+
+            >>> pyboard.codec = 'bin'
+
+        The default codec is restored when the connection is closed.
+
+        See :mod:`upytester.pyboard.codec` for details of each format.
+        """
+        return self._codec.name
+
+    @codec.setter
+    def codec(self, name):
+        if name not in CODEC_MAP:
+            raise ValueError("unknown codec {!r}, options: {!r}".format(name, sorted(CODEC_MAP)))
+        if name == self._codec.name:
+            return  # do nothing
+        if self.is_closed:
+            raise RuntimeError("cannot change codec while {!r} is closed".format(self))
+
+        # Negotiate synchronously:
+        #   the codec changes on both ends at set_codec's 'ok', so nothing
+        #   else can be in flight.
+        self.wait()
+        (pipeline, async_tx) = (self.pipeline, self.async_tx)
+        self.pipeline = 0
+        self.async_tx = False
+        try:
+            self._codec_pending = CODEC_MAP[name](self)
+            self.send({'i': 'set_codec', 'a': [name]})
+        finally:
+            self._codec_pending = None
+            self.pipeline = pipeline
+            self.async_tx = async_tx
+
+    def _apply_codec(self):
+        # Called by receiver thread on set_codec's 'ok'
+        codec = self._codec_pending
+        self._codec_pending = None
+        data = self._reader.detach()
+        self._reader = codec.reader(self.comport, data=data)
+        self._codec = codec
+
+    def _pipeline_ack(self, seq, error=None):
+        # Called by receiver thread, request with the given sequence id has
+        # completed (or failed)
+        with self._pipeline_lock:
+            request = self._pipeline_pending.pop(seq, None)
+            if request is None:
+                return  # not ours; ignore
+            exception = None
+            if error is not None:
+                exception = PyBoardError("{!r} request {!r} failed:\n  {}".format(
+                    self, request, error,
+                ))
+                self._remote_exception_queue.put(exception)
+                self._pipeline_errors.put(exception)
+            if not self._pipeline_pending:
+                self._not_transmitting.set()
+        with self._responses_lock:
+            response = self._responses.get(seq, None)
+        self._complete_response(response, exception)
+        self._pipeline_slots.release()
+        self._end_request()
+
+    def _pipeline_abort(self, exception):
+        # Called by receiver thread, no more acknowledgements will be received
+        with self._pipeline_lock:
+            pending_count = len(self._pipeline_pending)
+            self._pipeline_pending.clear()
+            self._pipeline_errors.put(exception)
+            self._not_transmitting.set()
+        for i in range(pending_count):
+            self._pipeline_slots.release()
+        self._end_request(pending_count)
+
+    def _request_rejected(self, error):
+        # Called by receiver thread, a request couldn't be received by the
+        # pyboard (eg: too long), so it was discarded; it's not known which.
+        exception = PyBoardError("{!r} request rejected:\n  {}".format(self, error))
+        self._remote_exception_queue.put(exception)
+        if self._pipeline_depth:
+            # no acknowledgement will be received for it; fail those in flight
+            self._abandon_responses(exception)
+            self._pipeline_abort(exception)
+        else:
+            # fail the request awaiting an 'ok'
+            self._receive_ok_queue.put(exception)
+
+    def _begin_request(self):
+        with self._activity:
+            self._in_flight += 1
+
+    def _end_request(self, count=1):
+        # count=None: all requests (eg: they've been abandoned)
+        with self._activity:
+            if count is None:
+                self._in_flight = 0
+            else:
+                self._in_flight = max(self._in_flight - count, 0)
+            self._activity.notify_all()
+
+    def _raise_pipeline_error(self):
+        if not self._pipeline_errors.empty():
+            raise self._pipeline_errors.get(block=False)
+
+    # ----- Responses
+    def _await_response(self, obj, tag=None):
+        # Response to the given request (routed to it by tag, if set)
+        response = Response(obj, tag=tag)
+        if tag is not None:
+            with self._responses_lock:
+                self._responses[tag] = response
+        return response
+
+    def _complete_response(self, response, exception=None):
+        # Request has been acknowledged (or has failed)
+        if response is None:
+            return
+        if response.tag is not None:
+            with self._responses_lock:
+                self._responses.pop(response.tag, None)
+        if exception is None:
+            response.set_complete()
+        else:
+            response.set_exception(exception)
+
+    def _abandon_responses(self, exception):
+        # No more responses will be received; fail all those awaited
+        with self._responses_lock:
+            responses = list(self._responses.values())
+            self._responses.clear()
+        for response in responses:
+            response.set_exception(exception)
+        return len(responses)
+
+    def _receive_response(self, line):
+        # Called by receiver thread with each tagged response
+        (tag, payload) = parse_response(line)
+        with self._responses_lock:
+            response = self._responses.get(tag, None)
+        if response is None:
+            log.debug("%r: discarded response to unknown request %r", self, tag)
+            return
+        response.set_value(self._codec.decode(payload))
+
+    # ----- Streams
+    def stream(self, name, window=DEFAULT_WINDOW, timeout=None):
+        """
+        Start receiving a stream sent by the pyboard (see the firmware's
+        ``upyt.stream``)::
+
+            >>> with pyboard.stream('adc') as adc:
+            ...     samples = adc.read_array(1000)
+
+        :param name: stream's name
+        :type name: :class:`str`
+        :param window: maximum number of batches received, but not yet read
+        :type window: :class:`int`
+        :param timeout: time to wait for each batch (unit: sec) (default:
+                        :attr:`RESPONSE_TIMEOUT`)
+        :type timeout: :class:`float`
+        :return: opened stream (closed when exiting its context)
+        :rtype: :class:`Stream <upytester.pyboard.stream.Stream>`
+        """
+        stream = Stream(self, name, window=window, timeout=timeout)
+        stream.open()
+        return stream
+
+    def _receive_stream(self, line):
+        # Called by receiver thread with each stream batch
+        (name, seq, dropped, data) = parse_batch(line, self._codec.name)
+        stream = self._streams.get(name, None)
+        if stream is None:
+            log.debug("%r: discarded batch of closed stream %r", self, name)
+            return
+        stream._put(seq, dropped, data)
+
     def open(self):
         if self.is_open:
             return  # already open
@@ -236,53 +573,73 @@ class PyBoard(object):
         # actively transmitting event
         self._not_transmitting.set()
 
+        # discard anything left over from the last connection
+        self._discard_transmit_queue()
+        self._end_request(None)
+        with self._responses_lock:
+            self._responses.clear()
+
         # ----- Receiver thread
         # empty queue
         while not self._receive_queue.empty():
             self._receive_queue.get(block=False)  # discard entries
 
+        self._reader = self._codec.reader(self.comport)
+
         def receiver_proc():
             """
             Puts lines onto the received queue.
-
-            :param chunk_size: maximum number of bytes in each chunk
-            :type chunk_size: :class:`int`
             """
             # Line iterator (why? encapsulating mess)
             def line_iter(end_on_timeout=False):
                 # yields each line (not including line end character)
-                line = b''
-                while not self._halt_receive.is_set():
-                    c = self.comport.read(1)
-                    #log.debug("%r --> (c) %r", self, c)
-                    if c:
-                        if c == b'\r':
-                            log.debug("{!r} --> {!r}".format(self, line))
-                            yield line
-                            line = b''
-                        else:
-                            line += c
-                    elif end_on_timeout:
+                while True:
+                    reader = self._reader
+                    for line in reader.iter_lines(self._halt_receive, end_on_timeout):
+                        log.debug("%r --> %r", self, line)
+                        yield line
+                    if not reader.is_detached:
                         break
+                    # else: reader replaced (codec changed), continue with new reader
 
             # One loop per line
             error_state = False
             try:
                 for line in line_iter():
                     if line == b'ok':
+                        # codec change takes effect after set_codec's 'ok'
+                        if self._codec_pending is not None:
+                            self._apply_codec()
                         # separate 'ok' receiver queue (as responses to received requests)
                         self._receive_ok_queue.put(line)
+                    elif line.startswith(b'ok '):
+                        # pipelined request ok: b'ok <seq>'
+                        self._pipeline_ack(int(line[3:]))
+                    elif line.startswith(b'r '):
+                        # tagged response: b'r <tag> <payload>'
+                        self._receive_response(line)
+                    elif line.startswith(b's '):
+                        # stream batch: b's <name> <seq> <dropped> <data>'
+                        self._receive_stream(line)
+                    elif line.startswith(b'err - '):
+                        # request discarded by the pyboard: b'err - <json str>'
+                        self._request_rejected(json.loads(line[6:].decode()))
+                    elif line.startswith(b'err '):
+                        # pipelined request failed: b'err <seq> <json str>'
+                        (_, seq, error) = line.split(b' ', 2)
+                        self._pipeline_ack(int(seq), json.loads(error.decode()))
                     else:
                         # everything else
-                        obj = json.loads(line.rstrip(b'\r').decode())
+                        obj = self._codec.decode(line)
                         if obj is None:  # ie: json.loads('null')
                             raise ValueError(
                                 ("Received '%s' from remote which decodes to 'None', " % line) +
                                 "this is a reserved value and should not be transmitted by a remote"
                             )
+                        # untagged; sent by the pyboard unsolicited
                         self._receive_queue.put(obj)
-            except json.decoder.JSONDecodeError:
-                # a JSON decoding error could be because the pyboard has hit
+            except DecodeError:
+                # a decoding error could be because the pyboard has hit
                 # an exception, and returned to a REPL.
                 # This will cause the pyboard-based exception error text to be send
                 # over serial... so we should print out the entire queue
@@ -297,21 +654,22 @@ class PyBoard(object):
                 msg_lines = ["{!r}".format(self)]
                 for l in _err_line_gen():
                     msg_lines.append(
-                        '  ' + l.decode().lstrip('\r\n').rstrip('\r\n')
+                        '  ' + l.decode(errors='replace').lstrip('\r\n').rstrip('\r\n')
                     )
                 exception = PyBoardError('\n'.join(msg_lines))
 
                 # Push received exception to
                 #   - dedicated queue (for self.check_health() method)
                 self._remote_exception_queue.put(exception)
-                #   - receive queue (for quick response)
-                if self._async_transmit.is_set():
+                #   - requests awaiting a response (or the receive queue if
+                #     there are none)
+                if not self._abandon_responses(exception):
                     self._receive_queue.put(exception)
-                else:
-                    if self._not_transmitting.is_set():
-                        self._receive_queue.put(exception)
-                    else:
-                        self._receive_ok_queue.put(exception)
+                #   - transmitter (stop waiting for an 'ok')
+                if self._pipeline_depth:
+                    self._pipeline_abort(exception)
+                elif not self._not_transmitting.is_set():
+                    self._receive_ok_queue.put(exception)
 
                 self.halt(force=True)
 
@@ -325,44 +683,55 @@ class PyBoard(object):
 
         # ----- Transmitter thread
         def transmit_proc():
-            while not (self._halt_transmit.is_set() and self._transmit_queue.empty()):
-                try:
-                    # Send request
-                    line = self._transmit_queue.get(timeout=self.WRITE_TIMEOUT)
-                    log.debug("%r <-- %r", self, line)
-                    self._not_transmitting.clear()
-                    self.comport.write(line)
-
-                    # Block until response (or timeout & fail)
-                    if self._async_transmit.is_set():
-                        # Pull the 'ok' from the queue, and continue.
-                        #   If an exception is raiesd, it populates the
-                        #   receive queue.
-                        try:
-                            response = self._receive_ok_queue.get(timeout=self.RESPONSE_TIMEOUT)
-                            if isinstance(response, Exception):
-                                raise response  # shouldn't happen
-                        except queue.Empty:
-                            if self._remote_exception.is_set():
-                                # While expecting to receive an 'ok', we
-                                # detected an exception on the host.
-                                # That's why our receive request timed out
-                                pass  # so do nothing
-                            else:
-                                raise ResponseTimeoutException("{!r}".format(self))
-                        finally:
-                            if self._transmit_queue.empty():
-                                self._not_transmitting.set()
-                    else:
-                        # Wait for self.send() to indicate transmission completion
-                        while not self._not_transmitting.wait(timeout=0.05):
-                            if self._halt_transmit.is_set():
-                                break  # handle halt case
-
-                except queue.Empty:
-                    continue
-
+            while True:
+                # Send request
+                #   each is queued with the mode it was sent in; the mode
+                #   may have been changed since.
+                request = self._transmit_queue.get()
+                if request is None:
+                    break  # halted; everything queued before halt() has been sent
+                (line, mode, response) = request
+                log.debug("%r <-- %r", self, line)
+                self._not_transmitting.clear()
+                self.comport.write(line)
+                response.set_transmitted()
+
+                # Block until response (or timeout & fail)
+                if mode == 'pipelined':
+                    # Don't wait; the receiver thread will process the
+                    # 'ok' with this request's sequence id.
+                    pass
+                else:
+                    # Pull the 'ok' from the queue, and complete the request
+                    #   (a blocking send() returns once it's complete).
+                    #   If an exception is raised on the remote, it's given
+                    #   to each request awaiting a response.
+                    try:
+                        ok = self._receive_ok_queue.get(timeout=self.RESPONSE_TIMEOUT)
+                        if isinstance(ok, Exception):
+                            self._complete_response(response, ok)
+                        else:
+                            self._complete_response(response)
+                    except queue.Empty:
+                        if self._remote_exception.is_set():
+                            # While expecting to receive an 'ok', we
+                            # detected an exception on the host.
+                            # That's why our receive request timed out
+                            pass  # so do nothing
+                        else:
+                            self._complete_response(response, ResponseTimeoutException(
+                                "{!r} request {!r}".format(self, response.request)
+                            ))
+                    finally:
+                        if self._transmit_queue.empty():
+                            self._not_transmitting.set()
+                        self._end_request()
+
+            # Stop receiver (interrupting a blocking read, if possible)
             self._halt_receive.set()
+            cancel_read = getattr(self.comport, 'cancel_read', None)
+            if cancel_read is not None:
+                cancel_read()
 
         # start process
         self._transmit_thread = threading.Thread(
@@ -374,8 +743,7 @@ class PyBoard(object):
 
         # --- Communication is open
         # populate lists
-        self.instruction_list
-        self.remote_class_list
+        self._load_catalog()
 
         # show heartbeat (indicates link is active)
         if self._heartbeat:
@@ -384,6 +752,10 @@ class PyBoard(object):
         # set flag
         self._open_flag = True
 
+        # negotiate codec
+        if self._codec_on_open:
+            self.codec = self._codec_on_open
+
     def check_health(self):
         """
         Check for any record of an exception being raised on the remote.
@@ -399,8 +771,8 @@ class PyBoard(object):
         """
         Send a halt event to send and receive threads to cleanly stop.
 
-        Timeouts may still need to play through, so the effect will not be
-        instant.
+        The transmitter stops once everything already queued has been sent,
+        then the receiver is stopped.
 
         :param force: If ``True`` transmit queue is also emptied
         :type force: :class:`bool`
@@ -410,8 +782,22 @@ class PyBoard(object):
         self._halt_transmit.set()
         if force:
             # Clean out transmit queue
-            while not self._transmit_queue.empty():
-                self._transmit_queue.get(block=False)
+            self._discard_transmit_queue()
+            self._end_request(None)  # abandoned
+
+        # Wake transmitter (it stops once everything queued has been sent)
+        self._transmit_queue.put(None)
+        with self._activity:
+            self._activity.notify_all()
+
+    def _discard_transmit_queue(self):
+        # Empty the transmit queue; requests in it will never be sent
+        while not self._transmit_queue.empty():
+            request = self._transmit_queue.get(block=False)
+            if request is not None:
+                self._complete_response(request[2], RuntimeError(
+                    "{!r} request {!r} discarded before it was sent".format(self, request[2].request)  # noqa: E501
+                ))
 
     def close(self):
         """
@@ -425,9 +811,22 @@ class PyBoard(object):
             return  # already closed
 
         # stop heartbeat (fault tolerant)
-        if self._heartbeat:
+        if self._heartbeat and not self._remote_exception.is_set():
             self.heartbeat(False)
 
+        # restore default codec (for the next connection)
+        if self._remote_exception.is_set():
+            self._codec = JSONCodec(self)  # pyboard will have been reset
+        else:
+            self.codec = JSONCodec.name
+
+        # let pipelined requests complete
+        if self._pipeline_depth:
+            try:
+                self.wait()
+            except PyBoardError:
+                pass  # also reported by check_health()
+
         # set halt event
         self.halt()
 
@@ -439,72 +838,192 @@ class PyBoard(object):
         if not self.comport.closed:
             self.comport.close()
 
-        # clear instruction list
+        # clear instruction list (and stubs generated from it)
         self._instruction_list = None
+        self._clear_stubs()
+        self._open_flag = False
 
     @property
     def instruction_list(self):
         """List of names of instruction methods."""
         if self._instruction_list is None:
-            self.send({'i': 'list_instructions'})
-            self._instruction_list = self.receive(timeout=0.1)
+            receiver = self.send({'i': 'list_instructions'})
+            self._instruction_list = receiver(timeout=self.RESPONSE_TIMEOUT)
         return self._instruction_list
 
     @property
     def remote_class_list(self):
         """List of names of remotely accessible classes."""
         if self._remote_class_list is None:
-            self.send({'i': 'list_remote_classes'})
-            self._remote_class_list = self.receive(timeout=0.1)
+            receiver = self.send({'i': 'list_remote_classes'})
+            self._remote_class_list = receiver(timeout=self.RESPONSE_TIMEOUT)
         return self._remote_class_list
 
+    def _load_catalog(self):
+        # Populate instruction & remote class lists, from cache if the
+        # pyboard's catalog hash is unchanged.
+        cache = self._catalog_cache
+        if cache is None:
+            self.instruction_list
+            self.remote_class_list
+            return
+
+        catalog_hash = self.send({'i': 'get_catalog_hash'})(timeout=self.RESPONSE_TIMEOUT)
+        cached = cache.load(self.serial_number, catalog_hash)
+        if cached is not None:
+            (self._instruction_list, self._remote_class_list) = cached
+            return
+
+        cache.save(self.serial_number, catalog_hash, self.instruction_list, self.remote_class_list)
+
     def _json_default_encoding(self, obj):
         if isinstance(obj, type(self).RemoteClass):
             if obj._pyboard is not self:
                 raise ValueError("cannot pass remote object reference from {!r} to {!r}".format(obj._pyboard, self))  # noqa: E501
+            if obj._idx is None:
+                raise ValueError("cannot pass reference to {!r} before it's been created".format(obj))  # noqa: E501
         if hasattr(obj, '__json__'):
             return obj.__json__()
         raise TypeError("Object of type '{}' is not JSON serializable".format(type(obj).__name__))  # noqa: E501
 
+    def _encode(self, obj):
+        # Encode a request with the current codec; it must fit in the
+        # pyboard's receive buffer
+        frame = self._codec.encode(obj, default=self._json_default_encoding)
+        if len(frame) > self.MAX_REQUEST_SIZE:
+            raise ValueError("{!r} request is {} bytes, the limit is {}: {!r}".format(
+                self, len(frame), self.MAX_REQUEST_SIZE, obj,
+            ))
+        return frame
+
     def send(self, obj):
         """
-        Transmit given object encoded as json.
+        Transmit given object, encoded with the current :attr:`codec`.
+
+        Each request (a :class:`dict`) is tagged, so the pyboard's response
+        is routed back to the returned receiver, regardless of what else is
+        received in the meantime; requests may be sent from multiple threads.
 
-        :param obj: object to json encode and transmit
+        :param obj: object to encode and transmit
         :type obj: anthing serializable
+        :return: receiver for the request's response
+        :rtype: :class:`Response <upytester.pyboard.response.Response>`
+        :raises ValueError: if the encoded request is longer than
+                            :attr:`MAX_REQUEST_SIZE`
         """
         if self._halt_transmit.is_set():
             raise RuntimeError("Cannot send more commands while {!r} is being closed".format(self))  # noqa: E501
 
-        line = json.dumps(
-            obj,
-            separators=(',', ':'),
-            default=self._json_default_encoding,
-        ).encode()
+        if self._batch is not None:
+            return self._batch.add(obj)
+
+        if self._pipeline_depth:
+            return self._send_pipelined(obj)
+
+        tag = None
+        if isinstance(obj, dict):
+            tag = next(self._sequence)
+            obj = dict(obj, t=tag)
+        frame = self._encode(obj)
+        mode = 'async' if self._async_transmit.is_set() else 'sync'
         # will be picked up and processed by self._transmit_thread
-        self._transmit_queue.put(line + b'\r')
+        response = self._await_response(obj, tag)
+        self._begin_request()
+        self._transmit_queue.put((frame, mode, response))
 
-        if not self._async_transmit.is_set():
+        if mode == 'sync':
             # Non async transmission behaviour:
-            #   The send function blocks until we receive:
+            #   The send function blocks until the request is complete:
             #       - 'ok' indicating success on the remote
             #       - an exception with details of what went wrong.
-            try:
-                response = self._receive_ok_queue.get(timeout=self.RESPONSE_TIMEOUT)
-                if isinstance(response, Exception):
-                    raise response
-            except queue.Empty:
+            #   The timeout starts once it's transmitted; requests from
+            #   other threads may be queued ahead of it.
+            while not response.wait_transmitted(self.RESPONSE_TIMEOUT):
+                transmitter = getattr(self, '_transmit_thread', None)
+                if (transmitter is None) or (not transmitter.is_alive()):
+                    exception = PyBoardError("{!r} request {!r} not sent, transmitter has stopped".format(self, obj))  # noqa: E501
+                    self._complete_response(response, exception)
+                    self._end_request()
+                    raise exception
+            if not response.wait_complete(self.RESPONSE_TIMEOUT):
                 raise ResponseTimeoutException("{!r}".format(self))
-            finally:
-                if self._transmit_queue.empty():
-                    self._not_transmitting.set()
+            response.result(timeout=0)  # raises failure (if any)
+
+        # return receiver
+        if tag is None:
+            return self.receive  # untagged (eg: a list); response is unsolicited
+        return response
+
+    @contextmanager
+    def batch(self):
+        """
+        Collect requests, and send them to the pyboard in a single frame.
+
+        Instructions, remote class constructors, and remote instance calls
+        made within the context are sent as a single list when the context
+        exits. The pyboard executes them in order, then responds with a
+        list of their responses, and a single ``'ok'``.
+
+        A batch too long for the pyboard to receive in one frame (see
+        :attr:`MAX_REQUEST_SIZE`) is split into as many as needed.
+
+        Remote instances created in a batch are usable once the batch has
+        been sent, and responses are available from each call's receiver::
+
+            >>> with pyboard.batch():
+            ...     pins = [pyboard.Pin(p, 'out') for p in ('X1', 'X2', 'X3')]
+            ...     receiver = pyboard.ping(value=1)
+            >>> receiver()
+            {'value': 2}
+
+        If an exception is raised within the context, nothing is sent.
+
+        :return: collection of requests
+        :rtype: :class:`Batch <upytester.pyboard.batch.Batch>`
+        """
+        if self._batch is not None:
+            raise RuntimeError("{!r} is already collecting a batch".format(self))
+
+        batch = self._batch = Batch(self)
+        try:
+            yield batch
+        finally:
+            self._batch = None
+        batch.execute()
+
+    def _send_pipelined(self, obj):
+        # Raise any failures from previous requests
+        self._raise_pipeline_error()
+
+        # Block while the maximum number of requests are in flight
+        if not self._pipeline_slots.acquire(timeout=self.RESPONSE_TIMEOUT):
+            raise ResponseTimeoutException("{!r}".format(self))
+
+        obj = dict(obj, q=next(self._sequence))
+        try:
+            frame = self._encode(obj)
+        except Exception:
+            self._pipeline_slots.release()
+            raise
 
-        # return receiver method
-        return self.receive
+        response = self._await_response(obj, obj['q'])
+        with self._pipeline_lock:
+            self._pipeline_pending[obj['q']] = obj
+            self._not_transmitting.clear()
+        self._begin_request()
+
+        # will be picked up and processed by self._transmit_thread
+        self._transmit_queue.put((frame, 'pipelined', response))
+
+        return response
 
     def receive(self, timeout=1):
         """
-        Receive object from remote.
+        Receive an unsolicited object from remote.
+
+        Responses to requests are routed to each request's receiver (see
+        :meth:`send`), so this only receives objects the pyboard sends of its
+        own accord (eg: with :meth:`send() <upyt.cmd.mapping.send>`).
 
         If ``timeout`` is set, and nothing is received, ``None`` is returned
         after ``timeout``.
@@ -534,19 +1053,61 @@ class PyBoard(object):
         while True:
             yield self.receive(timeout=timeout)
 
-    def wait(self, period=0.05):
+    def wait(self, timeout=None):
         """
         Wait for transmit queue to be clear, meaning everything in the transmit
         queue has been sent and ok'd by the remote.
 
-        :param period: polling period (seconds)
-        :type period: :class:`float`
+        Returns as soon as the last request is ok'd (or abandoned by
+        :meth:`halt`).
+
+        :param timeout: maximum time to wait (if ``None``, will wait forever)
+        :type timeout: :class:`float`
+        :return: ``True`` if clear, ``False`` if ``timeout`` was reached
+        :rtype: :class:`bool`
         """
-        # FIXME: this is just polling, is there a better way to block until queue is empty?
-        while not (self._transmit_queue.empty() and self._not_transmitting.is_set()):
-            time.sleep(period)
+        with self._activity:
+            is_clear = self._activity.wait_for(lambda: self._in_flight == 0, timeout)
 
-    def reset(self, hard=False):
+        # Raise any failures from pipelined requests
+        self._raise_pipeline_error()
+        return is_clear
+
+    def wait_for_port(self, since=None, timeout=None):
+        """
+        Wait for the pyboard's serial port to be (re)connected.
+
+        :param since: device watcher's :attr:`sequence
+                      <upytester.pyboard.utils.watcher.DeviceWatcher.sequence>`
+                      from before the pyboard was disconnected (default: the
+                      port must be connected after this is called)
+        :type since: :class:`int`
+        :param timeout: maximum time to wait (unit: sec) (default:
+                        :attr:`RECONNECT_TIMEOUT`)
+        :type timeout: :class:`float`
+        :return: ``True`` if connected, ``False`` if ``timeout`` was reached
+        :rtype: :class:`bool`
+        """
+        if timeout is None:
+            timeout = self.RECONNECT_TIMEOUT
+        watcher = utils.get_watcher()
+        if watcher is None:
+            time.sleep(self.RECONNECT_DELAY)  # not watched, assume it's back
+            return True
+
+        if (since is None) and watcher.present(self.serial_number, 'serial'):
+            return True  # already connected
+        event = watcher.wait_for(
+            lambda e: e.is_added and e.matches(self.serial_number, 'serial'),
+            since=since, timeout=timeout,
+        )
+        if event is None:
+            log.warning("%r: serial port not reconnected after %gs", self, timeout)
+            return False
+        log.debug("%r: reconnected as %s", self, event.path)
+        return True
+
+    def reset(self, hard=False, reconnect=False):
         """
         **Soft Reset**
 
@@ -563,18 +1124,40 @@ class PyBoard(object):
             import pyb
             pyb.hard_reset()
 
+        A hard reset returns once the pyboard's serial port has been
+        re-enumerated by the host (see :meth:`wait_for_port`).
+
         :param hard: if ``True``, a hard reset is performed, soft by default
         :type hard: :class:`bool`
+        :param reconnect: if ``True``, an open pyboard is closed before the
+                          reset, and re-opened afterwards
+        :type reconnect: :class:`bool`
         """
+        reopen = reconnect and self.is_open
+        if reopen:
+            self.close()
+        if self.comport.closed:
+            self.comport.open()
+
         if hard:
+            watcher = utils.get_watcher()
+            if watcher and not watcher.present(self.serial_number, 'serial'):
+                watcher = None  # not a udev managed port (eg: simulated)
+            since = watcher.sequence if watcher else None
             self.comport.write(b'\x03\r\nimport pyb\r\npyb.hard_reset()\r\n')
             self.comport.close()
-            time.sleep(2.5)  # wait reasonable time for USB to re-connect to OS
+            if watcher:
+                self.wait_for_port(since=since)
+            else:
+                time.sleep(self.RECONNECT_DELAY)
         else:
             self.comport.write(b'\x03\x04')  # [Ctrl+C] + [Ctrl+D]
             self.comport.close()
         self._comport = None
 
+        if reopen:
+            self.open()
+
     # ==================== Context Management ====================
     def __enter__(self):
         self.open()
@@ -599,6 +1182,73 @@ class PyBoard(object):
             payload['k'] = kwargs
         return payload
 
+    def _stub(self, template, name):
+        """
+        Create a callable that sends the given payload ``template``.
+
+        Positional and keyword arguments given to the callable are added to
+        a copy of the template; if there are none, the template itself is
+        sent (so a call without arguments creates no new objects).
+
+        The callable's ``bind(*args, **kwargs)`` method returns a new stub
+        with the given arguments added to its template; keyword arguments
+        given per call are merged with those bound::
+
+            >>> set_x1 = pyboard.pin_set.bind(pin='X1')
+            >>> set_x1(value=1)  # sends {'i': 'pin_set', 'k': {'pin': 'X1', 'value': 1}}
+        """
+        send = self.send
+        (bound_args, bound_kwargs) = (template.get('a', ()), template.get('k', {}))
+
+        def payload(args, kwargs):
+            obj = dict(template)
+            if args:
+                obj['a'] = (tuple(bound_args) + args) if bound_args else args
+            if kwargs:
+                obj['k'] = dict(bound_kwargs, **kwargs) if bound_kwargs else kwargs
+            return obj
+
+        def stub(*args, **kwargs):
+            if not (args or kwargs):
+                return send(template)
+            return send(payload(args, kwargs))
+
+        def bind(*args, **kwargs):
+            return self._stub(payload(args, kwargs), name)
+
+        stub.__name__ = name
+        stub.template = template
+        stub.bind = bind
+        return stub
+
+    def _clear_stubs(self):
+        for key in self._stub_names:
+            self.__dict__.pop(key, None)
+        self._stub_names.clear()
+
+    def _remote_class(self, key):
+        # Proxy class for the named remote class (created once per pyboard)
+        cls = self._remote_classes.get(key, None)
+        if cls is None:
+            cls = self._remote_classes[key] = type(key, (type(self).RemoteClass,), {})
+        return cls
+
+    def _remote_constructor(self, key):
+        # Create a callable that will create an instance of object on pyboard.
+        remote_class = self._remote_class(key)
+
+        def constructor(*args, **kwargs):
+            payload = self._payload({'rc': key}, *args, **kwargs)
+            instance = remote_class(self, None)
+            if self._batch is not None:
+                # remote id is assigned when the batch is executed
+                self._batch.add_instance(payload, instance)
+            else:
+                instance._idx = self.send(payload)()
+            return instance
+        constructor.__name__ = key
+        return constructor
+
     def __getattr__(self, key):
         # --- Instruction
         is_instruction = all((
@@ -606,15 +1256,12 @@ class PyBoard(object):
             key in self._instruction_list,
         ))
         if is_instruction:
-            # Create a callable that will send apropriately formatted object
-            def instruction(*args, **kwargs):
-                payload = {'i': key}
-                if args:
-                    payload['a'] = args
-                if kwargs:
-                    payload['k'] = kwargs
-                return self.send(payload)
-            instruction.__name__ = key  # function has key name
+            # Create a callable that will send apropriately formatted object.
+            #   Cached as an attribute, so subsequent lookups don't get here
+            #   (cleared when closed).
+            instruction = self._stub({'i': key}, key)
+            self.__dict__[key] = instruction
+            self._stub_names.add(key)
             return instruction
 
         # --- Remote Class
@@ -623,12 +1270,9 @@ class PyBoard(object):
             key in self._remote_class_list,
         ))
         if is_remote_class:
-            # Create instance of object on pyboard.
-            def constructor(*args, **kwargs):
-                payload = self._payload({'rc': key}, *args, **kwargs)
-                return type(key, (type(self).RemoteClass,), {})(
-                    self, self.send(payload)()
-                )
+            constructor = self._remote_constructor(key)
+            self.__dict__[key] = constructor
+            self._stub_names.add(key)
             return constructor
 
         raise AttributeError("'{}' object has no attribute '{}'".format(
@@ -650,7 +1294,20 @@ class PyBoard(object):
             )
 
         def __getattr__(self, key):
+            if key.startswith('__'):
+                # not a remote method (eg: copy / pickle protocol lookups)
+                raise AttributeError(key)
+
+            if self._idx is not None:
+                # Cache method stub as an attribute, so subsequent lookups
+                # don't get here.
+                func = self._pyboard._stub({'rid': self._idx, 'i': key}, key)
+                self.__dict__[key] = func
+                return func
+
             def func(*args, **kwargs):
+                if self._idx is None:
+                    raise RuntimeError("{!r} has not been created on the remote (yet)".format(self))
                 payload = self._pyboard._payload(
                     {'rid': self._idx, 'i': key}, *args, **kwargs
                 )
@@ -0,0 +1,199 @@
+import struct
+from collections import deque
+
+
+class LineReader(object):
+    r"""
+    Buffered reader splitting a serial stream into ``\r`` terminated lines.
+
+    Rather than reading 1 byte at a time, everything waiting in the serial
+    port's input buffer is read in a single call, and appended to a reusable
+    :class:`bytearray`. Completed lines are split out of that buffer and held
+    in a queue until they're consumed.
+
+    :param stream: serial stream to read from, must implement ``read(size)``
+                   and ``in_waiting`` like a :class:`serial.Serial` instance.
+    :param block_size: maximum number of bytes per read
+    :type block_size: :class:`int`
+    :param data: bytes already received from ``stream`` (optional)
+    :type data: :class:`bytes`
+    """
+
+    TERMINATOR = b'\r'
+    DEFAULT_BLOCK_SIZE = 4096  # (unit: bytes)
+
+    def __init__(self, stream, block_size=DEFAULT_BLOCK_SIZE, data=b''):
+        self.stream = stream
+        self.block_size = block_size
+        self.is_detached = False
+
+        self._buffer = bytearray()  # incomplete line (if any)
+        self._lines = deque()  # complete lines, not yet consumed
+        if data:
+            self.feed(data)
+
+    def read_block(self):
+        """
+        Read whatever is waiting on the stream (up to ``block_size``).
+
+        If nothing is waiting, this blocks until at least 1 byte is received,
+        or the stream's read timeout expires.
+
+        :return: received bytes (empty if the read timed out)
+        :rtype: :class:`bytes`
+        """
+        size = min(max(self.stream.in_waiting, 1), self.block_size)
+        return self.stream.read(size)
+
+    def feed(self, data):
+        """
+        Append received data to the buffer, and split out completed lines.
+
+        :param data: received bytes
+        :type data: :class:`bytes`
+        :return: number of lines completed by the given data
+        :rtype: :class:`int`
+        """
+        buf = self._buffer
+        search_from = len(buf)  # terminator can't be in what's already there
+        buf += data
+
+        count = 0
+        start = 0
+        end = buf.find(self.TERMINATOR, search_from)
+        if end < 0:
+            return 0
+
+        with memoryview(buf) as view:
+            while end >= 0:
+                self._lines.append(bytes(view[start:end]))
+                count += 1
+                start = end + 1
+                end = buf.find(self.TERMINATOR, start)
+
+        del buf[:start]  # discard consumed lines (buffer is re-used)
+        return count
+
+    def iter_lines(self, halt_event, end_on_timeout=False):
+        """
+        Yield each line (not including the line end character).
+
+        Lines split from a single read that are not consumed by this
+        iterator are retained, and yielded by the next call.
+
+        :param halt_event: iteration stops when this event is set
+        :type halt_event: :class:`threading.Event`
+        :param end_on_timeout: if ``True``, iteration stops when a read times
+                               out without receiving anything.
+        :type end_on_timeout: :class:`bool`
+        """
+        lines = self._lines
+        while not (halt_event.is_set() or self.is_detached):
+            if lines:
+                yield lines.popleft()
+                continue
+
+            data = self.read_block()
+            if data:
+                self.feed(data)
+            elif end_on_timeout:
+                break
+
+    def ready_lines(self):
+        """
+        Yield each complete line already received, without reading.
+
+        Used when data is read elsewhere (and given to :meth:`feed`), such as
+        by an event loop.
+        """
+        lines = self._lines
+        while lines and not self.is_detached:
+            yield lines.popleft()
+
+    def clear(self):
+        """Discard any buffered data."""
+        del self._buffer[:]
+        self._lines.clear()
+
+    def detach(self):
+        """
+        Stop reading, and return everything received, but not yet consumed.
+
+        Used to hand the stream over to another reader (eg: when changing
+        codec), any active :meth:`iter_lines` iterator will stop.
+
+        :rtype: :class:`bytes`
+        """
+        self.is_detached = True
+        data = b''.join(line + self.TERMINATOR for line in self._lines)
+        data += bytes(self._buffer)
+        self.clear()
+        return data
+
+
+class FrameReader(LineReader):
+    """
+    Buffered reader splitting a serial stream into length-prefixed frames.
+
+    Each frame is a marker byte (``0xFE``), followed by the payload length
+    (2 bytes, little endian), then the payload.
+
+    If anything other than a marker is received where a frame should start,
+    the pyboard is assumed to have dropped to a REPL (printing an exception),
+    and all remaining data is split into lines, like a :class:`LineReader`.
+
+    :meth:`iter_lines` yields each frame's payload.
+    """
+
+    MARKER = 0xFE
+    HEADER = struct.Struct('<BH')
+
+    def __init__(self, *args, **kwargs):
+        self.is_text = False  # set if framing is lost
+        super(FrameReader, self).__init__(*args, **kwargs)
+
+    def feed(self, data):
+        if self.is_text:
+            return super(FrameReader, self).feed(data)
+
+        buf = self._buffer
+        buf += data
+
+        count = 0
+        start = 0
+        header_size = self.HEADER.size
+        with memoryview(buf) as view:
+            while len(buf) - start >= header_size:
+                (marker, size) = self.HEADER.unpack_from(buf, start)
+                if marker != self.MARKER:
+                    break
+                end = start + header_size + size
+                if end > len(buf):
+                    break  # incomplete frame
+                self._lines.append(bytes(view[start + header_size:end]))
+                count += 1
+                start = end
+
+        del buf[:start]
+
+        if buf and (buf[0] != self.MARKER):
+            # Framing lost, remaining data is text
+            self.is_text = True
+            remaining = bytes(buf)
+            del buf[:]
+            count += super(FrameReader, self).feed(remaining)
+
+        return count
+
+    def detach(self):
+        if self.is_text:
+            return super(FrameReader, self).detach()
+
+        self.is_detached = True
+        data = b''.join(
+            self.HEADER.pack(self.MARKER, len(frame)) + frame
+            for frame in self._lines
+        )
+        data += bytes(self._buffer)
+        self.clear()
+        return data
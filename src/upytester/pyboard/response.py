@@ -0,0 +1,133 @@
+"""
+Responses to individual requests.
+
+Each request sent to the pyboard is tagged (``'t'``, or its sequence id
+``'q'`` if pipelined), and the pyboard sends its response tagged to match,
+as a text control message::
+
+    r <tag> <payload>
+
+where ``payload`` is the response object, encoded with the current codec.
+
+So responses are routed to the request they answer, not just to whichever
+caller reads next; threads (or tasks) sharing a pyboard can overlap their
+requests. Anything the pyboard sends untagged (eg: with
+:meth:`send() <upyt.cmd.mapping.send>`) is unsolicited, and is read with
+:meth:`PyBoard.receive() <upytester.PyBoard.receive>`.
+"""
+import threading
+
+
+def parse_response(line):
+    """
+    Parse a tagged response control message.
+
+    :param line: received message (starting with ``b'r '``)
+    :type line: :class:`bytes`
+    :return: ``(<tag>, <encoded payload>)``
+    :rtype: :class:`tuple`
+    """
+    (_, tag, payload) = line.split(b' ', 2)
+    return (int(tag), payload)
+
+
+class Response(object):
+    """
+    Receiver for a single request's response; a future, resolved by the
+    pyboard's receiver thread.
+
+    Returned by :meth:`PyBoard.send() <upytester.PyBoard.send>`, and called
+    just like :meth:`PyBoard.receive() <upytester.PyBoard.receive>`::
+
+        >>> receiver = pyboard.ping(value=1)
+        >>> receiver()
+        {'value': 2}
+
+    The response is ``None`` if the request was completed without one (ie:
+    the instruction returned ``None``).
+
+    :param request: request sent
+    :type request: :class:`dict`
+    :param tag: request's tag (``None`` if untagged)
+    :type tag: :class:`int`
+    """
+
+    def __init__(self, request, tag=None):
+        self.request = request
+        self.tag = tag
+        self._value = None
+        self._exception = None
+        self._transmitted = threading.Event()  # request sent (or never will be)
+        self._ready = threading.Event()  # response received (or never will be)
+        self._complete = threading.Event()  # request acknowledged (or failed)
+
+    # ----- Resolve (called by the pyboard's threads)
+    def set_transmitted(self):
+        self._transmitted.set()
+
+    def set_value(self, value):
+        self._value = value
+        self._ready.set()
+
+    def set_complete(self):
+        # response is always sent before the request is acknowledged
+        self._transmitted.set()
+        self._complete.set()
+        self._ready.set()
+
+    def set_exception(self, exception):
+        if self._exception is None:
+            self._exception = exception
+        self._transmitted.set()
+        self._complete.set()
+        self._ready.set()
+
+    # ----- Query
+    def done(self):
+        """``True`` if the response is available."""
+        return self._ready.is_set()
+
+    def wait_transmitted(self, timeout=None):
+        """
+        Wait for the request to be sent to the pyboard (it may be queued
+        behind others), or to fail.
+
+        :return: ``True`` if sent, ``False`` if ``timeout`` was reached
+        :rtype: :class:`bool`
+        """
+        return self._transmitted.wait(timeout)
+
+    def wait_complete(self, timeout=None):
+        """
+        Wait for the pyboard to acknowledge the request.
+
+        :return: ``True`` if acknowledged, ``False`` if ``timeout`` was reached
+        :rtype: :class:`bool`
+        """
+        return self._complete.wait(timeout)
+
+    def result(self, timeout=None):
+        """
+        Response to the request.
+
+        :param timeout: Time to wait for a response (if ``None``, will wait
+                        forever). If timeout is reached, ``None`` is returned.
+        :type timeout: :class:`float`
+        :return: decoded response object
+        :raises PyBoardError: if the request failed
+        """
+        if not self._ready.wait(timeout):
+            return None
+        if self._exception is not None:
+            raise self._exception
+        return self._value
+
+    def __call__(self, timeout=1):
+        return self.result(timeout=timeout)
+
+    def __repr__(self):
+        return "<{cls}: {request!r}{state}>".format(
+            cls=type(self).__name__,
+            request=self.request,
+            state=" (done)" if self.done() else "",
+        )
@@ -0,0 +1,422 @@
+"""
+Receive data streamed by the pyboard (see the firmware's ``upyt.stream``).
+
+Streams are received separately from instruction responses::
+
+    >>> with pyboard.stream('adc') as adc:
+    ...     samples = adc.read_array(5000)  # numpy array
+    >>> adc.dropped
+    0
+
+Batches are sent by the pyboard as text control messages (so they're
+never mistaken for a response)::
+
+    s <name> <seq> <dropped> <data>
+
+where ``data`` is the batch of packed records (base64 encoded with the json
+codec), and ``dropped`` is the number of records the pyboard has discarded
+because its buffer was full.
+
+Records may also be returned in bulk by an instruction (eg: the firmware's
+``capture_read``), as a block; see :meth:`unpack_block`.
+
+**Backpressure**
+
+The pyboard only sends a batch while it has credit; the number of batches
+the host is ready to receive. Credit is granted as batches are read, so a
+slow reader makes the pyboard buffer, then drop records; it never
+overwhelms the host (or the serial link).
+"""
+import re
+import queue
+import base64
+import struct
+import asyncio
+
+from .codec import decode_bytes
+
+# Logging
+import logging
+log = logging.getLogger(__name__)
+
+
+DEFAULT_WINDOW = 16  # batches in flight (pyboard's initial credit)
+
+# numpy dtype of each struct format character (standard sizes)
+DTYPE_MAP = {
+    'b': 'i1', 'B': 'u1', '?': 'b1',
+    'h': 'i2', 'H': 'u2', 'e': 'f2',
+    'i': 'i4', 'I': 'u4', 'l': 'i4', 'L': 'u4', 'f': 'f4',
+    'q': 'i8', 'Q': 'u8', 'd': 'f8',
+}
+
+
+def parse_batch(line, codec_name):
+    """
+    Parse a stream batch control message.
+
+    :param line: received message (starting with ``b's '``)
+    :type line: :class:`bytes`
+    :param codec_name: codec it was received with
+    :type codec_name: :class:`str`
+    :return: ``(<name>, <seq>, <dropped>, <data>)``
+    :rtype: :class:`tuple`
+    """
+    (_, name, seq, dropped, data) = line.split(b' ', 4)
+    if codec_name == 'json':
+        data = base64.b64decode(data)
+    return (name.decode(), int(seq), int(dropped), data)
+
+
+def _unpack_records(data, fmt):
+    # list of records; tuples (or values, if records have a single field)
+    records = struct.iter_unpack(fmt, data)
+    if len(struct.unpack(fmt, bytes(struct.calcsize(fmt)))) == 1:
+        return [record[0] for record in records]
+    return list(records)
+
+
+def _host_fmt(fmt):
+    # Record format, with the pyboard's byte order & sizes
+    return fmt if fmt[:1] in '<>!=' else ('<' + fmt.lstrip('@'))
+
+
+def unpack_block(block, array=False):
+    """
+    Unpack a block of records returned by an instruction::
+
+        >>> block = pyboard.capture_read('sw')()
+        >>> unpack_block(block)
+        [(20512346, 0), (20637101, 1)]
+
+    :param block: ``{'fmt': <record format>, 'data': <packed records>, ...}``
+                  (``data`` may be base64 encoded)
+    :type block: :class:`dict`
+    :param array: if ``True``, a numpy array is returned (requires
+                  ``numpy``)
+    :type array: :class:`bool`
+    :return: records; :class:`tuple` (or values, if records have a single
+             field)
+    :rtype: :class:`list`, or :class:`numpy.ndarray`
+    """
+    fmt = _host_fmt(block['fmt'])
+    data = decode_bytes(block['data'])
+    if array:
+        import numpy  # optional dependency
+        return numpy.frombuffer(data, dtype=numpy.dtype(_struct_to_dtype(fmt)))
+    return _unpack_records(data, fmt)
+
+
+class Stream(object):
+    """
+    Host's end of a stream sent by the pyboard.
+
+    Created by :meth:`PyBoard.stream() <upytester.PyBoard.stream>`.
+
+    Iterating yields each record, as a :class:`tuple` of values (or a single
+    value, if records have one field)::
+
+        >>> with pyboard.stream('ramp') as ramp:
+        ...     for value in ramp:
+        ...         if value > 10:
+        ...             break
+
+    :param pyboard: pyboard sending stream
+    :type pyboard: :class:`PyBoard <upytester.PyBoard>`
+    :param name: stream's name
+    :type name: :class:`str`
+    :param window: maximum number of batches received, but not yet read
+    :type window: :class:`int`
+    :param timeout: default time to wait for each batch (unit: sec)
+    :type timeout: :class:`float`
+    """
+
+    def __init__(self, pyboard, name, window=DEFAULT_WINDOW, timeout=None):
+        self.pyboard = pyboard
+        self.name = name
+        self.window = max(int(window), 1)
+        self.timeout = pyboard.RESPONSE_TIMEOUT if timeout is None else timeout
+
+        self.fmt = None  # record format (given by the pyboard)
+        self._queue = queue.Queue()
+        self._unacknowledged = 0  # batches read since credit was last granted
+        self._pending = b''  # records read, but not returned by read_array()
+        self.is_open = False
+
+        # Statistics
+        self.batches = 0  # batches received
+        self.received = 0  # bytes received
+        self.dropped = 0  # records dropped by the pyboard (buffer was full)
+        self.missing = 0  # batches not received (sequence gaps)
+        self._next_seq = 0
+
+    # ----- Open / Close
+    def open(self):
+        """Start the pyboard sending the stream."""
+        if self.is_open:
+            return
+        self.pyboard._streams[self.name] = self
+        try:
+            info = self.pyboard.stream_start(self.name, credit=self.window)(timeout=self.pyboard.RESPONSE_TIMEOUT)  # noqa: E501
+        except Exception:
+            self.pyboard._streams.pop(self.name, None)
+            raise
+        self.fmt = info['fmt']
+        self.is_open = True
+
+    def close(self):
+        """Stop the pyboard sending the stream."""
+        if not self.is_open:
+            return
+        self.is_open = False
+        try:
+            self.pyboard.stream_stop(self.name)
+        finally:
+            self.pyboard._streams.pop(self.name, None)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # ----- Receive (called by the pyboard's receiver thread)
+    def _put(self, seq, dropped, data):
+        if seq != self._next_seq:
+            self.missing += max(seq - self._next_seq, 0)
+        self._next_seq = seq + 1
+        self.dropped = dropped
+        self.batches += 1
+        self.received += len(data)
+        self._queue.put_nowait(data)
+
+    # ----- Read
+    @property
+    def host_fmt(self):
+        """Record format, with the pyboard's byte order & sizes."""
+        return _host_fmt(self.fmt)
+
+    @property
+    def record_size(self):
+        return struct.calcsize(self.host_fmt)
+
+    def read(self, timeout=None):
+        """
+        Read the next batch of packed records.
+
+        :param timeout: maximum time to wait (unit: sec) (default:
+                        :attr:`timeout`)
+        :type timeout: :class:`float`
+        :return: packed records, or ``None`` if ``timeout`` was reached
+        :rtype: :class:`bytes`
+        """
+        try:
+            data = self._queue.get(timeout=self.timeout if timeout is None else timeout)
+        except queue.Empty:
+            return None
+
+        credit = self._credit_due()
+        if credit:
+            self.pyboard.stream_credit(self.name, credit)
+        return data
+
+    def _credit_due(self):
+        # Count a batch read; credit is granted in groups (to keep requests
+        # to a minimum), return the credit to grant now (if any)
+        self._unacknowledged += 1
+        if self.is_open and (self._unacknowledged >= max(self.window // 2, 1)):
+            (credit, self._unacknowledged) = (self._unacknowledged, 0)
+            return credit
+        return 0
+
+    def records(self, timeout=None):
+        """
+        Iterate through records, until a batch isn't received within
+        ``timeout``.
+
+        :return: generator of :class:`tuple` (or values, if records have a
+                 single field)
+        """
+        while True:
+            data = self.read(timeout=timeout)
+            if data is None:
+                return
+            yield from self._unpack(data)
+
+    def _unpack(self, data):
+        fmt = self.host_fmt
+        single = (len(struct.unpack(fmt, bytes(self.record_size))) == 1)
+        for record in struct.iter_unpack(fmt, data):
+            yield record[0] if single else record
+
+    def __iter__(self):
+        return self.records()
+
+    def read_array(self, count, timeout=None):
+        """
+        Read a number of records into a numpy array (requires ``numpy``).
+
+        :param count: number of records
+        :type count: :class:`int`
+        :param timeout: maximum time to wait for each batch (unit: sec)
+        :type timeout: :class:`float`
+        :return: records, with a dtype of the stream's format (fewer than
+                 ``count`` if a batch wasn't received within ``timeout``)
+        :rtype: :class:`numpy.ndarray`
+        """
+        dtype = self._dtype()
+        size = count * dtype.itemsize
+        chunks = [self._pending]
+        received = len(self._pending)
+        while received < size:
+            data = self.read(timeout=timeout)
+            if data is None:
+                break
+            chunks.append(data)
+            received += len(data)
+        return self._array(chunks, size, dtype)
+
+    def _dtype(self):
+        import numpy  # optional dependency
+        return numpy.dtype(_struct_to_dtype(self.host_fmt))
+
+    def _array(self, chunks, size, dtype):
+        # Array of (up to) size bytes of records read; the rest are kept
+        import numpy  # optional dependency
+        data = b''.join(chunks)
+        size = min(size, len(data) - (len(data) % dtype.itemsize))
+        self._pending = data[size:]
+        return numpy.frombuffer(data[:size], dtype=dtype)
+
+    def __repr__(self):
+        return "<{cls}: {name!r} on {pyboard!r}>".format(
+            cls=type(self).__name__,
+            name=self.name,
+            pyboard=self.pyboard,
+        )
+
+
+class AsyncStream(Stream):
+    """
+    Host's end of a stream sent by the pyboard, read from an :mod:`asyncio`
+    event loop.
+
+    Created by :meth:`AsyncPyBoard.stream()
+    <upytester.AsyncPyBoard.stream>`; used just like a :class:`Stream`,
+    but opening, closing, and reading must be awaited::
+
+        >>> async with pyboard.stream('ramp') as ramp:
+        ...     async for value in ramp:
+        ...         if value > 10:
+        ...             break
+
+    Parameters are the same as :class:`Stream`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(AsyncStream, self).__init__(*args, **kwargs)
+        self._queue = asyncio.Queue()
+
+    # ----- Open / Close
+    async def open(self):
+        """Start the pyboard sending the stream."""
+        if self.is_open:
+            return
+        self.pyboard._streams[self.name] = self
+        try:
+            receive = await self.pyboard.stream_start(self.name, credit=self.window)
+            info = await receive()
+        except Exception:
+            self.pyboard._streams.pop(self.name, None)
+            raise
+        self.fmt = info['fmt']
+        self.is_open = True
+
+    async def close(self):
+        """Stop the pyboard sending the stream."""
+        if not self.is_open:
+            return
+        self.is_open = False
+        try:
+            await self.pyboard.stream_stop(self.name)
+        finally:
+            self.pyboard._streams.pop(self.name, None)
+
+    def __enter__(self):
+        raise TypeError("use 'async with' for {}".format(type(self).__name__))
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    # ----- Read
+    async def read(self, timeout=None):
+        """
+        Read the next batch of packed records (see :meth:`Stream.read`).
+        """
+        try:
+            data = await asyncio.wait_for(
+                self._queue.get(), self.timeout if timeout is None else timeout,
+            )
+        except asyncio.TimeoutError:
+            return None
+
+        credit = self._credit_due()
+        if credit:
+            await self.pyboard.stream_credit(self.name, credit)
+        return data
+
+    async def records(self, timeout=None):
+        """
+        Asynchronous generator of records, until a batch isn't received
+        within ``timeout`` (see :meth:`Stream.records`).
+        """
+        while True:
+            data = await self.read(timeout=timeout)
+            if data is None:
+                return
+            for record in self._unpack(data):
+                yield record
+
+    def __iter__(self):
+        raise TypeError("use 'async for' for {}".format(type(self).__name__))
+
+    def __aiter__(self):
+        return self.records()
+
+    async def read_array(self, count, timeout=None):
+        """
+        Read a number of records into a numpy array (see
+        :meth:`Stream.read_array`).
+        """
+        dtype = self._dtype()
+        size = count * dtype.itemsize
+        chunks = [self._pending]
+        received = len(self._pending)
+        while received < size:
+            data = await self.read(timeout=timeout)
+            if data is None:
+                break
+            chunks.append(data)
+            received += len(data)
+        return self._array(chunks, size, dtype)
+
+
+def _struct_to_dtype(fmt):
+    # numpy dtype equivalent of a (standard size) struct format
+    order = '>' if fmt[:1] in '>!' else '<'
+    codes = []
+    for (count, code) in re.findall(r'(\d*)([a-zA-Z?])', fmt):
+        if code == 'x':
+            raise ValueError("padding is not supported: {!r}".format(fmt))
+        elif code == 's':  # a single field of bytes
+            codes.append('S{}'.format(count or 1))
+        else:
+            codes += [DTYPE_MAP[code]] * int(count or 1)
+    if len(codes) == 1:
+        return order + codes[0]
+    return [('f{}'.format(i), order + code) for (i, code) in enumerate(codes)]
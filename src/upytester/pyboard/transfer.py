@@ -0,0 +1,227 @@
+"""
+Synchronise files to a pyboard over its serial port.
+
+Unlike syncing to a mounted drive (see :meth:`PyBoard.sync_to_sd
+<upytester.PyBoard.sync_to_sd>`), no mass-storage device, or desktop
+services are needed, so it works on headless hosts::
+
+    >>> pyboard.sync_to_sd('content/sd', serial=True)
+
+The pyboard hashes its files (the ``file_index`` instruction), and only
+changed files are sent; in chunks, pipelined so the host needn't wait for
+each to be acknowledged. Each file is verified against its hash before it
+replaces the original.
+
+Requires the ``upytester`` firmware to be running on the pyboard.
+"""
+import os
+import base64
+import posixpath
+
+from .utils.manifest import MANIFEST_FILENAME, hash_file, is_excluded, walk_files
+
+# Logging
+import logging
+log = logging.getLogger(__name__)
+
+
+# Largest chunk of a file sent per request; requests must fit in the
+# pyboard's receive buffer (2kB), json requests are base64 encoded.
+CHUNK_SIZE = {
+    'json': 1024,
+    'bin': 1536,
+}
+
+PIPELINE_DEPTH = 8  # chunks in flight (if the pyboard isn't already pipelined)
+
+# Time for the pyboard to hash every file in the destination (unit: sec)
+INDEX_TIMEOUT = 60
+
+# Marker files (one must exist on the device, unless forced)
+MARKER_FILES = {
+    '/sd': '.pyboard-sd',
+    '/flash': '.pyboard-flash',
+}
+
+
+def _index_local(source, exclude):
+    # Equivalent of the pyboard's file_index instruction
+    index = {}
+    for path in walk_files(source, exclude):
+        filename = os.path.join(source, *path.split('/'))
+        index[path] = [os.path.getsize(filename), hash_file(filename)]
+    return index
+
+
+def _chunks(filename, size):
+    # Yield (offset, data) for each chunk of a file (at least one)
+    with open(filename, 'rb') as fh:
+        offset = 0
+        while True:
+            data = fh.read(size)
+            yield (offset, data)
+            offset += len(data)
+            if len(data) < size:
+                break
+
+
+def _path_chunks(paths, size):
+    # Split paths into lists of (at most) size bytes of path names
+    chunk = []
+    length = 0
+    for path in paths:
+        path_length = len(path.encode()) + 3  # quoted, with a separator
+        if chunk and (length + path_length > size):
+            yield chunk
+            chunk = []
+            length = 0
+        chunk.append(path)
+        length += path_length
+    if chunk:
+        yield chunk
+
+
+def sync_tree_serial(pyboard, source, root='/sd', subdir='.', force=False, dryrun=False, quiet=False, exclude=(), output=print):  # noqa: E501
+    """
+    Synchronise a folder to a pyboard's filesystem, over its serial port.
+
+    Like ``rsync --delete``, the destination folder is made to mirror the
+    source folder; excluded files are neither copied, nor deleted.
+
+    :param pyboard: open pyboard (running ``upytester`` firmware)
+    :type pyboard: :class:`PyBoard <upytester.PyBoard>`
+    :param source: source folder
+    :type source: :class:`str`
+    :param root: pyboard's filesystem (``'/sd'`` or ``'/flash'``)
+    :type root: :class:`str`
+    :param subdir: destination folder (relative to ``root``)
+    :type subdir: :class:`str`
+    :param force: If `True`, assertion of the pre-existence of placeholder
+                  files will be ignored.
+    :type force: :class:`bool`
+    :param dryrun: if set, changes are listed, but not made
+    :type dryrun: :class:`bool`
+    :param quiet: If `True`, nothing is output
+    :type quiet: :class:`bool`
+    :param exclude: patterns to exclude (see
+                    :meth:`is_excluded <upytester.pyboard.utils.manifest.is_excluded>`)
+    :type exclude: :class:`list` of :class:`str`
+    :param output: called with each line of output (unless ``quiet``)
+    :type output: callable
+    :return: ``(<paths copied>, <paths deleted>)`` (relative to ``subdir``)
+    :rtype: :class:`tuple`
+    """
+    if not os.path.isdir(source):
+        raise ValueError(
+            "given source '{}' does not exist (or is not a folder)".format(source)
+        )
+    if quiet:
+        output = lambda line: None  # noqa: E731
+    exclude = list(exclude) + [MANIFEST_FILENAME, MANIFEST_FILENAME + '.tmp']
+
+    root = root.rstrip('/')
+    dest = posixpath.normpath(posixpath.join(root, subdir))
+    assert dest.startswith(root), "destination is outside {!r}".format(root)
+
+    # Requests are pipelined; so the pyboard's index of its files (which
+    # may take some time) isn't bound by the pyboard's RESPONSE_TIMEOUT
+    pipeline = pyboard.pipeline
+    pyboard.pipeline = pipeline or PIPELINE_DEPTH
+    try:
+        # Check for marker file
+        marker = MARKER_FILES.get(root)
+        if marker and (not force):
+            if pyboard.file_size(posixpath.join(root, marker))(timeout=pyboard.RESPONSE_TIMEOUT) is None:  # noqa: E501
+                raise ValueError(
+                    (
+                        "{root!r} does not contain {marker} file, are you sure you "
+                        "want to overwrite everything on that drive? manually create "
+                        "a file with this name if you wish to continue."
+                    ).format(root=root, marker=marker)
+                )
+
+        output("Synchronising files (serial):")
+        output("    - source: {!r}".format(os.path.abspath(source)))
+        output("    - dest:   {!r}".format(dest))
+
+        # Compare
+        local = _index_local(source, exclude)
+        device = {
+            path: entry
+            for (path, entry) in pyboard.file_index(dest)(timeout=INDEX_TIMEOUT).items()
+            if not is_excluded(path, exclude)
+        }
+        to_copy = sorted(p for (p, entry) in local.items() if device.get(p) != entry)
+        to_delete = sorted(set(device) - set(local))
+
+        if dryrun or not (to_copy or to_delete):
+            for path in to_copy:
+                output(path)
+            for path in to_delete:
+                output("deleting {}".format(path))
+            return (to_copy, to_delete)
+
+        # Transfer
+        binary = (pyboard.codec == 'bin')
+        chunk_size = CHUNK_SIZE[pyboard.codec]
+
+        # Manifest of files copied from a mounted drive (see
+        # utils.manifest) is no longer valid
+        pyboard.file_remove([posixpath.join(root, MANIFEST_FILENAME)])
+
+        # Delete
+        for path in to_delete:
+            output("deleting {}".format(path))
+        targets = [posixpath.join(dest, p) for p in to_delete]
+        for paths in _path_chunks(targets, chunk_size):
+            pyboard.file_remove(paths, root=dest)
+
+        # Copy
+        for path in to_copy:
+            output(path)
+            filename = os.path.join(source, *path.split('/'))
+            target = posixpath.join(dest, path)
+            for (offset, data) in _chunks(filename, chunk_size):
+                if not binary:
+                    data = base64.b64encode(data).decode()
+                pyboard.file_write(target, data, offset)
+            pyboard.file_commit(target, local[path][1])
+
+        pyboard.wait()  # raises first failure (if any)
+    finally:
+        pyboard.pipeline = pipeline
+
+    return (to_copy, to_delete)
+
+    # Transfer
+    binary = (pyboard.codec == 'bin')
+    chunk_size = CHUNK_SIZE[pyboard.codec]
+    pipeline = pyboard.pipeline
+    pyboard.pipeline = pipeline or PIPELINE_DEPTH
+    try:
+        # Manifest of files copied from a mounted drive (see
+        # utils.manifest) is no longer valid
+        pyboard.file_remove([posixpath.join(root, MANIFEST_FILENAME)])
+
+        # Delete
+        for path in to_delete:
+            output("deleting {}".format(path))
+        if to_delete:
+            pyboard.file_remove([posixpath.join(dest, p) for p in to_delete], root=dest)
+
+        # Copy
+        for path in to_copy:
+            output(path)
+            filename = os.path.join(source, *path.split('/'))
+            target = posixpath.join(dest, path)
+            for (offset, data) in _chunks(filename, chunk_size):
+                if not binary:
+                    data = base64.b64encode(data).decode()
+                pyboard.file_write(target, data, offset)
+            pyboard.file_commit(target, local[path][1])
+
+        pyboard.wait()  # raises first failure (if any)
+    finally:
+        pyboard.pipeline = pipeline
+
+    return (to_copy, to_delete)
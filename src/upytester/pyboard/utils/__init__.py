@@ -1,6 +1,8 @@
 __all__ = [
     'connected_serial_numbers',
     'find_portinfo',
+    'invalidate_cache',
+    'get_watcher',
 
     # Storage Functions : SD card
     'find_mountpoint_sd',
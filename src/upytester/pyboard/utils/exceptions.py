@@ -3,3 +3,6 @@ class PyBoardNotFoundError(Exception):
 
 class DeviceFileNotFoundError(Exception):
     """Raised if the device-file associated with a pyboard could not be found"""
+
+class MpyCrossError(Exception):
+    """Raised if mpy-cross is not installed, or fails to compile a file"""
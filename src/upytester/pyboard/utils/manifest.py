@@ -0,0 +1,271 @@
+"""
+Incremental file synchronisation, using a manifest kept on the device.
+
+The manifest records the hash & size of every file deployed to the device,
+so the host can work out what's changed without reading files back off the
+device (which is slow for a pyboard's USB mass-storage).
+"""
+import os
+import json
+import shutil
+import hashlib
+from fnmatch import fnmatch
+
+# Logging
+import logging
+log = logging.getLogger(__name__)
+
+
+MANIFEST_FILENAME = '.upytester-manifest.json'
+MANIFEST_VERSION = 1
+
+HASH_BLOCK_SIZE = 0x10000
+
+
+# ========================== Host Files ==========================
+def hash_file(filename):
+    """
+    Hash of a file's content.
+
+    :param filename: file to hash
+    :type filename: :class:`str`
+    :return: sha256 hex digest
+    :rtype: :class:`str`
+    """
+    h = hashlib.sha256()
+    with open(filename, 'rb') as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def is_excluded(path, exclude):
+    """
+    Test if a relative path matches any exclusion patterns.
+
+    As with rsync, a pattern without a ``/`` is matched against each part
+    of the path, otherwise it's matched against the path (and its trailing
+    parts)::
+
+        >>> is_excluded('lib/upyt/__pycache__', ['*/__pycache__'])
+        True
+        >>> is_excluded('.git/config', ['.git*'])
+        True
+
+    :param path: ``/`` separated path
+    :type path: :class:`str`
+    :param exclude: patterns
+    :type exclude: :class:`list` of :class:`str`
+    :rtype: :class:`bool`
+    """
+    parts = path.split('/')
+    for pattern in exclude:
+        pattern = pattern.replace(os.sep, '/').rstrip('/')
+        if '/' not in pattern:
+            if any(fnmatch(part, pattern) for part in parts):
+                return True
+        else:
+            pattern = pattern.lstrip('/')
+            if any(fnmatch('/'.join(parts[i:]), pattern) for i in range(len(parts))):
+                return True
+    return False
+
+
+def walk_files(root, exclude=()):
+    """
+    Relative paths of each file in a tree (symlinks are followed).
+
+    :param root: top of tree
+    :type root: :class:`str`
+    :param exclude: patterns to exclude (see :meth:`is_excluded`)
+    :type exclude: :class:`list` of :class:`str`
+    :return: generator of ``/`` separated relative paths
+    """
+    for (dirpath, dirnames, filenames) in os.walk(root, followlinks=True):
+        reldir = os.path.relpath(dirpath, root).replace(os.sep, '/')
+        prefix = '' if reldir == '.' else (reldir + '/')
+        dirnames[:] = sorted(d for d in dirnames if not is_excluded(prefix + d, exclude))
+        for filename in sorted(filenames):
+            path = prefix + filename
+            if not is_excluded(path, exclude):
+                yield path
+
+
+def index_tree(root, exclude=()):
+    """
+    Hash & size of each file in a tree.
+
+    :param root: top of tree
+    :type root: :class:`str`
+    :param exclude: patterns to exclude (see :meth:`is_excluded`)
+    :type exclude: :class:`list` of :class:`str`
+    :return: ``{<relative path>: {'sha256': <hex str>, 'size': <int>}, ...}``
+    :rtype: :class:`dict`
+    """
+    index = {}
+    for path in walk_files(root, exclude):
+        filename = os.path.join(root, *path.split('/'))
+        index[path] = {
+            'sha256': hash_file(filename),
+            'size': os.path.getsize(filename),
+        }
+    return index
+
+
+# ========================== Manifest ==========================
+class Manifest(object):
+    """
+    Files deployed to a device, as recorded in the manifest file at the
+    root of the device's storage.
+
+    Entries are indexed by their ``/`` separated path, relative to the
+    mountpoint.
+    """
+
+    def __init__(self, mountpoint, files=None):
+        self.mountpoint = mountpoint
+        self.files = files or {}  # format: {<path>: {'sha256': ..., 'size': ...}, ...}
+
+    @property
+    def filename(self):
+        return os.path.join(self.mountpoint, MANIFEST_FILENAME)
+
+    @classmethod
+    def load(cls, mountpoint):
+        """
+        Read device's manifest.
+
+        :return: manifest (empty if there's no valid manifest on the device)
+        :rtype: :class:`Manifest`
+        """
+        manifest = cls(mountpoint)
+        try:
+            with open(manifest.filename, 'r') as fh:
+                data = json.load(fh)
+            if data.get('version') == MANIFEST_VERSION:
+                manifest.files = data['files']
+        except (OSError, ValueError, KeyError, AttributeError):
+            log.debug("no valid manifest at %r", manifest.filename)
+        return manifest
+
+    def save(self):
+        """Write manifest to the device (replaces existing manifest)."""
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'w') as fh:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.files}, fh, sort_keys=True)
+        os.replace(temp_filename, self.filename)
+
+    def is_current(self, path, entry):
+        """
+        ``True`` if the file at ``path`` is recorded with the given hash &
+        size, and it's still there (only its size is read from the device).
+        """
+        if self.files.get(path) != entry:
+            return False
+        try:
+            return os.path.getsize(os.path.join(self.mountpoint, *path.split('/'))) == entry['size']  # noqa: E501
+        except OSError:
+            return False
+
+
+# ========================== Synchronise ==========================
+def sync_tree(source, mountpoint, subdir='.', exclude=(), dryrun=False, output=None):
+    """
+    Synchronise a folder to a device's storage, using its manifest.
+
+    Like ``rsync --delete``, the destination folder is made to mirror the
+    source folder; excluded files are neither copied, nor deleted.
+
+    Only files that have changed since the manifest was last written are
+    copied. Unchanged files are not read from the device; the device's
+    folders are listed to find files to delete.
+
+    :param source: source folder
+    :type source: :class:`str`
+    :param mountpoint: device's mountpoint
+    :type mountpoint: :class:`str`
+    :param subdir: destination folder (relative to ``mountpoint``)
+    :type subdir: :class:`str`
+    :param exclude: patterns to exclude (see :meth:`is_excluded`)
+    :type exclude: :class:`list` of :class:`str`
+    :param dryrun: if set, changes are listed, but not made
+    :type dryrun: :class:`bool`
+    :param output: called with a line for each file copied or deleted
+    :type output: callable
+    :return: ``(<paths copied>, <paths deleted>)`` (relative to ``subdir``)
+    :rtype: :class:`tuple`
+    """
+    output = output or (lambda line: None)
+    exclude = list(exclude) + [MANIFEST_FILENAME, MANIFEST_FILENAME + '.tmp']
+
+    dest = os.path.join(mountpoint, subdir)
+    prefix = os.path.relpath(dest, mountpoint).replace(os.sep, '/')
+    prefix = '' if prefix == '.' else (prefix + '/')
+
+    # Compare
+    local = index_tree(source, exclude)
+    manifest = Manifest.load(mountpoint)
+    to_copy = [
+        path for (path, entry) in sorted(local.items())
+        if not manifest.is_current(prefix + path, entry)
+    ]
+    on_device = set(walk_files(dest, exclude)) if os.path.isdir(dest) else set()
+    to_delete = sorted(on_device - set(local))
+
+    if dryrun:
+        for path in to_copy:
+            output(path)
+        for path in to_delete:
+            output("deleting {}".format(path))
+        return (to_copy, to_delete)
+
+    # Invalidate entries about to change
+    #   if interrupted, they're copied again next time
+    if to_copy or to_delete:
+        for path in to_copy + to_delete:
+            manifest.files.pop(prefix + path, None)
+        manifest.save()
+
+    # Delete
+    for path in to_delete:
+        output("deleting {}".format(path))
+        os.remove(os.path.join(dest, *path.split('/')))
+    if to_delete:
+        _remove_empty_dirs(source, dest, exclude)
+
+    # Copy
+    for path in to_copy:
+        output(path)
+        (source_file, target) = (os.path.join(root, *path.split('/')) for root in (source, dest))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(source_file, target)
+        try:
+            stat = os.stat(source_file)
+            os.utime(target, (stat.st_atime, stat.st_mtime))
+        except OSError:
+            pass  # not critical (permissions are not supported by all filesystems)
+        manifest.files[prefix + path] = local[path]
+
+    # Forget entries that are no longer in the source
+    for path in list(manifest.files):
+        if path.startswith(prefix) and (path[len(prefix):] not in local):
+            if not is_excluded(path[len(prefix):], exclude):
+                del manifest.files[path]
+
+    manifest.save()
+    return (to_copy, to_delete)
+
+
+def _remove_empty_dirs(source, dest, exclude=()):
+    # Remove folders left empty by deleted files (deepest first), unless
+    # they're also in the source
+    for (dirpath, dirnames, filenames) in os.walk(dest, topdown=False):
+        relpath = os.path.relpath(dirpath, dest).replace(os.sep, '/')
+        if (relpath == '.') or is_excluded(relpath, exclude):
+            continue
+        if os.path.isdir(os.path.join(source, *relpath.split('/'))):
+            continue
+        try:
+            os.rmdir(dirpath)  # fails if not empty
+        except OSError:
+            pass
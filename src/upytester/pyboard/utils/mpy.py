@@ -0,0 +1,165 @@
+"""
+Cross-compile MicroPython source to bytecode (``.mpy`` files) for deployment.
+
+A pyboard compiles each ``.py`` module as it's imported, at every boot;
+deploying bytecode instead saves that time, and the heap used to do it.
+
+Compiled files are cached on the host by the hash of their source (and
+the compiler's version & options), so only changed modules are compiled.
+
+Requires ``mpy-cross`` to be installed (eg: ``pip install mpy-cross``);
+its version must produce bytecode compatible with the pyboard's firmware.
+"""
+import os
+import shutil
+import hashlib
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+from .exceptions import MpyCrossError
+from .manifest import walk_files
+from ..catalog import default_cache_dir
+
+# Logging
+import logging
+log = logging.getLogger(__name__)
+
+
+DEFAULT_MPY_CROSS = 'mpy-cross'
+DEFAULT_ARGS = ('-march=armv7emsp',)  # pyboard's STM32F4 (for @micropython.native)
+
+# Files run as source by the firmware (relative to the root of the tree)
+SOURCE_ONLY = ('boot.py', 'main.py')
+
+
+class MpyCompiler(object):
+    """
+    Compile ``.py`` files with ``mpy-cross``, caching the results.
+
+    :param mpy_cross: ``mpy-cross`` executable (default: ``$MPY_CROSS``, or
+                      ``mpy-cross`` on the ``PATH``)
+    :type mpy_cross: :class:`str`
+    :param args: additional ``mpy-cross`` arguments
+    :type args: :class:`list`
+    :param cache_dir: where compiled files are cached (default:
+                      ``$XDG_CACHE_HOME/upytester/mpy``)
+    :type cache_dir: :class:`str`
+    """
+
+    def __init__(self, mpy_cross=None, args=DEFAULT_ARGS, cache_dir=None):
+        self.mpy_cross = mpy_cross or os.environ.get('MPY_CROSS') or DEFAULT_MPY_CROSS
+        self.args = list(args)
+        self.cache_dir = cache_dir or default_cache_dir('mpy')
+        self._version = None
+
+        # Statistics (since created)
+        self.compiled_count = 0
+        self.cached_count = 0
+
+    @property
+    def version(self):
+        """``mpy-cross --version`` output (part of each cache key)."""
+        if self._version is None:
+            if shutil.which(self.mpy_cross) is None:
+                raise MpyCrossError("{!r} not found; install it with 'pip install mpy-cross', or set $MPY_CROSS".format(self.mpy_cross))  # noqa: E501
+            self._version = self._run('--version').strip()
+        return self._version
+
+    def _run(self, *args):
+        process = subprocess.run(
+            [self.mpy_cross] + list(args),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        if process.returncode != 0:
+            raise MpyCrossError("{} failed:\n{}".format(
+                ' '.join([self.mpy_cross] + list(args)),
+                (process.stderr or process.stdout).decode(errors='replace'),
+            ))
+        return process.stdout.decode()
+
+    def compile(self, source_file, name):
+        """
+        Compile a ``.py`` file (or get it from the cache).
+
+        :param source_file: file to compile
+        :type source_file: :class:`str`
+        :param name: source filename embedded in the bytecode (for
+                     tracebacks), typically its path on the pyboard
+        :type name: :class:`str`
+        :return: filename of compiled (cached) ``.mpy`` file
+        :rtype: :class:`str`
+        """
+        h = hashlib.sha256()
+        for item in [self.version, name] + self.args:
+            h.update(item.encode())
+            h.update(b'\x00')
+        with open(source_file, 'rb') as fh:
+            h.update(fh.read())
+        cached_file = os.path.join(self.cache_dir, h.hexdigest() + '.mpy')
+
+        if os.path.exists(cached_file):
+            self.cached_count += 1
+            return cached_file
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        (fd, temp_file) = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+        os.close(fd)
+        try:
+            self._run('-o', temp_file, '-s', name, *(self.args + [source_file]))
+            os.replace(temp_file, cached_file)  # atomic
+        except Exception:
+            os.remove(temp_file)
+            raise
+        self.compiled_count += 1
+        log.debug("compiled %r", name)
+        return cached_file
+
+    def stage(self, source, staging, exclude=(), prefix=''):
+        """
+        Populate a folder with a compiled copy of a tree.
+
+        ``.py`` files are replaced with ``.mpy`` files, except for those in
+        :data:`SOURCE_ONLY`; everything else is copied.
+
+        :param source: tree to compile
+        :type source: :class:`str`
+        :param staging: (empty) folder to populate
+        :type staging: :class:`str`
+        :param exclude: patterns to exclude (see
+                        :meth:`is_excluded <upytester.pyboard.utils.manifest.is_excluded>`)
+        :type exclude: :class:`list` of :class:`str`
+        :param prefix: path of tree on the pyboard (embedded in bytecode)
+        :type prefix: :class:`str`
+        """
+        for path in walk_files(source, exclude):
+            source_file = os.path.join(source, *path.split('/'))
+            if path.endswith('.py') and (path not in SOURCE_ONLY):
+                name = path[:-3] + '.mpy'
+                source_file = self.compile(source_file, '/'.join(p for p in (prefix, path) if p))  # noqa: E501
+            else:
+                name = path
+            target = os.path.join(staging, *name.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source_file, target)
+
+    @contextmanager
+    def compiled(self, source, exclude=(), prefix=''):
+        """
+        Context of a compiled copy of a tree (see :meth:`stage`), removed on
+        exit::
+
+            >>> compiler = MpyCompiler()
+            >>> with compiler.compiled('content/sd') as source:
+            ...     pyboard.sync_to_sd(source)
+
+        :return: temporary folder
+        :rtype: :class:`str`
+        """
+        staging = tempfile.mkdtemp(prefix='upytester-mpy-')
+        try:
+            self.stage(source, staging, exclude=exclude, prefix=prefix)
+            yield staging
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
@@ -1,13 +1,17 @@
 import sys
 import os
+import time
+import threading
 import subprocess
-from glob import glob
+from fnmatch import fnmatch
 from serial.tools.list_ports import comports
 import re
 from collections import defaultdict
 
 # Local Modules
 from .exceptions import PyBoardNotFoundError, DeviceFileNotFoundError
+from .manifest import sync_tree
+from .watcher import get_watcher as _get_watcher
 
 
 # rsync line filtering
@@ -15,6 +19,105 @@ DELETE_REGEX = re.compile(r'^deleting ')
 FOLDER_REGEX = re.compile(r'/$')
 
 
+# ========================== Enumeration Cache ==========================
+ENUMERATION_TTL = 5  # maximum age of cached enumerations (unit: seconds)
+
+DISK_BY_ID_DIR = '/dev/disk/by-id'
+MOUNTINFO_FILE = '/proc/self/mountinfo'
+
+
+class EnumerationCache(object):
+    """
+    Result of a device enumeration, re-used until it's stale.
+
+    Enumerating USB devices is slow (it reads sysfs, or lists ``/dev``), and
+    is done many times while operating a pyboard, so the result is cached
+    until:
+
+    * ``ttl`` seconds have passed, or
+    * the modification time of any ``watch`` folder changes; a device node
+      has been added or removed (checked with a single ``stat()`` per
+      folder, so hot-plugged devices are seen immediately)
+
+    :param func: enumeration function (takes no arguments)
+    :type func: callable
+    :param watch: folders to watch
+    :type watch: :class:`list` of :class:`str`
+    :param ttl: maximum age of cached value (unit: seconds)
+    :type ttl: :class:`float`
+    """
+
+    def __init__(self, func, watch=(), ttl=ENUMERATION_TTL):
+        self.func = func
+        self.watch = watch
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value = None
+        self._signature = None
+        self._expiry = 0
+
+    def _get_signature(self):
+        signature = []
+        for path in self.watch:
+            try:
+                signature.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def __call__(self, refresh=False):
+        """
+        Get enumeration.
+
+        :param refresh: if set, cached value is ignored (and replaced)
+        :type refresh: :class:`bool`
+        """
+        with self._lock:
+            signature = self._get_signature()
+            now = time.monotonic()
+            if refresh or (now >= self._expiry) or (signature != self._signature):
+                self._value = self.func()
+                self._signature = signature
+                self._expiry = now + self.ttl
+            return self._value
+
+    def invalidate(self):
+        """Discard cached value (the next call enumerates)."""
+        with self._lock:
+            self._expiry = 0
+
+
+def _list_disk_ids():
+    try:
+        return sorted(os.listdir(DISK_BY_ID_DIR))
+    except FileNotFoundError:
+        return []  # no disks at all
+
+
+# serial ports are (re)created in /dev
+_comports = EnumerationCache(lambda: list(comports()), watch=['/dev'])
+_disk_ids = EnumerationCache(_list_disk_ids, watch=[DISK_BY_ID_DIR])
+
+
+def invalidate_cache(*args):
+    """
+    Discard cached port & disk enumerations; the next lookup rescans.
+    """
+    _comports.invalidate()
+    _disk_ids.invalidate()
+
+
+def get_watcher():
+    """
+    Shared device watcher (see :mod:`upytester.pyboard.utils.watcher`);
+    cached enumerations are discarded with each event.
+    """
+    watcher = _get_watcher()
+    if not watcher.is_subscribed(invalidate_cache):
+        watcher.subscribe(invalidate_cache)
+    return watcher
+
+
 # ========================== COM port & Info ==========================
 PORT_INFO_REGEX_MAP = {
     'manufacturer': re.compile(r'micropython', re.IGNORECASE),
@@ -29,7 +132,7 @@ def connected_serial_numbers():
     :rtype: :class:`list` of :class:`str`
     """
     serial_numbers = []
-    for port_info in comports():
+    for port_info in _comports():
         is_pyboard = all(
             (
                 regex.search(getattr(port_info, key))
@@ -52,10 +155,14 @@ def find_portinfo(pyboard):
     :rtype: :class:`serial.tools.list_ports_common.ListPortInfo`
     """
     # --- All serial ports
-    port_info_list = [
-        c for c in comports()
-        if c.serial_number == pyboard.serial_number
-    ]
+    def get_port_info_list(refresh=False):
+        return [
+            c for c in _comports(refresh=refresh)
+            if c.serial_number == pyboard.serial_number
+        ]
+    port_info_list = get_port_info_list()
+    if len(port_info_list) != 1:
+        port_info_list = get_port_info_list(refresh=True)  # not stale?
 
     if not port_info_list:
         raise PyBoardNotFoundError("pyboard not found: '%s'" % pyboard.serial_number)
@@ -73,13 +180,22 @@ class StorageDevice:
 
     @classmethod
     def find_device_file(cls, pyboard, suffix='-part1'):
-        device_list = glob(
-            '/dev/disk/by-id/usb-*_{prefix}_{serial}-*{suffix}'.format(
-                prefix=cls.DEVICE_FILE_PREFIX,
-                serial=pyboard.serial_number,
-                suffix=suffix,
-            )
+        pattern = 'usb-*_{prefix}_{serial}-*{suffix}'.format(
+            prefix=cls.DEVICE_FILE_PREFIX,
+            serial=pyboard.serial_number,
+            suffix=suffix,
         )
+
+        def get_device_list(refresh=False):
+            return [
+                os.path.join(DISK_BY_ID_DIR, name)
+                for name in _disk_ids(refresh=refresh)
+                if fnmatch(name, pattern)
+            ]
+        device_list = get_device_list()
+        if len(device_list) != 1:
+            device_list = get_device_list(refresh=True)  # not stale?
+
         if len(device_list) != 1:
             raise DeviceFileNotFoundError(
                 "could not find {cls_name} device file for {device!r}".format(
@@ -115,8 +231,16 @@ class StorageDevice:
     def find_mountpoint(cls, pyboard):
         """
         Find the mountpoint of the given pyboard
+
+        Mounts are read from ``/proc/self/mountinfo`` (falls back to
+        ``udisksctl info`` if it can't be read).
         """
-        mountpoint = cls.get_udisksctl_info(pyboard)['MountPoints']
+        try:
+            mountpoint = _find_mountpoint_by_device(cls.find_device_file(pyboard))
+        except DeviceFileNotFoundError:
+            return None
+        except OSError:
+            mountpoint = cls.get_udisksctl_info(pyboard)['MountPoints']
         # Return mountpoint if it exists
         if isinstance(mountpoint, str) and os.path.isdir(mountpoint):
             return mountpoint
@@ -152,7 +276,7 @@ class StorageDevice:
             proc.communicate()
 
     @classmethod
-    def sync_files_to_device(cls, source_path, pyboard, subdir='.', force=False, dryrun=False, quiet=False, exclude=[]):
+    def sync_files_to_device(cls, source_path, pyboard, subdir='.', force=False, dryrun=False, quiet=False, exclude=[], output=print, checksum=False):
         """
         Synchronise a filesystem to the pyboard's storage.
         Used to deploy code onto a test bench
@@ -174,6 +298,17 @@ class StorageDevice:
         :type quiet: :class:`bool`
         :param exclude: List of file patterns of files to ignore during sync operation
         :type exclude: :class:`list` of :class:`str`
+        :param output: Called with each line of output (unless `quiet`),
+                       prints to stdout by default
+        :type output: callable
+        :param checksum: If `True`, every file is compared by content (with
+                         `rsync -c`), instead of using the device's manifest
+                         (see :mod:`upytester.pyboard.utils.manifest`)
+        :type checksum: :class:`bool`
+
+        By default, only files that have changed since the last sync are
+        copied; the device's manifest records what's been deployed, so
+        unchanged files needn't be read back from the device.
         """
         # Validate Request
         if not os.path.isdir(source_path):
@@ -217,11 +352,21 @@ class StorageDevice:
         assert os.path.relpath(abs_dest, '/') != '.', "destination is ROOT!!?"
 
         if not quiet:
-            print("Synchronising files:")
-            print("    - source: {!r}".format(abs_source))
-            print("    - dest:   {!r}".format(abs_dest))
+            output("Synchronising files:")
+            output("    - source: {!r}".format(abs_source))
+            output("    - dest:   {!r}".format(abs_dest))
+
+        if not checksum:
+            # Incremental sync (using device's manifest)
+            sync_tree(
+                abs_source, mountpoint,
+                subdir=os.path.relpath(abs_dest, mountpoint),
+                exclude=exclude,
+                dryrun=dryrun,
+                output=None if quiet else output,
+            )
 
-        if not dryrun:
+        elif not dryrun:
             # Create command list
             #   rsync Options
             #       --archive == -rlnnptgoD (but we need -L)
@@ -256,10 +401,35 @@ class StorageDevice:
                     l = line.decode().rstrip('\n')
                     # print all lines that are NOT simply listing "some/folder/"
                     if not(FOLDER_REGEX.search(l) and not DELETE_REGEX.search(l)):
-                        print(l)
+                        output(l)
             process.wait()
 
 
+def _unescape_mountinfo(value):
+    # Spaces (etc) in mountinfo paths are octal escaped (eg: '\\040')
+    return re.sub(r'\\([0-7]{3})', lambda m: chr(int(m.group(1), 8)), value)
+
+
+def _find_mountpoint_by_device(device_file):
+    """
+    Find where a block device is mounted, from ``/proc/self/mountinfo``.
+
+    :param device_file: block device (symlinks are followed)
+    :type device_file: :class:`str`
+    :return: mountpoint, or ``None`` if not mounted
+    :raises OSError: if the device, or mountinfo can't be read
+    """
+    rdev = os.stat(device_file).st_rdev
+    device_id = '{}:{}'.format(os.major(rdev), os.minor(rdev))
+    with open(MOUNTINFO_FILE, 'r') as fh:
+        for line in fh:
+            # format: <id> <parent> <major:minor> <root> <mountpoint> ...
+            fields = line.split()
+            if (len(fields) > 4) and (fields[2] == device_id):
+                return _unescape_mountinfo(fields[4])
+    return None
+
+
 # --- SD Card
 class SDCard(StorageDevice):
     DEVICE_FILE_PREFIX = 'SD_card'
@@ -41,6 +41,14 @@ def _get_override_config():
     return _override_dict
 
 
+def invalidate_cache():
+    pass  # nothing is cached
+
+
+def get_watcher():
+    return None  # not supported; callers fall back to polling
+
+
 def connected_serial_numbers():
     overrides = _get_override_config()
     if overrides:
@@ -105,10 +113,13 @@ def unmount(pyboard):
         raise NotImplementedError("not implemented for win32")  # [issue #2]
 
 
-def sync_files_to(source_path, pyboard, subdir='.', force=False, dryrun=False, quiet=False, exclude=[]):
+def sync_files_to(source_path, pyboard, subdir='.', force=False, dryrun=False, quiet=False, exclude=[], output=print, checksum=False):
     """
     :param source_path: Source folder to sync with SD card
     :type source_path: :class:`str`
+    :param output: Called with each line of output, prints to stdout by default
+    :type output: callable
+    :param checksum: ignored; Robocopy compares files by size & time
     """
     # Validate Request
     if not os.path.isdir(source_path):
@@ -141,9 +152,9 @@ def sync_files_to(source_path, pyboard, subdir='.', force=False, dryrun=False, q
     assert os.path.splitdrive(abs_dest)[0] != 'C:', "destination is C: drive!!?"
 
     if not quiet:
-        print("Synchronising files:")
-        print("    - source: {!r}".format(abs_source))
-        print("    - dest:   {!r}".format(abs_dest))
+        output("Synchronising files:")
+        output("    - source: {!r}".format(abs_source))
+        output("    - dest:   {!r}".format(abs_dest))
 
     # Create & Run process
     if not dryrun:
@@ -160,7 +171,7 @@ def sync_files_to(source_path, pyboard, subdir='.', force=False, dryrun=False, q
         )
         for line in process.stdout:
             process.poll()
-            print(line.decode().rstrip('\n'))
+            output(line.decode().rstrip('\n'))
         process.wait()
 
 
@@ -0,0 +1,324 @@
+"""
+Watch for USB devices (pyboards) being connected & disconnected.
+
+udev creates a symlink for each serial port in ``/dev/serial/by-id``, and
+for each block device in ``/dev/disk/by-id``; each is named with the
+device's serial number::
+
+    /dev/serial/by-id/usb-MicroPython_Pyboard_Virtual_Comm_Port_in_FS_Mode_3976346C3436-if01
+    /dev/disk/by-id/usb-MicroPy_SD_card_3976346C3436-0:0-part1
+
+These folders are watched with inotify (falling back to polling if inotify
+is not available), and a :class:`DeviceEvent` is raised for each symlink
+added or removed::
+
+    >>> watcher = get_watcher()
+    >>> since = watcher.sequence
+    >>> # ... reset pyboard ...
+    >>> watcher.wait_for(lambda e: e.is_added and e.matches('3976346C3436', 'serial'), since=since, timeout=10)
+    <DeviceEvent: added serial 'usb-MicroPython_..._3976346C3436-if01'>
+"""
+import os
+import select
+import threading
+import collections
+import ctypes
+import ctypes.util
+
+# Logging
+import logging
+log = logging.getLogger(__name__)
+
+
+WATCH_DIRS = {
+    'serial': '/dev/serial/by-id',
+    'disk': '/dev/disk/by-id',
+}
+
+POLL_PERIOD = 0.1  # used if inotify isn't available (unit: seconds)
+HISTORY_SIZE = 256  # events retained (for wait_for(since=...))
+
+# inotify (see: man inotify)
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF  # noqa: E501
+
+
+class DeviceEvent(object):
+    """
+    A device's symlink was added to, or removed from a watched folder.
+
+    :param action: ``'added'`` or ``'removed'``
+    :param kind: ``'serial'`` or ``'disk'`` (see :data:`WATCH_DIRS`)
+    :param name: symlink's name
+    :param sequence: event's number (see :attr:`DeviceWatcher.sequence`)
+    """
+
+    def __init__(self, action, kind, name, sequence):
+        self.action = action
+        self.kind = kind
+        self.name = name
+        self.sequence = sequence
+
+    @property
+    def is_added(self):
+        return self.action == 'added'
+
+    @property
+    def path(self):
+        return os.path.join(WATCH_DIRS[self.kind], self.name)
+
+    def matches(self, serial_number, kind=None):
+        """
+        ``True`` if event is for the device with the given serial number
+        (and of the given kind, if set).
+        """
+        if (kind is not None) and (kind != self.kind):
+            return False
+        return '_{}-'.format(serial_number) in self.name
+
+    def __repr__(self):
+        return "<{cls}: {action} {kind} {name!r}>".format(
+            cls=type(self).__name__,
+            action=self.action,
+            kind=self.kind,
+            name=self.name,
+        )
+
+
+class _Inotify(object):
+    # Minimal inotify binding (via libc); used only to wake the watcher,
+    # events are found by comparing folder listings.
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches = {}  # format: {<path>: <watch descriptor>}
+
+    def watch(self, paths):
+        # Watch exactly the given paths
+        for path in set(self._watches) - set(paths):
+            self._libc.inotify_rm_watch(self.fd, self._watches.pop(path))  # may be gone
+        for path in paths:
+            # re-added each time; the watch is lost if the folder was
+            # removed (and re-created), otherwise this does nothing
+            wd = self._libc.inotify_add_watch(self.fd, path.encode(), WATCH_MASK)
+            if wd >= 0:
+                self._watches[path] = wd
+            else:
+                self._watches.pop(path, None)
+
+    def drain(self):
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DeviceWatcher(object):
+    """
+    Raises a :class:`DeviceEvent` when a device is connected or
+    disconnected.
+
+    Events are passed to each subscriber (see :meth:`subscribe`) from the
+    watcher's thread, and may be waited for (see :meth:`wait_for`).
+
+    :param directories: folders to watch, indexed by kind (default:
+                        :data:`WATCH_DIRS`)
+    :type directories: :class:`dict`
+    :param poll_period: time between listings if inotify isn't available
+                        (unit: seconds)
+    :type poll_period: :class:`float`
+    """
+
+    def __init__(self, directories=None, poll_period=POLL_PERIOD):
+        self.directories = dict(directories or WATCH_DIRS)
+        self.poll_period = poll_period
+
+        self._condition = threading.Condition()
+        self._history = collections.deque(maxlen=HISTORY_SIZE)
+        self._sequence = 0
+        self._subscribers = []
+        self._listing = self._list()
+
+        self._thread = None
+        self._stop = threading.Event()
+        (self._wake_r, self._wake_w) = os.pipe()
+
+    # ----- State
+    @property
+    def sequence(self):
+        """Number of events raised so far."""
+        return self._sequence
+
+    def present(self, serial_number, kind=None):
+        """
+        Names of a device's symlinks currently present.
+
+        :rtype: :class:`list` of :class:`str`
+        """
+        return sorted(
+            name for (k, names) in self._list().items() if kind in (None, k)
+            for name in names if '_{}-'.format(serial_number) in name
+        )
+
+    def _list(self):
+        listing = {}
+        for (kind, directory) in self.directories.items():
+            try:
+                listing[kind] = set(os.listdir(directory))
+            except OSError:
+                listing[kind] = set()  # not created (yet)
+        return listing
+
+    # ----- Subscribe
+    def subscribe(self, callback):
+        """
+        Call ``callback(event)`` for each :class:`DeviceEvent` raised (from
+        the watcher's thread).
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def is_subscribed(self, callback):
+        """``True`` if ``callback`` has been subscribed (see :meth:`subscribe`)."""
+        return callback in self._subscribers
+
+    def wait_for(self, predicate=None, since=None, timeout=None):
+        """
+        Wait for an event.
+
+        :param predicate: called with each event, returns ``True`` for the
+                          event being waited for (default: any event)
+        :type predicate: callable
+        :param since: if set, events raised after :attr:`sequence` had this
+                      value are also considered
+        :type since: :class:`int`
+        :param timeout: maximum time to wait (unit: seconds)
+        :type timeout: :class:`float`
+        :return: matching event, or ``None`` if ``timeout`` was reached
+        :rtype: :class:`DeviceEvent`
+        """
+        predicate = predicate or (lambda event: True)
+        state = {'next': self._sequence if since is None else since}
+
+        def find():
+            for event in self._history:
+                if (event.sequence >= state['next']) and predicate(event):
+                    return event
+            state['next'] = self._sequence
+            return None
+
+        self.start()
+        with self._condition:
+            return self._condition.wait_for(find, timeout)
+
+    # ----- Thread
+    def start(self):
+        """Start watching (if not already)."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run,
+                name='{}'.format(type(self).__name__),
+                daemon=True,  # thread dies with main process
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stop watching."""
+        if self._thread is not None:
+            self._stop.set()
+            os.write(self._wake_w, b'x')
+            self._thread.join()
+            self._thread = None
+
+    def _watch_paths(self):
+        # each folder, or its closest ancestor (to see when it's created)
+        paths = set()
+        for directory in self.directories.values():
+            while not os.path.isdir(directory) and (directory != os.path.dirname(directory)):  # noqa: E501
+                directory = os.path.dirname(directory)
+            paths.add(directory)
+        return paths
+
+    def _run(self):
+        try:
+            inotify = _Inotify()
+        except (OSError, AttributeError, TypeError) as e:
+            log.debug("inotify unavailable (%s); polling", e)
+            inotify = None
+
+        try:
+            while not self._stop.is_set():
+                rlist = [self._wake_r]
+                if inotify:
+                    inotify.watch(self._watch_paths())
+                    rlist.append(inotify.fd)
+                (ready, _, _) = select.select(rlist, [], [], None if inotify else self.poll_period)  # noqa: E501
+                if self._wake_r in ready:
+                    os.read(self._wake_r, 64)
+                if inotify and (inotify.fd in ready):
+                    inotify.drain()
+                self._update()
+        finally:
+            if inotify:
+                inotify.close()
+
+    def _update(self):
+        # Compare listings, and raise events for the differences
+        listing = self._list()
+        events = []
+        for (kind, names) in listing.items():
+            previous = self._listing.get(kind, set())
+            for (action, changed) in (('removed', previous - names), ('added', names - previous)):  # noqa: E501
+                for name in sorted(changed):
+                    events.append(DeviceEvent(action, kind, name, self._sequence + len(events)))  # noqa: E501
+        self._listing = listing
+        if not events:
+            return
+
+        with self._condition:
+            self._history.extend(events)
+            self._sequence += len(events)
+            self._condition.notify_all()
+
+        for event in events:
+            log.debug("%r", event)
+            for callback in list(self._subscribers):
+                try:
+                    callback(event)
+                except Exception:
+                    log.exception("device event subscriber raised an exception")
+
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def get_watcher():
+    """
+    Shared :class:`DeviceWatcher` (started on first use).
+
+    :rtype: :class:`DeviceWatcher`
+    """
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = DeviceWatcher()
+            _watcher.start()
+        return _watcher
@@ -0,0 +1,9 @@
+__all__ = [
+    'SimulatedPyBoard',
+    'Firmware',
+    'load_firmware',
+]
+
+from .simulated_pyboard import SimulatedPyBoard
+from .firmware import Firmware
+from .firmware import load_firmware
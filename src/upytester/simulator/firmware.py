@@ -0,0 +1,247 @@
+import asyncio
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+import traceback
+import types
+
+import upytester
+
+# Logging
+import logging
+log = logging.getLogger(__name__)
+
+
+FIRMWARE_LIB = os.path.join(os.path.dirname(upytester.__file__), 'content', 'sd', 'lib')
+SHIM_LIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lib')
+
+# Top level names of modules that belong to a simulated pyboard
+FIRMWARE_MODULES = ('pyb', 'machine', 'micropython', 'uasyncio', 'utime', 'asyn', 'upyt', 'bench')
+
+READABLE_TIMEOUT = 0.1  # maximum time per wait for the serial stream (unit: sec)
+
+_import_lock = threading.Lock()
+
+
+async def _readable(stream):
+    # Simulated upyt.sched.readable(); the firmware's version is a
+    # uasyncio IORead syscall, here the stream is waited on by an executor
+    loop = asyncio.get_running_loop()
+    while not stream.any():
+        await loop.run_in_executor(None, stream.wait, READABLE_TIMEOUT)
+
+
+def _is_firmware_module(name, module, paths):
+    if name.split('.')[0] in FIRMWARE_MODULES:
+        return True
+    filename = getattr(module, '__file__', None) or ''
+    return any(filename.startswith(path + os.sep) for path in paths)
+
+
+def load_firmware(lib_paths=()):
+    """
+    Import the pyboard's firmware modules (``upyt``) under CPython.
+
+    MicroPython modules (``pyb``, ``machine``, ``uasyncio``, etc) are
+    replaced with simulated ones (see ``upytester/simulator/lib``).
+
+    Each call imports a fresh copy of every firmware module; they're not
+    added to :data:`sys.modules`, so firmware state is not shared between
+    simulated pyboards, or with the host.
+
+    :param lib_paths: directories searched for a ``bench`` module (like a
+                      pyboard's ``/sd/lib_bench``), imported if found
+    :type lib_paths: :class:`list`
+    :return: firmware modules, by name
+    :rtype: :class:`dict`
+    """
+    lib_paths = [os.path.abspath(p) for p in lib_paths]
+    paths = [SHIM_LIB, FIRMWARE_LIB] + lib_paths
+
+    with _import_lock:
+        # Take existing firmware modules out of the way (eg: another pyboard's)
+        saved_modules = {
+            name: module for (name, module) in sys.modules.items()
+            if _is_firmware_module(name, module, paths)
+        }
+        for name in saved_modules:
+            del sys.modules[name]
+        saved_path = list(sys.path)
+        saved_time = sys.modules['time']
+
+        sys.path[:0] = paths
+        try:
+            # firmware's 'time' is MicroPython's utime
+            sys.modules['time'] = importlib.import_module('utime')
+
+            # upyt (bypass __init__, it asserts it's running on a pyboard)
+            upyt = types.ModuleType('upyt')
+            upyt.__path__ = [os.path.join(FIRMWARE_LIB, 'upyt')]
+            sys.modules['upyt'] = upyt
+
+            # upyt.cmd: its types must be corrected before anything else is
+            # imported; CPython's coroutines are not generators.
+            spec = importlib.util.spec_from_file_location(
+                'upyt.cmd', os.path.join(FIRMWARE_LIB, 'upyt', 'cmd', '__init__.py'),
+                submodule_search_locations=[os.path.join(FIRMWARE_LIB, 'upyt', 'cmd')],
+            )
+            cmd = importlib.util.module_from_spec(spec)
+            sys.modules['upyt.cmd'] = cmd
+            cmd_types = importlib.import_module('upyt.cmd.types')
+            cmd_types.type_coro = types.CoroutineType
+            cmd_types.type_bound_coro = types.CoroutineType
+            spec.loader.exec_module(cmd)
+
+            for name in ('cmd', 'utils', 'sched', 'stream', 'capture'):
+                setattr(upyt, name, importlib.import_module('upyt.' + name))
+            upyt.sched.readable = _readable
+
+            # bench library (as /sd/lib_bench is by main.py)
+            if lib_paths:
+                try:
+                    importlib.import_module('bench')
+                except ImportError as e:
+                    if "'bench'" not in e.args[0]:
+                        raise  # import error was not from a nested library fault
+
+            modules = {
+                name: module for (name, module) in sys.modules.items()
+                if _is_firmware_module(name, module, paths)
+            }
+
+        finally:
+            for name in [n for (n, m) in sys.modules.items() if _is_firmware_module(n, m, paths)]:
+                del sys.modules[name]
+            sys.modules.update(saved_modules)
+            sys.modules['time'] = saved_time
+            sys.path[:] = saved_path
+
+    return modules
+
+
+class Firmware(object):
+    """
+    The firmware of a simulated pyboard, running in its own thread.
+
+    Runs like the pyboard's ``main.py``; the command listener is started on
+    the given stream with its own :mod:`asyncio` event loop.
+
+    If the firmware raises an exception, the stack trace is written to the
+    stream (as a pyboard would), and it halts until it's reset by a
+    ``Ctrl+C`` or ``Ctrl+D`` character.
+
+    :param vcp: serial stream given to the listener
+    :type vcp: :class:`VCP <upytester.simulator.stream.VCP>`
+    :param lib_paths: passed to :meth:`load_firmware`
+    :param name: used to name the thread
+    """
+
+    def __init__(self, vcp, lib_paths=(), name='simulated'):
+        self.vcp = vcp
+        self.vcp.on_interrupt = self.reset
+        self.lib_paths = lib_paths
+        self.name = name
+
+        self.modules = None  # firmware modules (fresh at each boot)
+        self.boot_count = 0
+
+        self._loop = None
+        self._task = None
+        self._reset_flag = threading.Event()
+        self._stop_flag = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Power on."""
+        self._stop_flag.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='{} firmware'.format(self.name),
+        )
+        self._thread.daemon = True  # thread dies with main process
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Power off, waits for the firmware thread to finish."""
+        self._stop_flag.set()
+        self.reset()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def reset(self):
+        """Reboot the firmware (may be called from any thread)."""
+        self._reset_flag.set()
+        (loop, task) = (self._loop, self._task)
+        if (loop is not None) and (task is not None) and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # loop closed in the meantime; not running
+
+    @property
+    def is_running(self):
+        return (self._thread is not None) and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop_flag.is_set():
+            self._reset_flag.clear()
+            crashed = self._boot()
+            if crashed:
+                self._halt()
+
+    def _boot(self):
+        # Run firmware until it's reset, or it crashes; returns True if crashed
+        self.modules = modules = load_firmware(self.lib_paths)
+        self.boot_count += 1
+
+        self.vcp.setinterrupt(self.vcp.INTERRUPT_CHAR)  # restored by reset
+        loop = asyncio.new_event_loop()
+        modules['uasyncio']._set_loop(loop)
+        modules['pyb']._reset_handler = self.reset
+
+        try:
+            self._task = loop.create_task(self._main(modules))
+            self._loop = loop
+            if self._reset_flag.is_set():
+                self._task.cancel()  # reset before loop was set
+            loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            return False  # reset
+        except Exception:
+            log.debug("%s firmware raised an exception", self.name, exc_info=True)
+            text = traceback.format_exc().replace('\n', '\r\n')
+            self.vcp.write(text.encode() + b'MicroPython (simulated)\r\n>>> ')
+            return True
+        finally:
+            self._loop = self._task = None
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+        return True  # listener returned
+
+    async def _main(self, modules):
+        # Equivalent of the pyboard's main.py
+        mapping = modules['upyt.cmd.mapping']
+        sched = modules['upyt.sched']
+
+        mapping.set_serial_port(self.vcp)
+        sched.init_loop()
+        modules['upyt.cmd.system'].mark_ready()
+        sched.loop.create_task(modules['upyt.utils'].startup_sequence())
+        await modules['upyt.cmd.process'].listener(self.vcp)
+
+    def _halt(self):
+        # Like a REPL; everything received is ignored until a reset.
+        self.vcp.setinterrupt(self.vcp.INTERRUPT_CHAR)
+        while not (self._reset_flag.is_set() or self._stop_flag.is_set()):
+            if self.vcp.wait(0.1):
+                buf = bytearray(self.vcp.any() or 1)
+                self.vcp.readinto(buf)  # interrupt character resets
+                if 0x04 in buf:  # Ctrl+D: soft reset
+                    self.reset()
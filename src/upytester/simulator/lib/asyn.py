@@ -0,0 +1,7 @@
+"""
+Simulated ``asyn`` module.
+
+The firmware's copy of ``asyn`` targets MicroPython's generator based
+``uasyncio``; :mod:`asyncio`'s own primitives are used instead.
+"""
+from asyncio import Lock, Event, Semaphore, BoundedSemaphore, Condition, sleep  # noqa: F401
@@ -0,0 +1,23 @@
+"""Simulated ``machine`` module (see ``pyb``)."""
+import pyb
+from pyb import Pin, SPI, Timer, freq, unique_id  # noqa: F401
+
+
+def reset():
+    pyb.hard_reset()
+
+
+def soft_reset():
+    pyb.hard_reset()
+
+
+def idle():
+    pass
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
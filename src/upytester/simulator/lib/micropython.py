@@ -0,0 +1,36 @@
+"""Simulated ``micropython`` module; code generation hints have no effect."""
+import uasyncio
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def schedule(func, arg):
+    # Run on the firmware's thread, as a pyboard runs scheduled functions
+    # from its main thread (simulated interrupts may be raised from others)
+    event_loop = uasyncio._event_loop
+    if event_loop is None:
+        func(arg)
+    else:
+        event_loop.loop.call_soon_threadsafe(func, arg)
+
+
+def mem_info(verbose=False):
+    pass
+
+
+def opt_level(level=None):
+    return 0
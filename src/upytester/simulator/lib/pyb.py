@@ -0,0 +1,426 @@
+"""
+Simulated ``pyb`` module.
+
+Peripherals hold their state in memory so firmware can be exercised without
+a pyboard; nothing is connected to them. Where a loopback is natural (eg:
+CAN in ``LOOPBACK`` mode, SPI ``send_recv``), data sent is received.
+
+Each simulated pyboard imports its own copy of this module, so state is not
+shared between boards.
+"""
+import time
+from collections import deque
+
+_boot_time = time.monotonic()
+
+# Set by the simulator; called on hard_reset() / bootloader()
+_reset_handler = None
+
+
+# -------------- System --------------
+def millis():
+    return int((time.monotonic() - _boot_time) * 1000)
+
+
+def micros():
+    return int((time.monotonic() - _boot_time) * 1000000)
+
+
+def elapsed_millis(start):
+    return millis() - start
+
+
+def elapsed_micros(start):
+    return micros() - start
+
+
+def delay(ms):
+    time.sleep(ms / 1000)
+
+
+def udelay(us):
+    time.sleep(us / 1000000)
+
+
+def freq():
+    return (168000000, 168000000, 42000000, 84000000)
+
+
+def unique_id():
+    return b'\x00' * 12
+
+
+def hard_reset():
+    if _reset_handler is not None:
+        _reset_handler()
+
+
+def bootloader():
+    hard_reset()
+
+
+# -------------- LED --------------
+class LED(object):
+    _intensity = {}  # format: {<id>: <0-255>, ...}
+
+    def __init__(self, id):
+        if not (1 <= id <= 4):
+            raise ValueError("LED({}) doesn't exist".format(id))
+        self._id = id
+        self._intensity.setdefault(id, 0)
+
+    def on(self):
+        self._intensity[self._id] = 0xff
+
+    def off(self):
+        self._intensity[self._id] = 0
+
+    def toggle(self):
+        self._intensity[self._id] = 0 if self._intensity[self._id] else 0xff
+
+    def intensity(self, value=None):
+        if value is None:
+            return self._intensity[self._id]
+        self._intensity[self._id] = max(0, min(int(value), 0xff))
+
+    def __repr__(self):
+        return "LED({})".format(self._id)
+
+
+# -------------- Switch --------------
+class Switch(object):
+    _pressed = False
+    _callback = None
+
+    def __call__(self):
+        return self.value()
+
+    def value(self):
+        return type(self)._pressed
+
+    def callback(self, fun):
+        type(self)._callback = fun
+
+    @classmethod
+    def _press(cls, pressed=True):
+        # Change switch state (for use by tests)
+        cls._pressed = pressed
+        if pressed and (cls._callback is not None):
+            cls._callback()
+
+
+# -------------- Pin --------------
+class Pin(object):
+    IN = 0
+    OUT_PP = 1
+    OUT = OUT_PP
+    OUT_OD = 0x11
+    AF_PP = 2
+    AF_OD = 0x12
+    ANALOG = 3
+    PULL_NONE = 0
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_RISING = 0x10110000
+    IRQ_FALLING = 0x10210000
+
+    _values = {}  # format: {<name>: <0|1>, ...}
+
+    def __init__(self, id, mode=-1, pull=-1, af=-1, value=None):
+        self._name = str(id)
+        self._mode = self.IN
+        self._pull = self.PULL_NONE
+        self._values.setdefault(self._name, 0)
+        if mode != -1:
+            self.init(mode, pull=pull, af=af, value=value)
+
+    def init(self, mode, pull=-1, af=-1, value=None):
+        self._mode = mode
+        if pull != -1:
+            self._pull = pull
+        if (self._mode == self.IN) and (self._pull != self.PULL_NONE):
+            self._values[self._name] = 1 if self._pull == self.PULL_UP else 0
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return self._values[self._name]
+        self._values[self._name] = 1 if value else 0
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    high = on
+    low = off
+
+    def name(self):
+        return self._name
+
+    def mode(self):
+        return self._mode
+
+    def pull(self):
+        return self._pull
+
+    @classmethod
+    def _set(cls, name, value):
+        # Drive an input externally (for use by tests)
+        (name, value) = (str(name), 1 if value else 0)
+        previous = cls._values.get(name, 0)
+        cls._values[name] = value
+        if value != previous:
+            ExtInt._edge(name, value)
+
+    def __repr__(self):
+        return "Pin({!r})".format(self._name)
+
+
+class ExtInt(object):
+    IRQ_RISING = 0x10110000
+    IRQ_FALLING = 0x10210000
+    IRQ_RISING_FALLING = 0x10310000
+    EVT_RISING = 0x10130000
+    EVT_FALLING = 0x10230000
+    EVT_RISING_FALLING = 0x10330000
+
+    _lines = {}  # format: {<line>: <ExtInt>, ...}
+
+    def __init__(self, pin, mode, pull, callback):
+        self._pin = pin if isinstance(pin, Pin) else Pin(pin)
+        self._line = len(self._lines)
+        self._mode = mode
+        self._callback = callback
+        self._enabled = True
+        self._lines[self._line] = self
+
+    def line(self):
+        return self._line
+
+    def enable(self):
+        self._enabled = True
+
+    def disable(self):
+        self._enabled = False
+
+    def swint(self):
+        if self._enabled:
+            self._callback(self._line)
+
+    @classmethod
+    def _edge(cls, name, value):
+        # Pin has changed; trigger interrupts on the matching edge
+        edge_bit = 0x00100000 if value else 0x00200000  # rising / falling
+        for extint in list(cls._lines.values()):
+            if (extint._pin.name() == name) and (extint._mode & edge_bit):
+                extint.swint()
+
+
+# -------------- ADC --------------
+class ADC(object):
+    _values = {}  # format: {<pin name>: <0-4095>, ...}
+
+    def __init__(self, pin):
+        self._name = pin.name() if isinstance(pin, Pin) else str(pin)
+        self._values.setdefault(self._name, 0)
+
+    def read(self):
+        return self._values[self._name]
+
+    @classmethod
+    def _set(cls, name, value):
+        # Set an analog input (for use by tests)
+        cls._values[str(name)] = max(0, min(int(value), 0xfff))
+
+
+# -------------- Timer --------------
+class Timer(object):
+    """Timer; callbacks are not triggered automatically (see ``_tick``)."""
+
+    def __init__(self, id, **kwargs):
+        self._id = id
+        self._callback = None
+        self._counter = 0
+        self._freq = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, freq=None, prescaler=None, period=None, **kwargs):
+        self._freq = freq
+
+    def deinit(self):
+        self._callback = None
+
+    def callback(self, fun):
+        self._callback = fun
+
+    def counter(self, value=None):
+        if value is None:
+            return self._counter
+        self._counter = value
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def _tick(self, count=1):
+        # Simulate timer overflow(s) (for use by tests)
+        for i in range(count):
+            self._counter += 1
+            if self._callback is not None:
+                self._callback(self)
+
+
+# -------------- CAN --------------
+class CAN(object):
+    NORMAL = 0
+    LOOPBACK = 1
+    SILENT = 2
+    SILENT_LOOPBACK = 3
+
+    STOPPED = 0
+    ERROR_ACTIVE = 1
+    ERROR_WARNING = 2
+    ERROR_PASSIVE = 3
+    BUS_OFF = 4
+
+    LIST16 = 0
+    MASK16 = 1
+    LIST32 = 2
+    MASK32 = 3
+
+    FIFO_DEPTH = 3  # frames per receive fifo (as per hardware)
+
+    def __init__(self, bus, mode=None, **kwargs):
+        self._bus = bus
+        self._mode = None
+        self._fifos = (deque(), deque())
+        self._callbacks = [None, None]
+        self.sent = deque(maxlen=256)  # frames sent (for use by tests)
+        if mode is not None:
+            self.init(mode, **kwargs)
+
+    def init(self, mode, extframe=False, prescaler=100, sjw=1, bs1=6, bs2=8, auto_restart=False, **kwargs):  # noqa: E501
+        self._mode = mode
+        self._extframe = extframe
+
+    def deinit(self):
+        self._mode = None
+
+    def state(self):
+        return self.STOPPED if self._mode is None else self.ERROR_ACTIVE
+
+    def setfilter(self, bank, mode, fifo, params, **kwargs):
+        pass
+
+    def clearfilter(self, bank):
+        pass
+
+    def any(self, fifo):
+        return bool(self._fifos[fifo])
+
+    def send(self, data, id, timeout=0, rtr=False):
+        if self._mode is None:
+            raise OSError("CAN bus not initialised")
+        if isinstance(data, int):
+            data = bytes([data])
+        frame = (id, rtr, 0, bytes(data))
+        self.sent.append(frame)
+        if self._mode in (self.LOOPBACK, self.SILENT_LOOPBACK):
+            self._receive(frame)
+
+    def recv(self, fifo, list=None, timeout=5000):
+        if not self._fifos[fifo]:
+            raise OSError(110)  # ETIMEDOUT
+        frame = self._fifos[fifo].popleft()
+        if list is None:
+            return frame
+        list[0:3] = frame[0:3]
+        if isinstance(list[3], memoryview):
+            list[3][0:len(frame[3])] = frame[3]
+            list[3] = list[3][:len(frame[3])]
+        else:
+            list[3] = frame[3]
+        return list
+
+    def rxcallback(self, fifo, fun):
+        self._callbacks[fifo] = fun
+
+    def _receive(self, frame, fifo=0):
+        # Frame received from the bus (for use by tests)
+        queue = self._fifos[fifo]
+        callback = self._callbacks[fifo]
+        if len(queue) >= self.FIFO_DEPTH:
+            if callback is not None:
+                callback(self, 2)  # overflow; frame is lost
+            return
+        queue.append(frame)
+        if callback is not None:
+            callback(self, 0 if len(queue) == 1 else 1)
+
+
+# -------------- SPI --------------
+class SPI(object):
+    MASTER = 0x104
+    SLAVE = 0
+    LSB = 0x80
+    MSB = 0
+
+    def __init__(self, bus, mode=None, **kwargs):
+        self._bus = bus
+        self._mode = None
+        self.sent = deque(maxlen=256)  # data sent (for use by tests)
+        if mode is not None:
+            self.init(mode, **kwargs)
+
+    def init(self, mode, baudrate=328125, prescaler=None, polarity=1, phase=0, bits=8, firstbit=MSB, **kwargs):  # noqa: E501
+        self._mode = mode
+
+    def deinit(self):
+        self._mode = None
+
+    def send(self, send, timeout=5000):
+        if isinstance(send, int):
+            send = bytes([send])
+        self.sent.append(bytes(send))
+
+    def recv(self, recv, timeout=5000):
+        # nothing is connected; MISO reads 0
+        if isinstance(recv, int):
+            return bytes(recv)
+        for i in range(len(recv)):
+            recv[i] = 0
+        return recv
+
+    def send_recv(self, send, recv=None, timeout=5000):
+        # MOSI is looped back to MISO
+        if isinstance(send, int):
+            send = bytes([send])
+        self.sent.append(bytes(send))
+        if recv is None:
+            return bytes(send)
+        recv[0:len(send)] = send
+        return recv
+
+    write = send
+
+    def read(self, nbytes, write=0x00):
+        return bytes(nbytes)
+
+    def write_readinto(self, write_buf, read_buf):
+        self.send_recv(write_buf, read_buf)
+
+
+# -------------- USB --------------
+class USB_VCP(object):
+    """Not available; the simulator gives firmware its own serial stream."""
+
+    def __init__(self, *args, **kwargs):
+        raise OSError("USB_VCP is not available in the simulator")
@@ -0,0 +1,80 @@
+"""
+Simulated ``uasyncio`` module, implemented with :mod:`asyncio`.
+
+Provides the (v1.x) API used by the firmware; an event loop with
+``call_later_ms``, and ``cancel(coro)``.
+"""
+import asyncio
+
+_event_loop = None  # set by the simulator (see _set_loop)
+
+
+class EventLoop(object):
+    """Wrapper of an :class:`asyncio.AbstractEventLoop`."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self._tasks = {}  # format: {<coroutine>: <asyncio.Task>, ...}
+
+    def create_task(self, coro):
+        task = self.loop.create_task(coro)
+        self._tasks[coro] = task
+        task.add_done_callback(lambda t: self._tasks.pop(coro, None))
+        return task
+
+    def call_soon(self, callback, *args):
+        return self.loop.call_soon(callback, *args)
+
+    def call_later(self, delay, callback, *args):
+        return self.loop.call_later(delay, callback, *args)
+
+    def call_later_ms(self, delay, callback, *args):
+        return self.loop.call_later(delay / 1000, callback, *args)
+
+    def run_until_complete(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def run_forever(self):
+        return self.loop.run_forever()
+
+    def stop(self):
+        self.loop.stop()
+
+    def time(self):
+        return int(self.loop.time() * 1000)
+
+    def cancel(self, coro):
+        task = self._tasks.get(coro, None)
+        if task is not None:
+            task.cancel()
+        else:
+            coro.close()
+
+
+def _set_loop(loop):
+    global _event_loop
+    _event_loop = EventLoop(loop)
+
+
+def get_event_loop(*args, **kwargs):
+    return _event_loop
+
+
+def sleep(t):
+    return asyncio.sleep(t)
+
+
+def sleep_ms(t):
+    return asyncio.sleep(t / 1000)
+
+
+def cancel(coro):
+    _event_loop.cancel(coro)
+
+
+def wait_for(coro, timeout):
+    return asyncio.wait_for(coro, timeout)
+
+
+def wait_for_ms(coro, timeout):
+    return asyncio.wait_for(coro, timeout / 1000)
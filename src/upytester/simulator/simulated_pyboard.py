@@ -0,0 +1,192 @@
+import io
+import os
+
+import serial
+
+from .firmware import Firmware
+from .stream import Pipe, MemoryVCP, PtyVCP
+
+# Logging
+import logging
+log = logging.getLogger(__name__)
+
+
+class SimulatedPyBoard(object):
+    """
+    A simulated pyboard, in place of a serial port.
+
+    The pyboard's firmware (``upyt.cmd``) runs in a thread under CPython
+    (see :class:`Firmware <upytester.simulator.firmware.Firmware>`), so a
+    :class:`PyBoard <upytester.PyBoard>` can be used without hardware::
+
+        >>> from upytester import PyBoard
+        >>> from upytester.simulator import SimulatedPyBoard
+        >>> pyboard = PyBoard('sim', comport=SimulatedPyBoard())
+        >>> pyboard.ping(value=1)()
+        {'value': 2}
+
+    Implements the parts of :class:`serial.Serial` used by
+    :class:`PyBoard <upytester.PyBoard>`, linked to the firmware by one of
+    the following ``transport`` options:
+
+    ============ =============================================================
+    Transport    Description
+    ============ =============================================================
+    ``'memory'`` in-memory buffers (default); fastest, but has no file
+                 descriptor (an :class:`AsyncPyBoard <upytester.AsyncPyBoard>`
+                 polls it)
+    ``'pty'``    a pseudo-terminal (posix only); the host uses a real
+                 :class:`serial.Serial`, and :attr:`port` can be opened by
+                 other processes.
+    ============ =============================================================
+
+    Firmware modules are imported separately for each instance, so many can
+    run in the same process.
+
+    :param port: name of port (``'memory'`` transport only)
+    :type port: :class:`str`
+    :param baudrate: ignored (accepted for compatibility)
+    :param timeout: read timeout (unit: sec), as per :class:`serial.Serial`
+    :type timeout: :class:`float`
+    :param transport: ``'memory'`` or ``'pty'``
+    :type transport: :class:`str`
+    :param lib_paths: directories to search for a ``bench`` library, like
+                      a pyboard's ``/sd/lib_bench``
+    :type lib_paths: :class:`list`
+    """
+
+    TRANSPORTS = ('memory', 'pty')
+
+    def __init__(self, port='simulated', baudrate=None, timeout=None, transport='memory', lib_paths=()):  # noqa: E501
+        if transport not in self.TRANSPORTS:
+            raise ValueError("unknown transport {!r}, options: {!r}".format(transport, self.TRANSPORTS))  # noqa: E501
+        self.transport = transport
+
+        self._serial = None  # host end of pty
+        self._master_fd = self._slave_fd = None
+
+        if transport == 'memory':
+            self.port = port
+            self.baudrate = baudrate
+            self._timeout = timeout
+            self._is_open = True
+            self._rx = Pipe()  # pyboard --> host
+            self._tx = Pipe()  # host --> pyboard
+            vcp = MemoryVCP(rx=self._tx, tx=self._rx)
+        else:
+            import tty
+            (self._master_fd, self._slave_fd) = os.openpty()
+            tty.setraw(self._slave_fd)
+            self.port = os.ttyname(self._slave_fd)
+            self._serial = serial.Serial(port=self.port, timeout=timeout)
+            vcp = PtyVCP(self._master_fd)
+
+        self.firmware = Firmware(vcp, lib_paths=lib_paths, name=self.port)
+        self.firmware.start()
+
+    # ==================== Simulation ====================
+    def module(self, name):
+        """
+        Firmware module (as currently booted), by name.
+
+        For example, to check the state of the pyboard's LEDs::
+
+            >>> sim.module('pyb').LED(4).intensity()
+            255
+        """
+        return self.firmware.modules[name]
+
+    def reset(self):
+        """Reboot the pyboard's firmware."""
+        self.firmware.reset()
+
+    def shutdown(self):
+        """Stop the firmware, and release all resources."""
+        self.firmware.stop()
+        self.close()
+        for fd in (self._master_fd, self._slave_fd):
+            if fd is not None:
+                os.close(fd)
+        self._master_fd = self._slave_fd = None
+
+    # ==================== Serial Interface ====================
+    @property
+    def timeout(self):
+        if self._serial is not None:
+            return self._serial.timeout
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        if self._serial is not None:
+            self._serial.timeout = value
+        else:
+            self._timeout = value
+
+    @property
+    def is_open(self):
+        if self._serial is not None:
+            return self._serial.is_open
+        return self._is_open
+
+    @property
+    def closed(self):
+        return not self.is_open
+
+    def open(self):
+        if self._serial is not None:
+            return self._serial.open()
+        self._is_open = True
+
+    def close(self):
+        if self._serial is not None:
+            return self._serial.close()
+        self._is_open = False
+
+    def _assert_open(self):
+        if not self._is_open:
+            raise serial.SerialException("Attempting to use a port that is not open")
+
+    @property
+    def in_waiting(self):
+        if self._serial is not None:
+            return self._serial.in_waiting
+        return len(self._rx)
+
+    def read(self, size=1):
+        if self._serial is not None:
+            return self._serial.read(size)
+        self._assert_open()
+        return self._rx.read(size, self._timeout)
+
+    def write(self, data):
+        if self._serial is not None:
+            return self._serial.write(data)
+        self._assert_open()
+        return self._tx.write(bytes(data))
+
+    def flush(self):
+        if self._serial is not None:
+            self._serial.flush()
+
+    def reset_input_buffer(self):
+        if self._serial is not None:
+            return self._serial.reset_input_buffer()
+        self._rx.clear()
+
+    def cancel_read(self):
+        if self._serial is not None:
+            return self._serial.cancel_read()
+        self._rx.cancel()
+
+    def fileno(self):
+        if self._serial is not None:
+            return self._serial.fileno()
+        raise io.UnsupportedOperation("in-memory transport has no file descriptor")
+
+    def __repr__(self):
+        return "<{cls}: {port!r} ({transport})>".format(
+            cls=type(self).__name__,
+            port=self.port,
+            transport=self.transport,
+        )
@@ -0,0 +1,189 @@
+import os
+import select
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+    import termios
+except ImportError:  # not posix; pty link unavailable
+    fcntl = termios = None
+
+
+class Pipe(object):
+    """
+    One direction of an in-memory serial link.
+
+    Written bytes are buffered until read (from another thread).
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.data = bytearray()
+        self.cancelled = False  # see cancel()
+
+    def __len__(self):
+        return len(self.data)
+
+    def write(self, data):
+        with self.cond:
+            self.data += data
+            self.cond.notify_all()
+        return len(data)
+
+    def read(self, size, timeout=None):
+        """
+        Read up to ``size`` bytes.
+
+        Like :meth:`serial.Serial.read`; blocks until ``size`` bytes have been
+        received, ``timeout`` has elapsed, or :meth:`cancel` is called.
+        """
+        with self.cond:
+            deadline = None if timeout is None else (time.monotonic() + timeout)
+            while (len(self.data) < size) and not self.cancelled:
+                remaining = None if deadline is None else (deadline - time.monotonic())
+                if (remaining is not None) and (remaining <= 0):
+                    break
+                self.cond.wait(remaining)
+            self.cancelled = False
+            data = bytes(self.data[:size])
+            del self.data[:size]
+        return data
+
+    def readinto(self, buf):
+        with self.cond:
+            size = min(len(buf), len(self.data))
+            buf[:size] = self.data[:size]
+            del self.data[:size]
+        return size
+
+    def wait(self, timeout=None):
+        """Block until something can be read; ``True`` if it can."""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.data, timeout)
+
+    def cancel(self):
+        """Interrupt a blocking :meth:`read` (or the next one)."""
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+
+    def clear(self):
+        with self.cond:
+            del self.data[:]
+
+
+# -------------- Pyboard side --------------
+class VCP(object):
+    """
+    Simulated :class:`pyb.USB_VCP` (the firmware's serial stream).
+
+    As with a pyboard, receiving the interrupt character (``Ctrl+C``) does
+    not deliver it to the firmware; it interrupts it instead (see
+    :class:`Firmware <upytester.simulator.firmware.Firmware>`).
+    """
+
+    INTERRUPT_CHAR = 0x03  # Ctrl+C
+
+    def __init__(self):
+        self.on_interrupt = None  # callable, set by the firmware runner
+        self.interrupt_char = self.INTERRUPT_CHAR
+
+    # ----- to be implemented by each link
+    def any(self):
+        """Number of bytes waiting to be read."""
+        raise NotImplementedError
+
+    def _readinto(self, buf):
+        raise NotImplementedError
+
+    def write(self, data):
+        raise NotImplementedError
+
+    def wait(self, timeout=None):
+        """Block until something can be read; ``True`` if it can."""
+        raise NotImplementedError
+
+    # ----- common
+    def readinto(self, buf, maxlen=None):
+        if not self.any():
+            return None
+        view = memoryview(buf)
+        if maxlen is not None:
+            view = view[:maxlen]
+        count = self._readinto(view)
+        if count and (self.interrupt_char >= 0) and (self.interrupt_char in view[:count]):
+            if self.on_interrupt is not None:
+                self.on_interrupt()
+            return 0  # discarded
+        return count
+
+    def setinterrupt(self, chr):
+        """Set the interrupt character, ``-1`` to disable."""
+        self.interrupt_char = chr
+
+    def read(self, nbytes=None):
+        buf = bytearray(self.any() if nbytes is None else nbytes)
+        count = self.readinto(buf)
+        return bytes(buf[:count or 0]) if count else None
+
+    def recv(self, data, timeout=5000):
+        if isinstance(data, int):
+            self.wait(timeout / 1000)
+            return self.read(data) or b''
+        self.wait(timeout / 1000)
+        return self.readinto(data) or 0
+
+    def send(self, data, timeout=5000):
+        return self.write(data)
+
+    def isconnected(self):
+        return True
+
+
+class MemoryVCP(VCP):
+    """Pyboard end of an in-memory link."""
+
+    def __init__(self, rx, tx):
+        super(MemoryVCP, self).__init__()
+        self.rx = rx  # host --> pyboard
+        self.tx = tx  # pyboard --> host
+
+    def any(self):
+        return len(self.rx)
+
+    def _readinto(self, buf):
+        return self.rx.readinto(buf)
+
+    def write(self, data):
+        return self.tx.write(bytes(data))
+
+    def wait(self, timeout=None):
+        return self.rx.wait(timeout)
+
+
+class PtyVCP(VCP):
+    """Pyboard end of a pseudo-terminal (the master's file descriptor)."""
+
+    def __init__(self, fd):
+        super(PtyVCP, self).__init__()
+        self.fd = fd
+
+    def any(self):
+        data = fcntl.ioctl(self.fd, termios.FIONREAD, b'\x00\x00\x00\x00')
+        return struct.unpack('I', data)[0]
+
+    def _readinto(self, buf):
+        return os.readv(self.fd, [buf])
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            count = os.write(self.fd, view)
+            view = view[count:]
+        return len(data)
+
+    def wait(self, timeout=None):
+        (readable, _, _) = select.select([self.fd], [], [], timeout)
+        return bool(readable)